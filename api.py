@@ -2,62 +2,87 @@
 APIs
 """
 
+import base64
+import functools
+import hashlib
+import json
 from datetime import datetime, UTC
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import String, and_, cast, func, or_, select, tuple_
 import numpy as np
-from sklearn.linear_model import LinearRegression
 
-from models import db, Measurement, Point, GlobalLock
+import fitting
+import drafts
+import metrics
+import point_store
+import repository
+import rql
+import spindles
+import summaries
+import wire
+from models import db, ImportJob, Measurement, MeasurementSummary, Point, catalogue_version, list_versions
+from events import event_broker
+from fit_pool import fit_pool, FitTimeout
+from lease import lease_manager
+from regression_cache import regression_cache
 
 api_bp = Blueprint('api', __name__)
 
-SPINDLE_ID2FACTOR = {
-    "SC4-18": 1.32,
-    "SC4-31": 0.34,
-    "SC4-34": 0.28
+LIST_MISSING_NUMBER = -1e308
+
+# Sort keys of the measurement list; ties are broken by row ID
+LIST_SORT_KEYS = {
+    "id": func.coalesce(Measurement.original_id, Measurement.id),  # Drafts list under their original's ID
+    "name": func.lower(Measurement.liquid_name),
+    "date": func.coalesce(cast(Measurement.date, String), ''),
+    "serial": func.lower(func.coalesce(Measurement.serial_id, '')),
+    # Summary columns; measurements without a value sort first
+    "points": func.coalesce(MeasurementSummary.n_points, 0),
+    "rate_min": func.coalesce(MeasurementSummary.shear_rate_min, LIST_MISSING_NUMBER),
+    "rate_max": func.coalesce(MeasurementSummary.shear_rate_max, LIST_MISSING_NUMBER),
+    "a": func.coalesce(MeasurementSummary.power_a, LIST_MISSING_NUMBER),
+    "b": func.coalesce(MeasurementSummary.power_b, LIST_MISSING_NUMBER),
+    "r2": func.coalesce(MeasurementSummary.power_r_squared, LIST_MISSING_NUMBER),
 }
+LIST_PAGE_SIZE = 100
+LIST_MAX_PAGE_SIZE = 1000
+IMPORT_JOBS_LISTED = 50
 
 
-def get_best_measurement(measurement_id):
-    """Helper to return the draft if it exists, otherwise the original."""
-    # If we are looking for a specific ID, it might be a draft or a production record.
-    # In the single-editor model, there is only one draft.
-    # If the requested ID is for an original, we should check if a draft exists for it.
-
-    m = Measurement.query.get(measurement_id)
-    if not m:
-        return None
-
-    if not m.is_draft:
-        # Check if there is a draft referencing this original
-        draft = Measurement.query.filter_by(original_id=m.id, is_draft=True).first()
-        if draft:
-            return draft
-    return m
-
-
-def check_lock():
-    """Helper to verify if the requester holds the active global lock."""
-    session_id = request.headers.get('X-Session-ID')
-    if not session_id:
-        return False, "Missing Session ID"
+def touch_measurement(measurement, point_ids=None):
+    """
+        Bump the data version so cached fits and packs of this measurement are
+        never reused. `point_ids` lists the points changed in place when none
+        were added or deleted, so the pack is patched instead of rebuilt.
+    """
+    point_store.mark_dirty(measurement, point_ids)
+    measurement.data_version = (measurement.data_version or 0) + 1
+    summaries.mark_dirty(measurement)
 
-    lock = GlobalLock.query.first()
-    if not lock:
-        return False, "No active editor lock"
 
-    if lock.is_stale():
-        db.session.delete(lock)
-        db.session.commit()
-        return False, "Lock has expired"
+def conditional_json(etag, build, encode=jsonify):
+    """
+        Answer 304 when the client's If-None-Match already has `etag`, otherwise
+        `encode(build())`. The ETag is skipped (always 200) when `etag` is None.
+    """
+    if etag is not None and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = encode(build())
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'  # Always revalidate
+        response.vary.add('X-Session-ID')  # The visible draft depends on the editor session
+    return response
 
-    if lock.session_id != session_id:
-        return False, f"Lock held by {lock.user_name}"
 
-    # Update heartbeat on successful check
-    lock.last_heartbeat = datetime.now(UTC).replace(tzinfo=None)
-    db.session.commit()
-    return True, None
+def check_lock(commit=True):
+    """
+        Helper to verify if the requester holds the active global lock.
+        With commit=False a due heartbeat write is left in the session for the
+        caller's own transaction.
+    """
+    return lease_manager.check(request.headers.get('X-Session-ID'), commit=commit)
 
 
 # --- Lock Endpoints ---
@@ -66,22 +91,15 @@ def check_lock():
 def get_lock_status():
     """Check who currently holds the global editor lock."""
     session_id = request.headers.get('X-Session-ID')
-    lock = GlobalLock.query.first()
-    if not lock:
-        return jsonify({"locked": False})
-
-    if lock.is_stale():
-        db.session.delete(lock)
-        db.session.commit()
+    lease = lease_manager.status()
+    if not lease:
         return jsonify({"locked": False})
 
     return jsonify({
         "locked": True,
-        "user_name": lock.user_name,
-        "is_me": (lock.session_id == session_id) if session_id else False,
-        "last_active": (
-            (datetime.now(UTC).replace(tzinfo=None) -
-                lock.last_heartbeat).total_seconds())
+        "user_name": lease.user_name,
+        "is_me": (lease.session_id == session_id) if session_id else False,
+        "last_active": lease.idle_seconds(datetime.now(UTC).replace(tzinfo=None))
     })
 
 
@@ -95,20 +113,12 @@ def acquire_lock():
     if not user_name or not session_id:
         return jsonify({"error": "Missing user_name or session_id"}), 400
 
-    lock = GlobalLock.query.first()
-    if lock:
-        if not lock.is_stale():
-            return jsonify({
-                "error": "Locked",
-                "user_name": lock.user_name
-            }), 409
-        # Lock is stale, delete it
-        db.session.delete(lock)
-        db.session.commit()
-
-    new_lock = GlobalLock(user_name=user_name, session_id=session_id)
-    db.session.add(new_lock)
-    db.session.commit()
+    acquired, holder = lease_manager.acquire(session_id, user_name)
+    if not acquired:
+        return jsonify({
+            "error": "Locked",
+            "user_name": holder
+        }), 409
 
     return jsonify({
         "message": "Lock acquired",
@@ -130,11 +140,7 @@ def release_lock():
     if not session_id:
         return jsonify({"error": "Missing Session ID"}), 400
 
-    lock = GlobalLock.query.filter_by(session_id=session_id).first()
-
-    if lock:
-        db.session.delete(lock)
-        db.session.commit()
+    if lease_manager.release(session_id):
         return jsonify({"message": "Lock released"}), 200
     return jsonify({"error": "Not the lock holder or lock not found"}), 403
 
@@ -148,6 +154,30 @@ def lock_heartbeat():
     return jsonify({"error": error}), 403
 
 
+# --- Change Events ---
+
+@api_bp.route('/events', methods=['GET'])
+def event_stream():
+    """
+        Server-sent events for lock and measurement changes.
+        Each message is {"id", "kind", "measurement_id", "version", "user_name"};
+        reconnecting clients resume after their Last-Event-ID. Beyond
+        EVENTS_MAX_STREAMS per worker the client gets a "busy" event and a
+        retry hint instead, and polls meanwhile.
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid Last-Event-ID"}), 400
+
+    stream = event_broker.stream(current_app._get_current_object(), last_id)
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Keep reverse proxies from buffering the stream
+    })
+
+
 # --- Measurement Endpoints ---
 
 @api_bp.route('/measurements/<int:measurement_id>/edit/start', methods=['POST'])
@@ -164,7 +194,7 @@ def start_edit_mode(measurement_id):
             db.session.delete(d)
     db.session.flush()
 
-    measurement = Measurement.query.filter_by(id=measurement_id, is_draft=False).first()
+    measurement = repository.get_measurement(measurement_id, is_draft=False)
     if not measurement:
         return jsonify({"error": "Measurement not found"}), 404
 
@@ -173,32 +203,9 @@ def start_edit_mode(measurement_id):
     if existing_draft:
         return jsonify({"message": "Draft already exists", "is_draft": True}), 200
 
-    # Create the draft measurement
-    draft_measurement = Measurement(
-        liquid_name=measurement.liquid_name,
-        date=measurement.date,
-        serial_id=measurement.serial_id,
-        spindle_id=measurement.spindle_id,
-        experiment_note=measurement.experiment_note,
-        is_draft=True,
-        original_id=measurement.id
-    )
-    db.session.add(draft_measurement)
-    db.session.flush()
-
-    for p in measurement.points:
-        draft_point = Point(
-            N=p.N,
-            eta=p.eta,
-            torque=p.torque,
-            shear_rate=p.shear_rate,
-            shear_stress=p.shear_stress,
-            is_draft=True,
-            original_id=p.id,
-            measurement=draft_measurement
-        )
-        db.session.add(draft_point)
-
+    # The draft only copies the measurement row; its points overlay the original's
+    draft_measurement = drafts.create_draft(measurement)
+    summaries.mark_dirty(draft_measurement)
     db.session.commit()
     return jsonify({
         "message": "Draft created successfully",
@@ -214,7 +221,7 @@ def duplicate_measurement(measurement_id):
     if not success:
         return jsonify({"error": f"Permission denied: {error}"}), 403
 
-    original = Measurement.query.filter_by(id=measurement_id, is_draft=False).first()
+    original = repository.get_measurement(measurement_id, is_draft=False, with_points=True)
     if not original:
         return jsonify({"error": "Measurement not found"}), 404
 
@@ -241,6 +248,7 @@ def duplicate_measurement(measurement_id):
         )
         db.session.add(new_p)
 
+    summaries.mark_dirty(new_measurement)
     db.session.commit()
     return jsonify({
         "message": "Measurement duplicated successfully",
@@ -255,16 +263,15 @@ def commit_edit_mode(measurement_id):
     if not success:
         return jsonify({"error": f"Permission denied: {error}"}), 403
 
-    draft = Measurement.query.filter_by(id=measurement_id, is_draft=True).first()
+    draft = repository.get_measurement(measurement_id, is_draft=True)
     if not draft:
         return jsonify({"error": "No draft found to commit"}), 404
 
     if draft.original_id is None:
         # Case: New Measurement Creation
         # Promote draft to production
-        draft.is_draft = False
-        for p in draft.points:
-            p.is_draft = False
+        drafts.promote(draft)
+        touch_measurement(draft)
         db.session.commit()
         return jsonify({
             "message": "New measurement created successfully",
@@ -272,7 +279,7 @@ def commit_edit_mode(measurement_id):
         }), 201
 
     # Case: Editing existing measurement
-    original = Measurement.query.get(draft.original_id)
+    original = repository.get_measurement(draft.original_id, is_draft=False)
     if not original:
         return jsonify({"error": "Original measurement not found"}), 404
 
@@ -283,35 +290,10 @@ def commit_edit_mode(measurement_id):
     original.spindle_id = draft.spindle_id
     original.experiment_note = draft.experiment_note
 
-    # --- Sync points ---
-    original_points_map = {p.id: p for p in original.points}
-    draft_point_ids_seen = set()
-
-    for dp in draft.points:
-        if dp.original_id and dp.original_id in original_points_map:
-            op = original_points_map[dp.original_id]
-            op.N = dp.N
-            op.eta = dp.eta
-            op.torque = dp.torque
-            op.shear_rate = dp.shear_rate
-            op.shear_stress = dp.shear_stress
-            draft_point_ids_seen.add(dp.original_id)
-        else:
-            new_p = Point(
-                N=dp.N,
-                eta=dp.eta,
-                torque=dp.torque,
-                shear_rate=dp.shear_rate,
-                shear_stress=dp.shear_stress,
-                is_draft=False,
-                measurement=original
-            )
-            db.session.add(new_p)
-
-    for op_id, op in original_points_map.items():
-        if op_id not in draft_point_ids_seen:
-            db.session.delete(op)
+    # Apply the overlay and adopt added points with set-based statements
+    changed = drafts.commit(draft, original)
 
+    touch_measurement(original, changed)
     db.session.delete(draft)
     db.session.commit()
     return jsonify({"message": "Changes committed successfully", "id": original.id}), 200
@@ -328,119 +310,507 @@ def rollback_edit_mode(measurement_id):
     if not draft:
         return jsonify({"error": "No draft found to rollback"}), 404
 
+    # The original becomes the visible version of this measurement again
+    if draft.original_id is not None:
+        original = db.session.get(Measurement, draft.original_id)
+        if original:
+            touch_measurement(original, point_ids=())  # Its points are unchanged
     db.session.delete(draft)
     db.session.commit()
     return jsonify({"message": "Draft discarded"}), 200
 
 
-@api_bp.route('/measurements/<int:measurement_id>/regression', methods=['GET'])
-def get_regression(measurement_id):
-    """Calculate and return a linear regression for the measurement."""
-    measurement = get_best_measurement(measurement_id)
-    if not measurement:
-        return jsonify({"error": "Measurement not found"}), 404
+@metrics.timed_fit('linear')
+def linear_regressions(columns):
+    """
+        Fit sigma = slope * gamma + intercept for many measurements at once.
+        `columns` is a list of (shear_rate, shear_stress) arrays; returns a list
+        of (payload, None) on success or (None, error message) per measurement.
+    """
+    fit = fitting.linear_fit(
+        fitting.stack_columns([c[0] for c in columns]),
+        fitting.stack_columns([c[1] for c in columns]))
+
+    outcomes = []
+    for i in range(len(columns)):
+        if fit.count[i] < 2:
+            outcomes.append((None, "Not enough data points"))
+            continue
+        x_line = np.linspace(fit.x_min[i], fit.x_max[i], 100)
+        y_line = fit.slope[i] * x_line + fit.intercept[i]
+        outcomes.append(({
+            "regression_points": _curve_points(x_line, y_line),
+            "r_squared": fit.r_squared[i],
+            "slope": fit.slope[i],
+            "intercept": fit.intercept[i],
+            "x_min": fit.x_min[i], "x_max": fit.x_max[i]
+        }, None))
+    return outcomes
+
+
+@metrics.timed_fit('power')
+def power_regressions(columns):
+    """
+        Fit sigma = a * gamma^b in log-log space for many measurements at once.
+        Same calling convention as `linear_regressions`.
+    """
+    fit = fitting.power_fit(
+        fitting.stack_columns([c[0] for c in columns]),
+        fitting.stack_columns([c[1] for c in columns]))
+
+    outcomes = []
+    for i in range(len(columns)):
+        if fit.count[i] < 2:
+            outcomes.append((None, "Not enough positive data points"))
+            continue
+        x_line = np.linspace(fit.x_min[i], fit.x_max[i], 100)
+        y_line = fit.a[i] * (x_line ** fit.b[i])
+        outcomes.append(({
+            "regression_points": _curve_points(x_line, y_line),
+            "r_squared": fit.r_squared[i],
+            "a": fit.a[i], "b": fit.b[i],
+            "x_min": fit.x_min[i], "x_max": fit.x_max[i]
+        }, None))
+    return outcomes
+
+
+def model_regressions(model, columns):
+    """
+        Fit the nonlinear model `model` of `fitting.MODELS` to many measurements
+        at once (in the fit pool for large sets). Same calling convention as
+        `linear_regressions`; results add `converged`, `iterations` and
+        `at_bound`, the parameters that ended on a bound of the search.
+    """
+    with metrics.fit_timer(model):
+        fit = fit_pool.fit(
+            model,
+            fitting.stack_columns([c[0] for c in columns]),
+            fitting.stack_columns([c[1] for c in columns]))
+
+    outcomes = []
+    for i in range(len(columns)):
+        params = {name: values[i] for name, values in fit.params.items()}
+        if fit.count[i] < len(params):
+            outcomes.append((None, f"At least {len(params)} positive data points are needed"))
+            continue
+        x_line = np.geomspace(fit.x_min[i], fit.x_max[i], 100)
+        y_line = fitting.model_stress(model, params, x_line)
+        outcomes.append(({
+            "regression_points": _curve_points(x_line, y_line),
+            "model": model,
+            **params,
+            "r_squared": fit.r_squared[i],
+            "converged": bool(fit.converged[i]),
+            "iterations": int(fit.iterations[i]),
+            "at_bound": [name for name, values in fit.at_bound.items() if values[i]],
+            "x_min": fit.x_min[i], "x_max": fit.x_max[i]
+        }, None))
+    return outcomes
 
-    valid_points = [
-        p for p in measurement.points
-        if p.shear_rate is not None and p.shear_stress is not None
-    ]
-    if len(valid_points) < 2:
-        return jsonify({"error": "Not enough data points"}), 400
 
-    x_values = np.array([p.shear_rate for p in valid_points]).reshape(-1, 1)
-    y_values = np.array([p.shear_stress for p in valid_points])
+def _curve_points(x_line, y_line):
+    return wire.Columns(shear_rate=x_line, shear_stress=y_line)
 
-    model = LinearRegression()
-    model.fit(x_values, y_values)
 
-    x_min, x_max = np.min(x_values), np.max(x_values)
-    x_line = np.linspace(x_min, x_max, 100).reshape(-1, 1)
-    y_line = model.predict(x_line)
+def coefficients_only():
+    """True when the request asks for fit coefficients without sampled curves."""
+    return request.args.get('coefficients_only', '').lower() in ('1', 'true')
 
-    regression_points = [{
-        "shear_rate": x_line[i][0],
-        "shear_stress": y_line[i]} for i in range(len(x_line))]
-    return jsonify({
-        "regression_points": regression_points,
-        "r_squared": model.score(x_values, y_values),
-        "slope": model.coef_[0],
-        "intercept": model.intercept_
-    })
+
+def fit_payload(result, with_curve):
+    """Return a fit result, dropping `regression_points` in coefficient-only mode."""
+    if with_curve:
+        return result
+    return {key: value for key, value in result.items() if key != 'regression_points'}
+
+
+REGRESSIONS = {
+    "linear": linear_regressions,
+    "power": power_regressions,
+    **{model: functools.partial(model_regressions, model) for model in fitting.MODELS},
+}
+
+
+def _measurement_columns(measurement):
+    """Return the (shear_rate, shear_stress) columns of a measurement as arrays."""
+    columns = point_store.load_columns(measurement)
+    return columns["shear_rate"], columns["shear_stress"]
+
+
+def cache_key(measurement, fit):
+    # The generation tells apart rows that reuse the ID of a deleted one
+    return measurement.id, measurement.generation, fit, measurement.data_version
+
+
+def cached_regressions(measurements, fit, columns=None):
+    """
+        Return (payload, error) per measurement, reusing cached results while the
+        data version is unchanged. All misses are fitted in one vectorized call.
+        `columns` maps measurement ID to preloaded arrays; without it, points are
+        only loaded for the misses.
+    """
+    outcomes = [regression_cache.get(cache_key(m, fit)) for m in measurements]
+    misses = [i for i, outcome in enumerate(outcomes) if outcome is None]
+    if misses:
+        miss_columns = [
+            columns[measurements[i].id] if columns else _measurement_columns(measurements[i])
+            for i in misses
+        ]
+        for i, outcome in zip(misses, REGRESSIONS[fit](miss_columns)):
+            m = measurements[i]
+            regression_cache.put(cache_key(m, fit), outcome)
+            outcomes[i] = outcome
+    return outcomes
+
+
+@api_bp.route('/measurements/<int:measurement_id>/regression', methods=['GET'])
+@repository.query_budget(3)
+def get_regression(measurement_id):
+    """
+        Calculate and return a linear regression for the measurement.
+        `?coefficients_only=1` omits the sampled curve.
+    """
+    fmt = wire.requested_format()
+    if fmt is None:
+        return jsonify({"error": "Unknown format"}), 400
+    measurement = repository.get_best_measurement(measurement_id)
+    if not measurement:
+        return jsonify({"error": "Measurement not found"}), 404
+
+    result, error = cached_regressions([measurement], 'linear')[0]
+    if error:
+        return jsonify({"error": error}), 400
+    return wire.respond(fit_payload(result, not coefficients_only()), fmt)
 
 
 @api_bp.route('/measurements/<int:measurement_id>/power-regression', methods=['GET'])
+@repository.query_budget(3)
 def get_power_regression(measurement_id):
-    """Calculate and return a power law regression for the measurement."""
-    measurement = get_best_measurement(measurement_id)
+    """
+        Calculate and return a power law regression for the measurement.
+        `?coefficients_only=1` omits the sampled curve.
+    """
+    fmt = wire.requested_format()
+    if fmt is None:
+        return jsonify({"error": "Unknown format"}), 400
+    measurement = repository.get_best_measurement(measurement_id)
     if not measurement:
         return jsonify({"error": "Measurement not found"}), 404
 
-    positive_points = [
-            p for p in measurement.points
-            if p.shear_rate and p.shear_stress and p.shear_rate > 0 and p.shear_stress > 0
-    ]
-    if len(positive_points) < 2:
-        return jsonify({"error": "Not enough positive data points"}), 400
+    result, error = cached_regressions([measurement], 'power')[0]
+    if error:
+        return jsonify({"error": error}), 400
+    return wire.respond(fit_payload(result, not coefficients_only()), fmt)
 
-    log_X = np.log(np.array([p.shear_rate for p in positive_points])).reshape(-1, 1)
-    log_Y = np.log(np.array([p.shear_stress for p in positive_points]))
 
-    model = LinearRegression()
-    model.fit(log_X, log_Y)
+@api_bp.route('/measurements/<int:measurement_id>/fit', methods=['GET'])
+@repository.query_budget(3)
+def get_model_fit(measurement_id):
+    """
+        Fit `?model=` (linear, power, herschel_bulkley, cross or carreau) to the
+        measurement. `?coefficients_only=1` omits the sampled curve.
+    """
+    fmt = wire.requested_format()
+    if fmt is None:
+        return jsonify({"error": "Unknown format"}), 400
+    model = request.args.get('model', '')
+    if model not in REGRESSIONS:
+        return jsonify({"error": f"Unknown model: {model or '(none)'}; use one of {', '.join(REGRESSIONS)}"}), 400
+    measurement = repository.get_best_measurement(measurement_id)
+    if not measurement:
+        return jsonify({"error": "Measurement not found"}), 404
 
-    a = np.exp(model.intercept_)
-    b = model.coef_[0]
+    try:
+        result, error = cached_regressions([measurement], model)[0]
+    except FitTimeout as e:
+        return jsonify({"error": str(e)}), 503
+    if error:
+        return jsonify({"error": error}), 400
+    return wire.respond(fit_payload(result, not coefficients_only()), fmt)
 
-    x_min = np.min([p.shear_rate for p in positive_points])
-    x_max = np.max([p.shear_rate for p in positive_points])
-    x_line = np.linspace(x_min, x_max, 100)
-    y_line = a * (x_line ** b)
 
-    regression_points = [{
-        "shear_rate": x_line[i],
-        "shear_stress": y_line[i]} for i in range(len(x_line))]
-    return jsonify({
-        "regression_points": regression_points,
-        "r_squared": model.score(log_X, log_Y),
-        "a": a, "b": b
+@api_bp.route('/comparison', methods=['POST'])
+@repository.query_budget(3)
+def get_comparison():
+    """
+        Return plot points and fits for many measurements in one round trip.
+        Body: {"ids": [...], "fits": ["power", "linear", ...]}, with any fit of
+        `REGRESSIONS`. Drafts are preferred over their originals, exactly like
+        the single-measurement endpoints.
+        Supports the response formats of wire.py and `?coefficients_only=1`.
+    """
+    fmt = wire.requested_format()
+    if fmt is None:
+        return jsonify({"error": "Unknown format"}), 400
+    data = request.get_json() or {}
+    try:
+        requested_ids = [int(i) for i in data.get('ids', [])]
+    except (ValueError, TypeError):
+        return jsonify({"error": "ids must be a list of integers"}), 400
+    fits = data.get('fits', ['power'])
+    unknown = [f for f in fits if f not in REGRESSIONS]
+    if unknown:
+        return jsonify({"error": f"Unknown fit type(s): {', '.join(map(str, unknown))}"}), 400
+    if not requested_ids:
+        return wire.respond({"measurements": [], "missing": []}, fmt)
+
+    # Resolve "draft or original" for every requested ID with a single query
+    resolved, missing = repository.resolve_many(requested_ids)
+
+    # Load the plotted columns of every measurement in one pass
+    measurements = list(resolved.values())
+    arrays = {
+        m_id: (columns["shear_rate"], columns["shear_stress"])
+        for m_id, columns in point_store.load_many(measurements).items()
+    }
+
+    # Fit the whole comparison set with one vectorized call per fit type
+    try:
+        fitted = {fit: cached_regressions(measurements, fit, arrays) for fit in fits}
+    except FitTimeout as e:
+        return jsonify({"error": str(e)}), 503
+    with_curves = not coefficients_only()
+
+    results = []
+    for i, (requested_id, m) in enumerate(resolved.items()):
+        xs, ys = arrays[m.id]
+        regressions = {}
+        for fit in fits:
+            result, error = fitted[fit][i]
+            regressions[fit] = fit_payload(result, with_curves) if result else {"error": error}
+        results.append({
+            "requested_id": requested_id,
+            "id": m.id,
+            "original_id": m.original_id,
+            "liquid_name": m.liquid_name,
+            "shear_rate": xs,
+            "shear_stress": ys,
+            "regressions": regressions
+        })
+
+    return wire.respond({"measurements": results, "missing": missing}, fmt)
+
+
+@api_bp.route('/export', methods=['GET', 'POST'])
+def export_measurements():
+    """
+        Stream production measurements as a download (see export.py).
+        `format` is layout (zip of importer CSVs, default), long (one CSV) or
+        npz; `ids` and/or an RQL `q` pick the measurements, all of them if
+        neither is given. GET takes comma-separated `ids`, POST a JSON body
+        {"format", "ids": [...], "q"} for long ID lists.
+    """
+    import export  # Deferred: export imports import_measurements, which imports app
+
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        raw_ids = data.get('ids') or []
+    else:
+        data = request.args
+        raw_ids = [i for i in data.get('ids', '').split(',') if i.strip()]
+    fmt = data.get('format', 'layout')
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"Unknown export format: {fmt}"}), 400
+    try:
+        ids = [int(i) for i in raw_ids]
+    except (ValueError, TypeError):
+        return jsonify({"error": "ids must be a list of integers"}), 400
+    try:
+        condition = export.selection(ids, data.get('q'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+
+    mimetype, extension = export.FORMATS[fmt]
+    return Response(stream_with_context(export.stream(fmt, condition)), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="measurements.{extension}"',
+        'X-Accel-Buffering': 'no'
     })
 
 
-@api_bp.route('/measurements', methods=['GET'])
-def get_measurements():
+@api_bp.route('/import/jobs', methods=['POST'])
+def upload_import_job():
     """
-        Return a list of measurements. If a production measurement has an active draft,
-        return only the draft to avoid duplicates in the UI.
+        Queue uploaded CSV files (multipart field `files`, repeatable; zips of
+        CSVs are unpacked) as one background import job. Answers 202 with the
+        job right away; poll `GET /api/import/jobs/<id>` for its progress.
     """
-    production_measurements = Measurement.query.filter_by(is_draft=False).all()
-    
-    # Check if there is an active draft for this session
-    session_id = request.headers.get('X-Session-ID')
-    active_draft = None
-    if session_id:
-        lock = GlobalLock.query.filter_by(session_id=session_id).first()
-        if lock:
-            active_draft = Measurement.query.filter_by(is_draft=True).first()
+    import import_jobs  # Deferred: import_jobs imports import_measurements, which imports this module
 
-    results = []
-    draft_original_id = active_draft.original_id if active_draft else None
+    success, error = check_lock()
+    if not success:
+        return jsonify({"error": f"Permission denied: {error}"}), 403
+    if request.content_length and request.content_length > current_app.config['IMPORT_MAX_UPLOAD']:
+        return jsonify({"error": "Upload too large"}), 413
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    if not uploads:
+        return jsonify({"error": "No files uploaded"}), 400
+    try:
+        lease = lease_manager.status()
+        job = import_jobs.create_job(uploads, current_app.config['IMPORT_UPLOAD_DIR'],
+                                     lease.user_name if lease else None,
+                                     current_app.config['IMPORT_MAX_EXTRACTED'],
+                                     current_app.config['IMPORT_MAX_FILES'])
+    except import_jobs.UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except import_jobs.UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    import_jobs.import_queue.start(current_app._get_current_object())
+    response = jsonify(import_jobs.job_payload(job))
+    response.status_code = 202
+    response.headers['Location'] = f"{request.script_root}/api/import/jobs/{job.id}"
+    return response
+
+
+@api_bp.route('/import/jobs', methods=['GET'])
+def get_import_jobs():
+    """List the most recent import jobs, without their per-file results."""
+    import import_jobs  # Deferred: see upload_import_job
+
+    import_jobs.import_queue.start(current_app._get_current_object())  # Resume jobs queued before a restart
+    jobs = db.session.execute(
+        select(ImportJob).order_by(ImportJob.id.desc()).limit(IMPORT_JOBS_LISTED)).scalars()
+    return jsonify([import_jobs.job_payload(job, with_files=False) for job in jobs])
+
+
+@api_bp.route('/import/jobs/<int:job_id>', methods=['GET'])
+def get_import_job(job_id):
+    """Status, counters, throughput and per-file results of one import job."""
+    import import_jobs  # Deferred: see upload_import_job
+
+    import_jobs.import_queue.start(current_app._get_current_object())
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        return jsonify({"error": "Import job not found"}), 404
+    return jsonify(import_jobs.job_payload(job))
+
+
+@api_bp.route('/spindles', methods=['GET'])
+def get_spindles():
+    """List the registered spindles and their factors."""
+    return jsonify([
+        {"spindle_id": spindle_id, "factor": factor}
+        for spindle_id, factor in sorted(spindles.factors().items())
+    ])
+
+
+@api_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose request, SQL and fit metrics in the Prometheus text format."""
+    return Response(metrics.metrics.render(), content_type=metrics.PROMETHEUS_MIMETYPE)
+
+
+@api_bp.route('/regression-cache', methods=['GET'])
+def get_regression_cache_stats():
+    """Expose regression cache hit/miss counters."""
+    return jsonify(regression_cache.stats())
+
+
+def encode_cursor(sort, order, key, row_id):
+    """Opaque keyset cursor pointing just past the row with (`key`, `row_id`)."""
+    raw = json.dumps([sort, order, key, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor, sort, order):
+    """Return the (key, row_id) of a cursor; raises ValueError if malformed or for another sort."""
+    try:
+        cursor_sort, cursor_order, key, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(row_id, int):
+        raise ValueError("Cursor belongs to another sort order")
+    return key, row_id
+
+
+def measurement_summary(m, summary=None):
+    return {
+        "id": m.id, "liquid_name": m.liquid_name,
+        "date": m.date.isoformat() if m.date else None,
+        "serial_id": m.serial_id, "spindle_id": m.spindle_id,
+        "experiment_note": m.experiment_note,
+        "is_draft": m.is_draft, "original_id": m.original_id,
+        "summary": summary.to_dict() if summary else None
+    }
 
-    for m in production_measurements:
-        if m.id == draft_original_id:
-            # Skip the original because we will add the draft instead
-            continue
-        results.append(m)
 
-    if active_draft:
-        results.append(active_draft)
+@api_bp.route('/measurements', methods=['GET'])
+@repository.query_budget(5)
+def get_measurements():
+    """
+        Return one page of measurements as {measurements, total, next_cursor}.
+        If a production measurement has an active draft, list only the draft to
+        avoid duplicates in the UI.
+        Optional `q` filters with an RQL query; `selected` (comma-separated IDs)
+        backs the is:plot / is:selected flags. `sort` (id, name, date, serial, or
+        the summary columns points, rate_min, rate_max, a, b, r2) and `order`
+        (asc, desc) pick a stable order; `limit` and the `next_cursor` of the
+        previous page select the page. Unchanged pages answer 304 via ETag.
+    """
+    sort = request.args.get('sort', 'name')
+    order = request.args.get('order', 'asc')
+    if sort not in LIST_SORT_KEYS or order not in ('asc', 'desc'):
+        return jsonify({"error": f"Invalid sort: {sort} {order}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', LIST_PAGE_SIZE)), 1), LIST_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    cursor = request.args.get('cursor')
+    try:
+        after = decode_cursor(cursor, sort, order) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        selected_ids = [int(i) for i in request.args.get('selected', '').split(',') if i.strip()]
+        condition = rql.compile_query(request.args.get('q', ''), selected_ids)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+
+    active_draft = repository.get_active_draft(request.headers.get('X-Session-ID'))
+    version, summary_version = list_versions()
+    etag = None
+    if version is not None:
+        fingerprint = repr((version, summary_version, active_draft.id if active_draft else None,
+                            sorted(request.args.items(multi=True))))
+        etag = "list-" + hashlib.sha1(fingerprint.encode()).hexdigest()
+
+    def build():
+        visible = Measurement.is_draft.is_(False)
+        if active_draft:
+            if active_draft.original_id is not None:
+                # Skip the original because the draft is listed instead
+                visible = and_(visible, Measurement.id != active_draft.original_id)
+            visible = or_(visible, Measurement.id == active_draft.id)
+        if condition is not None:
+            visible = and_(visible, condition)
+
+        total = db.session.execute(
+            select(func.count()).select_from(Measurement).where(visible)).scalar()
+
+        key = LIST_SORT_KEYS[sort]
+        page_query = (select(Measurement, key, MeasurementSummary).where(visible)
+                      .outerjoin(MeasurementSummary, MeasurementSummary.measurement_id == Measurement.id))
+        if order == 'asc':
+            page_query = page_query.order_by(key, Measurement.id)
+            if after:
+                page_query = page_query.where(tuple_(key, Measurement.id) > tuple_(*after))
+        else:
+            page_query = page_query.order_by(key.desc(), Measurement.id.desc())
+            if after:
+                page_query = page_query.where(tuple_(key, Measurement.id) < tuple_(*after))
+        rows = db.session.execute(page_query.limit(limit + 1)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last, last_key, _ = rows[-1]
+            next_cursor = encode_cursor(sort, order, last_key, last.id)
+        return {
+            "measurements": [measurement_summary(m, summary) for m, _, summary in rows],
+            "total": total,
+            "next_cursor": next_cursor
+        }
 
-    return jsonify([{
-        "id": d.id, "liquid_name": d.liquid_name,
-        "date": d.date.isoformat() if d.date else None,
-        "serial_id": d.serial_id, "spindle_id": d.spindle_id,
-        "experiment_note": d.experiment_note,
-        "is_draft": d.is_draft, "original_id": d.original_id
-    } for d in results])
+    return conditional_json(etag, build)
 
 
 @api_bp.route('/measurements', methods=['POST'])
@@ -461,6 +831,7 @@ def add_measurement():
 
     new_measurement = Measurement(liquid_name=liquid_name, is_draft=True, original_id=None)
     db.session.add(new_measurement)
+    summaries.mark_dirty(new_measurement)
     db.session.commit()
     return jsonify({
         "message": f"Measurement '{liquid_name}' initialized as draft",
@@ -470,26 +841,41 @@ def add_measurement():
 
 
 @api_bp.route('/measurements/<int:measurement_id>', methods=['GET'])
+@repository.query_budget(4)
 def get_measurement(measurement_id):
-    """Return points and metadata for a measurement."""
-    measurement = get_best_measurement(measurement_id)
+    """
+        Return points and metadata for a measurement (304 when the ETag still
+        matches). Supports the response formats of wire.py.
+    """
+    fmt = wire.requested_format()
+    if fmt is None:
+        return jsonify({"error": "Unknown format"}), 400
+    measurement = repository.get_best_measurement(measurement_id)
     if not measurement:
         return jsonify({"error": "Measurement not found"}), 404
 
-    return jsonify({
+    # data_version covers the points, the catalogue version the metadata and
+    # the reuse of draft row IDs
+    version = catalogue_version()
+    etag = None if version is None else f"m{measurement.id}-{measurement.data_version}-{version}-{fmt}"
+    return conditional_json(etag, lambda: serialize_measurement(measurement),
+                            lambda payload: wire.respond(payload, fmt))
+
+
+def serialize_measurement(measurement):
+    columns = point_store.load_columns(measurement)
+    return {
         "id": measurement.id,
         "liquid_name": measurement.liquid_name,
-        "points": [{
-            "id": p.id, "N": p.N, "eta": p.eta, "torque": p.torque,
-            "shear_rate": p.shear_rate, "shear_stress": p.shear_stress
-        } for p in measurement.points],
+        "points": wire.Columns(
+            id=columns["id"], **{name: columns[name] for name in point_store.COLUMNS}),
         "date": measurement.date.isoformat() if measurement.date else None,
         "serial_id": measurement.serial_id,
         "spindle_id": measurement.spindle_id,
         "experiment_note": measurement.experiment_note,
         "is_draft": measurement.is_draft,
         "original_id": measurement.original_id
-    })
+    }
 
 
 @api_bp.route('/measurements/<int:measurement_id>', methods=['PUT'])
@@ -499,7 +885,7 @@ def update_measurement(measurement_id):
     if not success:
         return jsonify({"error": f"Permission denied: {error}"}), 403
 
-    measurement = get_best_measurement(measurement_id)
+    measurement = repository.get_best_measurement(measurement_id)
     if not measurement:
         return jsonify({"error": "Measurement not found"}), 404
 
@@ -519,13 +905,8 @@ def update_measurement(measurement_id):
         measurement.experiment_note = data['experiment_note']
     if 'spindle_id' in data:
         measurement.spindle_id = data['spindle_id']
-        factor = SPINDLE_ID2FACTOR.get(measurement.spindle_id)
-        for p in measurement.points:
-            if factor:
-                p.shear_rate = factor * p.N
-                p.shear_stress = p.eta * p.shear_rate * 0.001
-            else:
-                p.shear_rate = p.shear_stress = None
+        drafts.recompute_shear(measurement, spindles.factor_for(measurement.spindle_id))
+        touch_measurement(measurement)
 
     if 'liquid_name' in data:
         new_name = data['liquid_name'].strip()
@@ -568,28 +949,64 @@ def add_point(measurement_id):
     if not success:
         return jsonify({"error": f"Permission denied: {error}"}), 403
 
-    measurement = get_best_measurement(measurement_id)
+    measurement = repository.get_best_measurement(measurement_id)
     if not measurement:
         return jsonify({"error": "Measurement not found"}), 404
 
-    factor = SPINDLE_ID2FACTOR.get(measurement.spindle_id)
+    factor = spindles.factor_for(measurement.spindle_id)
     if not factor:
         return jsonify({"error": "Select a valid spindle first"}), 400
 
-    data = request.get_json()
+    data = request.get_json() or {}
+    if 'N' not in data or 'eta' not in data:
+        return jsonify({"error": "N and eta are required"}), 400
+    new_p = Point(is_draft=measurement.is_draft, measurement=measurement)
     try:
-        N, eta = float(data['N']), float(data['eta'])
-        torque = float(data['torque']) if data.get('torque') else None
+        set_point_values(new_p, data, factor)
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid numbers"}), 400
 
-    sr = factor * N
-    ss = eta * sr * 0.001
-    new_p = Point(N=N, eta=eta, torque=torque, shear_rate=sr, shear_stress=ss,
-                  is_draft=measurement.is_draft, measurement=measurement)
     db.session.add(new_p)
+    touch_measurement(measurement)
     db.session.commit()
-    return jsonify({"id": new_p.id, "shear_rate": sr, "shear_stress": ss}), 201
+    return jsonify({"id": new_p.id, "shear_rate": new_p.shear_rate, "shear_stress": new_p.shear_stress}), 201
+
+
+def set_point_values(point, data, factor):
+    """
+        Apply the N / eta / torque present in `data` to a point and recompute its
+        shear columns. Raises ValueError or TypeError for non-numeric input.
+    """
+    if 'N' in data:
+        point.N = float(data['N'])
+    if 'eta' in data:
+        point.eta = float(data['eta'])
+    if 'torque' in data:
+        point.torque = float(data['torque']) if data['torque'] else None
+
+    if factor:
+        point.shear_rate = factor * point.N
+        point.shear_stress = point.eta * point.shear_rate * 0.001
+    else:
+        point.shear_rate = point.shear_stress = None
+
+
+def find_points(measurement, point_ids):
+    """
+        Return {point_id: point} for the points to edit: `Point` rows the
+        measurement owns, or for overlay drafts, overlay entries of the original's.
+    """
+    point_ids = set(point_ids)
+    found = {p.id: p for p in Point.query.filter(
+        Point.measurement_id == measurement.id, Point.id.in_(point_ids))}
+    rest = point_ids - set(found)
+    if rest and drafts.is_overlay(measurement):
+        found.update(drafts.overlay_points(measurement, rest))
+    return found
+
+
+def find_point(measurement, point_id):
+    return find_points(measurement, [point_id]).get(point_id)
 
 
 @api_bp.route('/measurements/<int:measurement_id>/points/<int:point_id>', methods=['DELETE'])
@@ -599,15 +1016,16 @@ def delete_point(measurement_id, point_id):
     if not success:
         return jsonify({"error": f"Permission denied: {error}"}), 403
 
-    measurement = get_best_measurement(measurement_id)
+    measurement = repository.get_best_measurement(measurement_id)
     if not measurement:
         return jsonify({"error": "Measurement not found"}), 404
 
-    point = Point.query.filter_by(id=point_id, measurement_id=measurement.id).first()
+    point = find_point(measurement, point_id)
     if not point:
         return jsonify({"error": "Point not found"}), 404
 
-    db.session.delete(point)
+    drafts.delete_point(point)
+    touch_measurement(measurement)
     db.session.commit()
     return jsonify({"message": "Point deleted"}), 200
 
@@ -619,30 +1037,91 @@ def update_point(measurement_id, point_id):
     if not success:
         return jsonify({"error": f"Permission denied: {error}"}), 403
 
-    measurement = get_best_measurement(measurement_id)
+    measurement = repository.get_best_measurement(measurement_id)
     if not measurement:
         return jsonify({"error": "Measurement not found"}), 404
 
-    point = Point.query.filter_by(id=point_id, measurement_id=measurement.id).first()
+    point = find_point(measurement, point_id)
     if not point:
         return jsonify({"error": "Point not found"}), 404
 
-    data = request.get_json()
-    if 'N' in data:
-        point.N = float(data['N'])
-    if 'eta' in data:
-        point.eta = float(data['eta'])
-    if 'torque' in data:
-        point.torque = float(data['torque']) if data['torque'] else None
-
-    factor = SPINDLE_ID2FACTOR.get(measurement.spindle_id)
-    if factor:
-        point.shear_rate = factor * point.N
-        point.shear_stress = point.eta * point.shear_rate * 0.001
-    else:
-        point.shear_rate = point.shear_stress = None
+    try:
+        set_point_values(point, request.get_json() or {}, spindles.factor_for(measurement.spindle_id))
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid numbers"}), 400
 
+    touch_measurement(measurement, [point_id])
     db.session.commit()
     return jsonify({
         "shear_rate": point.shear_rate,
         "shear_stress": point.shear_stress}), 200
+
+
+@api_bp.route('/measurements/<int:measurement_id>/points/batch', methods=['POST'])
+def batch_points(measurement_id):
+    """
+        Apply many point operations to one measurement in a single transaction.
+        Body: {"operations": [{"op": "add", "N": .., "eta": .., "torque": ..},
+                              {"op": "update", "id": .., <fields>},
+                              {"op": "delete", "id": ..}]}
+        Either every operation is applied or none is. Returns the ID and the
+        computed shear values of every affected point, in request order.
+    """
+    success, error = check_lock(commit=False)
+    if not success:
+        return jsonify({"error": f"Permission denied: {error}"}), 403
+
+    measurement = repository.get_best_measurement(measurement_id)
+    if not measurement:
+        return jsonify({"error": "Measurement not found"}), 404
+
+    operations = (request.get_json() or {}).get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+
+    def reject(index, message):
+        db.session.rollback()
+        return jsonify({"error": f"Operation {index}: {message}", "index": index}), 400
+
+    factor = spindles.factor_for(measurement.spindle_id)
+    points = find_points(measurement, [
+        op.get('id') for op in operations if isinstance(op, dict) and isinstance(op.get('id'), int)])
+    applied = []
+    for index, op in enumerate(operations):
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind == 'add':
+            if not factor:
+                return reject(index, "Select a valid spindle first")
+            if 'N' not in op or 'eta' not in op:
+                return reject(index, "N and eta are required")
+            point = Point(is_draft=measurement.is_draft, measurement=measurement)
+            db.session.add(point)
+        elif kind in ('update', 'delete'):
+            point = points.get(op.get('id'))
+            if point is None:
+                return reject(index, f"Point {op.get('id')} not found")
+            if kind == 'delete':
+                drafts.delete_point(point)
+                del points[op['id']]  # Later operations must not see it
+                applied.append((kind, op['id'], None))
+                continue
+        else:
+            return reject(index, f"Unknown op {kind!r}")
+
+        try:
+            set_point_values(point, op, factor)
+        except (ValueError, TypeError):
+            return reject(index, "Invalid numbers")
+        applied.append((kind, op.get('id'), point))
+
+    updates_only = all(kind == 'update' for kind, _, _ in applied)
+    touch_measurement(measurement, [point_id for _, point_id, _ in applied] if updates_only else None)
+    db.session.flush()  # Assigns the IDs of added points
+    results = [{"op": kind, "id": point_id} if point is None else {
+        "op": kind,
+        "id": point.id if kind == 'add' else point_id,
+        "shear_rate": point.shear_rate,
+        "shear_stress": point.shear_stress
+    } for kind, point_id, point in applied]
+    db.session.commit()
+    return jsonify({"points": results}), 200
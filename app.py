@@ -2,19 +2,124 @@
 import os
 import argparse
 from flask import Flask, render_template
+from sqlalchemy import event
 from models import db
+from migrations import migrate
 from api import api_bp
+from regression_cache import regression_cache
+import backup
+import events
+import fit_pool
+import import_jobs
+import lease
+import metrics
+import point_store
+import summaries
 
 
-def create_app():
+SQLITE_JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SQLITE_SYNCHRONOUS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def create_app(config=None):
+    """Build the application; `config` overrides the defaults below."""
     app = Flask(__name__)
 
     # --- Database Configuration ---
     basedir = os.path.abspath(os.path.dirname(__file__))
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'project.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Connections per process: size it to the server threads (see serve.py)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 30}
+
+    # --- SQLite Tuning (applied to every new connection) ---
+    # WAL lets readers run alongside the single writer; writers wait up to
+    # SQLITE_BUSY_TIMEOUT ms for the lock instead of failing with "database is locked".
+    # NORMAL synchronous is durable in WAL mode except for the last commits on power loss.
+    app.config['SQLITE_JOURNAL_MODE'] = 'WAL'
+    app.config['SQLITE_BUSY_TIMEOUT'] = 5000
+    app.config['SQLITE_SYNCHRONOUS'] = 'NORMAL'
+
+    # --- Regression Cache ---
+    app.config['REGRESSION_CACHE_SIZE'] = 512  # Max cached fits (LRU)
+
+    # --- Nonlinear Fits ---
+    # Batches of more than FIT_INLINE_POINTS points are solved in FIT_WORKERS
+    # processes (0 solves everything inline); requests give up after FIT_TIMEOUT seconds.
+    app.config['FIT_WORKERS'] = min(4, os.cpu_count() or 1)
+    app.config['FIT_TIMEOUT'] = 30.0
+    app.config['FIT_INLINE_POINTS'] = 2000
+
+    # --- Point Storage ---
+    # 'rows' reads Point rows; 'packed' reads per-measurement column blobs
+    # (convert an existing database with `python point_store.py`)
+    app.config['POINT_STORAGE'] = 'rows'
+
+    # --- Editor Lock ---
+    # A lease is lost after LOCK_TIMEOUT seconds without a heartbeat. Heartbeats
+    # are written to the database at most every LOCK_HEARTBEAT_WRITE_INTERVAL
+    # seconds. Status checks trust a cached holder for LOCK_REVALIDATE seconds;
+    # writes always re-read the row.
+    app.config['LOCK_TIMEOUT'] = 120
+    app.config['LOCK_HEARTBEAT_WRITE_INTERVAL'] = 30
+    app.config['LOCK_REVALIDATE'] = 5
+
+    # --- Change Events (/api/events) ---
+    # Each worker polls the events table every EVENTS_POLL_INTERVAL seconds
+    # while streams are open; events older than EVENTS_RETENTION seconds are pruned.
+    app.config['EVENTS_POLL_INTERVAL'] = 1.0
+    app.config['EVENTS_RETENTION'] = 3600
+    # Each stream holds a server thread: a process keeps at most
+    # EVENTS_MAX_STREAMS open and tells further clients to poll and retry after
+    # EVENTS_BUSY_RETRY seconds (serve.py sets it from --max-streams)
+    app.config['EVENTS_MAX_STREAMS'] = 4
+    app.config['EVENTS_BUSY_RETRY'] = 30
+
+    # --- Instrumentation (/api/metrics) ---
+    # Per-endpoint latency, SQL and fit time; PROFILE_REQUESTS lets any client
+    # profile a request with an X-Profile header (always allowed in debug mode)
+    app.config['METRICS_ENABLED'] = True
+    app.config['PROFILE_REQUESTS'] = False
+
+    # --- CSV Upload Import (/api/import/jobs) ---
+    # Uploads are stored in IMPORT_UPLOAD_DIR until their job has run. Each
+    # process runs IMPORT_WORKERS import threads, inserting about
+    # IMPORT_BATCH_SIZE points per transaction; a running job without a
+    # heartbeat for IMPORT_STALE_AFTER seconds is resumed by another worker.
+    app.config['IMPORT_WORKERS'] = 1
+    app.config['IMPORT_UPLOAD_DIR'] = os.path.join(basedir, 'uploads')
+    app.config['IMPORT_BATCH_SIZE'] = 50000
+    app.config['IMPORT_POLL_INTERVAL'] = 2.0
+    app.config['IMPORT_STALE_AFTER'] = 300
+    app.config['IMPORT_MAX_UPLOAD'] = 512 * 1024 * 1024  # Bytes per request
+    app.config['IMPORT_MAX_EXTRACTED'] = 2 * 1024 ** 3  # Bytes unpacked from the zips of one job
+    app.config['IMPORT_MAX_FILES'] = 100_000  # Files (and zip members) per job
+
+    # --- Backups (python backup.py) ---
+    # With BACKUP_INTERVAL seconds > 0, the serving process keeps the newest
+    # snapshot in BACKUP_DIR younger than the interval, keeping BACKUP_KEEP of
+    # them. Pages are copied BACKUP_PAGES_PER_STEP at a time with
+    # BACKUP_STEP_SLEEP seconds between steps, so editors are never blocked.
+    app.config['BACKUP_INTERVAL'] = 0
+    app.config['BACKUP_DIR'] = os.path.join(basedir, 'backups')
+    app.config['BACKUP_KEEP'] = 7
+    app.config['BACKUP_PAGES_PER_STEP'] = 256
+    app.config['BACKUP_STEP_SLEEP'] = 0.05
+
+    if config:
+        app.config.update(config)
 
     db.init_app(app)  # Initialize db with app
+    configure_sqlite(app)
+    regression_cache.resize(app.config['REGRESSION_CACHE_SIZE'])
+    point_store.init_app(app)
+    summaries.init_app(app)
+    lease.init_app(app)
+    events.init_app(app)
+    fit_pool.init_app(app)
+    metrics.init_app(app)
+    backup.init_app(app)
+    import_jobs.init_app(app)
 
     # Register blueprints
     app.register_blueprint(api_bp, url_prefix='/api')
@@ -27,13 +132,38 @@ def create_app():
     return app
 
 
+def configure_sqlite(app):
+    """Apply the SQLITE_* settings of `app` to every new SQLite connection."""
+    journal_mode = app.config['SQLITE_JOURNAL_MODE'].upper()
+    synchronous = app.config['SQLITE_SYNCHRONOUS'].upper()
+    busy_timeout = int(app.config['SQLITE_BUSY_TIMEOUT'])
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"Unknown SQLITE_JOURNAL_MODE {journal_mode!r}")
+    if synchronous not in SQLITE_SYNCHRONOUS:
+        raise ValueError(f"Unknown SQLITE_SYNCHRONOUS {synchronous!r}")
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+        cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        cursor.execute(f"PRAGMA synchronous = {synchronous}")
+        cursor.close()
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--url")
     parser.add_argument("--port")
     args = parser.parse_args()
 
+    # Development server; use serve.py in production
     main_app = create_app()
     with main_app.app_context():
-        db.create_all()
+        migrate()
     main_app.run(debug=True, host=args.url, port=args.port)
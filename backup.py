@@ -0,0 +1,329 @@
+"""
+Online backups of project.db with SQLite's backup API.
+
+A snapshot copies the live database `pages_per_step` pages at a time, sleeping
+`step_sleep` seconds between steps, so readers and the editor keep working
+while it runs. A write from another connection restarts the copy; after
+`MAX_RESTARTS` restarts it finishes in one step, which in WAL mode reads a
+consistent snapshot without blocking writers either. The copy is checked with
+`PRAGMA integrity_check`, gzipped to `<backup dir>/<db name>-<UTC time>.db.gz`,
+and only the newest `keep` snapshots are kept.
+
+With `BACKUP_INTERVAL` set (seconds), a thread in the serving process takes a
+snapshot whenever the newest one is older than the interval. Several processes
+may run the scheduler: a lock file and the snapshot times keep them from
+taking the same backup twice.
+
+    python backup.py create                  # take a snapshot now
+    python backup.py list
+    python backup.py verify <snapshot>
+    python backup.py restore <snapshot>      # verify, save the current db, swap in
+
+Restore checks the snapshot's integrity and schema first, snapshots the
+current database, then copies the snapshot into the live database in one
+backup step (a single write transaction). Restart the app afterwards: workers
+cache data keyed by `data_version`, which a restore can move backwards.
+"""
+
+import argparse
+import contextlib
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, UTC
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = '.db.gz'
+TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S'
+MAX_RESTARTS = 5
+LOCK_STALE = 3600  # Seconds after which a leftover lock file is ignored
+REQUIRED_TABLES = ('measurements', 'points')
+
+
+class BackupError(Exception):
+    """Raised when a snapshot cannot be taken, verified or restored."""
+
+
+class _Restarted(Exception):
+    pass
+
+
+def database_path():
+    """Path of the app's SQLite database file."""
+    return os.path.abspath(db.engine.url.database)
+
+
+def _connect(path, busy_timeout):
+    connection = sqlite3.connect(path, timeout=busy_timeout / 1000)
+    return contextlib.closing(connection)
+
+
+def copy_database(source, target, pages_per_step=256, step_sleep=0.05, busy_timeout=5000):
+    """Copy the database file `source` to `target` with the backup API; return the restart count."""
+    restarts = 0
+    previous = float('inf')
+
+    def progress(status, remaining, total):
+        nonlocal restarts, previous
+        if remaining > previous:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted()
+        previous = remaining
+
+    with _connect(source, busy_timeout) as src, _connect(target, busy_timeout) as dst:
+        try:
+            src.backup(dst, pages=pages_per_step, progress=progress, sleep=step_sleep)
+        except _Restarted:
+            logger.info("Backup of %s restarted %d times; finishing in one step", source, restarts)
+            src.backup(dst, pages=-1)
+    return restarts
+
+
+def check_integrity(path):
+    """Return the problems found in the database file `path` (empty when it is sound)."""
+    with _connect(path, 0) as connection:
+        try:
+            problems = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+            tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        except sqlite3.DatabaseError as e:
+            return [str(e)]
+    if problems == ['ok']:
+        problems = []
+    problems += [f"missing table {name}" for name in REQUIRED_TABLES if name not in tables]
+    return problems
+
+
+def list_snapshots(directory, name):
+    """Snapshots of the database called `name` in `directory`, oldest first."""
+    return sorted(glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(name)}-*{SUFFIX}")))
+
+
+def rotate(directory, name, keep):
+    """Delete all but the newest `keep` snapshots; return the deleted paths."""
+    snapshots = list_snapshots(directory, name)
+    removed = snapshots[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def _stem(database):
+    return os.path.splitext(os.path.basename(database))[0]
+
+
+def create_snapshot(database, directory, keep=None, pages_per_step=256, step_sleep=0.05, busy_timeout=5000):
+    """Take a verified, compressed snapshot of `database` in `directory` and rotate; return its path."""
+    os.makedirs(directory, exist_ok=True)
+    stem = _stem(database)
+    path = os.path.join(directory, f"{stem}-{datetime.now(UTC).strftime(TIMESTAMP_FORMAT)}{SUFFIX}")
+    with tempfile.TemporaryDirectory(dir=directory, prefix='.backup-') as workdir:
+        copy = os.path.join(workdir, stem + '.db')
+        copy_database(database, copy, pages_per_step, step_sleep, busy_timeout)
+        problems = check_integrity(copy)
+        if problems:
+            raise BackupError(f"Snapshot of {database} failed the integrity check: {'; '.join(problems[:5])}")
+        partial = os.path.join(workdir, 'snapshot.part')
+        with open(copy, 'rb') as f, gzip.open(partial, 'wb', compresslevel=6) as out:
+            shutil.copyfileobj(f, out, 1024 * 1024)
+        os.replace(partial, path)
+    if keep:
+        rotate(directory, stem, keep)
+    return path
+
+
+@contextlib.contextmanager
+def _unpacked(snapshot, directory):
+    """Decompress `snapshot` into a temporary file in `directory`; yield its path."""
+    with tempfile.TemporaryDirectory(dir=directory, prefix='.restore-') as workdir:
+        path = os.path.join(workdir, 'snapshot.db')
+        try:
+            with gzip.open(snapshot, 'rb') as f, open(path, 'wb') as out:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+        except (OSError, EOFError) as e:
+            raise BackupError(f"Cannot read {snapshot}: {e}") from e
+        yield path
+
+
+def verify(snapshot):
+    """Return the problems found in a snapshot file (empty when it can be restored)."""
+    with _unpacked(snapshot, os.path.dirname(os.path.abspath(snapshot))) as path:
+        return check_integrity(path)
+
+
+def restore(snapshot, database, backup_dir=None, busy_timeout=5000):
+    """
+    Replace the contents of `database` with `snapshot` after verifying it.
+    The current contents are snapshotted to `backup_dir` first (unless None);
+    returns that safety snapshot's path.
+    """
+    with _unpacked(snapshot, os.path.dirname(database)) as path:
+        problems = check_integrity(path)
+        if problems:
+            raise BackupError(f"{snapshot} failed the integrity check: {'; '.join(problems[:5])}")
+        saved = None
+        if backup_dir is not None and os.path.exists(database):
+            saved = create_snapshot(database, backup_dir, busy_timeout=busy_timeout)
+        # One step is one write transaction: readers see the old or the new database, never a mix
+        with _connect(path, busy_timeout) as src, _connect(database, busy_timeout) as dst:
+            src.backup(dst, pages=-1)
+    return saved
+
+
+# --- Scheduler ---
+
+class BackupScheduler:
+    """Background thread that keeps the newest snapshot younger than `interval` seconds."""
+
+    def __init__(self, interval=0, directory='backups', keep=7, pages_per_step=256, step_sleep=0.05,
+                 busy_timeout=5000):
+        self.interval = interval
+        self.directory = directory
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.busy_timeout = busy_timeout
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def configure(self, interval, directory, keep, pages_per_step, step_sleep, busy_timeout):
+        self.interval = interval
+        self.directory = directory
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.busy_timeout = busy_timeout
+
+    def start(self, app):
+        with self._lock:
+            if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+                return
+            with app.app_context():
+                database = database_path()
+            self._thread = threading.Thread(target=self._run, args=(database,), name="backup-scheduler",
+                                            daemon=True)
+            self._thread.start()
+
+    def next_due(self, database):
+        """Seconds until the next snapshot of `database` is due (0 when overdue)."""
+        snapshots = list_snapshots(self.directory, _stem(database))
+        if not snapshots:
+            return 0
+        return max(0.0, os.path.getmtime(snapshots[-1]) + self.interval - time.time())
+
+    def _run(self, database):
+        while True:
+            wait = self.next_due(database)
+            if wait > 0:
+                time.sleep(min(wait, self.interval))
+                continue
+            try:
+                self.run_once(database)
+            except Exception:
+                logger.exception("Scheduled backup of %s failed", database)
+                time.sleep(min(self.interval, 600))  # Retry, but do not spin on a persistent error
+
+    def run_once(self, database):
+        """Take a snapshot unless another process is taking one; return its path or None."""
+        os.makedirs(self.directory, exist_ok=True)
+        lock = os.path.join(self.directory, f".{_stem(database)}.lock")
+        with contextlib.suppress(FileNotFoundError):
+            if time.time() - os.path.getmtime(lock) > LOCK_STALE:
+                os.remove(lock)
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            time.sleep(self.step_sleep * 100)
+            return None
+        try:
+            os.close(fd)
+            if self.next_due(database) > 0:  # Another process just took it
+                return None
+            path = create_snapshot(database, self.directory, self.keep, self.pages_per_step,
+                                   self.step_sleep, self.busy_timeout)
+            logger.info("Backed up %s to %s", database, path)
+            return path
+        finally:
+            os.remove(lock)
+
+
+backup_scheduler = BackupScheduler()
+
+
+def init_app(app):
+    """Apply the BACKUP_* settings of `app` and start the scheduler if BACKUP_INTERVAL is set."""
+    app.config.setdefault('BACKUP_INTERVAL', 0)
+    app.config.setdefault('BACKUP_DIR', os.path.join(app.root_path, 'backups'))
+    app.config.setdefault('BACKUP_KEEP', 7)
+    app.config.setdefault('BACKUP_PAGES_PER_STEP', 256)
+    app.config.setdefault('BACKUP_STEP_SLEEP', 0.05)
+    backup_scheduler.configure(app.config['BACKUP_INTERVAL'],
+                               app.config['BACKUP_DIR'],
+                               app.config['BACKUP_KEEP'],
+                               app.config['BACKUP_PAGES_PER_STEP'],
+                               app.config['BACKUP_STEP_SLEEP'],
+                               app.config.get('SQLITE_BUSY_TIMEOUT', 5000))
+    backup_scheduler.start(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online backups of project.db")
+    parser.add_argument("--dir", help="Backup directory (default: BACKUP_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Take a snapshot now")
+    create.add_argument("--keep", type=int, help="Snapshots to keep (default: BACKUP_KEEP)")
+    commands.add_parser("list", help="List the snapshots")
+    check = commands.add_parser("verify", help="Check a snapshot's integrity")
+    check.add_argument("snapshot")
+    back = commands.add_parser("restore", help="Verify a snapshot and swap it in")
+    back.add_argument("snapshot")
+    back.add_argument("--no-save", action="store_true",
+                      help="Do not snapshot the current database before restoring")
+    args = parser.parse_args()
+
+    from app import create_app  # Deferred: app imports this module
+
+    app = create_app({'BACKUP_INTERVAL': 0})
+    with app.app_context():
+        database = database_path()
+    directory = args.dir or app.config['BACKUP_DIR']
+    busy_timeout = app.config['SQLITE_BUSY_TIMEOUT']
+
+    try:
+        if args.command == "create":
+            keep = app.config['BACKUP_KEEP'] if args.keep is None else args.keep
+            started = time.perf_counter()
+            path = create_snapshot(database, directory, keep, app.config['BACKUP_PAGES_PER_STEP'],
+                                   app.config['BACKUP_STEP_SLEEP'], busy_timeout)
+            print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+        elif args.command == "list":
+            for path in list_snapshots(directory, _stem(database)):
+                print(f"{path}  {os.path.getsize(path) / 1e6:.1f} MB")
+        elif args.command == "verify":
+            problems = verify(args.snapshot)
+            for problem in problems:
+                print(problem)
+            if problems:
+                sys.exit(1)
+            print(f"{args.snapshot}: ok")
+        elif args.command == "restore":
+            saved = restore(args.snapshot, database, None if args.no_save else directory, busy_timeout)
+            if saved:
+                print(f"Saved the current database to {saved}")
+            print(f"Restored {args.snapshot} into {database}. Restart the app to drop its caches.")
+    except BackupError as e:
+        sys.exit(str(e))
+
+
+if __name__ == '__main__':
+    main()
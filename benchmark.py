@@ -0,0 +1,470 @@
+"""
+Synthetic-data benchmarks for the API, import and fitting hot paths.
+
+    python benchmark.py generate --scale medium --csv      # bench/medium/project.db + csv/
+    python benchmark.py run --scale medium --output results.json
+    python benchmark.py compare results.json baseline.json --threshold 0.2
+
+`generate` builds a project.db with deterministic synthetic measurements
+(power-law fluids on the registered spindles) at one of the `SCALES`, and with
+`--csv` the same measurements as a CSV tree in the `import_measurements` layout.
+
+`run` times each case in `CASES` against a scratch copy of that database, so
+edits never change the fixture, and writes the median / p95 / min / mean of
+every case in milliseconds to a JSON results file. With `--baseline` it then
+compares the medians like `compare`, which exits with status 1 when any case is
+more than `--threshold` (a fraction) slower than in the baseline.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, UTC
+
+from sqlalchemy import delete, func, insert, select, text
+
+from app import create_app
+from migrations import migrate
+from models import db, Event, Measurement, Point
+from regression_cache import regression_cache
+import export
+import import_measurements
+import point_store
+import spindles
+import summaries
+
+# name -> (measurements, points per measurement)
+SCALES = {
+    'small': (100, 20),
+    'medium': (10_000, 20),
+    'large': (100_000, 20),
+}
+DEFAULT_DIR = 'bench'
+SESSION_ID = 'benchmark-session'
+LIQUIDS = ('Glycerol', 'Silicone Oil', 'Honey', 'Xanthan Gum', 'Carbopol', 'Latex Paint',
+           'Shampoo', 'Ketchup', 'Yogurt', 'Motor Oil')
+
+
+# --- Synthetic data ---
+
+def synthetic_measurements(count, points_per_measurement, factors, seed=0):
+    """
+    Yield (meas_data, points) for measurements 1..count: a power-law fluid
+    (eta = K * rate^(n-1), with 2% noise) swept over log-spaced speeds.
+    """
+    rng = random.Random(seed)
+    spindle_ids = sorted(factors)
+    speeds = [round(0.3 * 10 ** (2.5 * i / max(points_per_measurement - 1, 1)), 3)
+              for i in range(points_per_measurement)]
+    first_day = date(2020, 1, 1)
+    for meas_id in range(1, count + 1):
+        spindle_id = spindle_ids[meas_id % len(spindle_ids)]
+        factor = factors[spindle_id]
+        consistency = rng.uniform(50, 5000)
+        flow_index = rng.uniform(0.3, 1.0)
+        meas_data = {
+            "id": meas_id,
+            "liquid_name": f"{rng.choice(LIQUIDS)} {meas_id}",
+            "date": first_day + timedelta(days=meas_id % 2000),
+            "serial_id": f"SN-{rng.randrange(10_000):04d}",
+            "spindle_id": spindle_id,
+            "experiment_note": f"Batch {meas_id // 100} at {rng.randint(20, 40)} C",
+            "is_draft": False,
+        }
+        points = []
+        for N in speeds:
+            shear_rate = N * factor
+            eta = consistency * shear_rate ** (flow_index - 1) * rng.gauss(1, 0.02)
+            points.append({
+                "measurement_id": meas_id,
+                "N": N,
+                "eta": eta,
+                "torque": min(100.0, rng.uniform(10, 90)),
+                "shear_rate": shear_rate,
+                "shear_stress": eta * shear_rate * 0.001,
+                "is_draft": False,
+            })
+        yield meas_data, points
+
+
+def write_csv(path, meas_data, points):
+    """Write one measurement in the layout `import_measurements.MAPPING_CONFIG` reads."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        export.write_layout(f, meas_data, [(None, *(p[name] for name in export.COLUMNS)) for p in points])
+
+
+def generate(directory, count, points_per_measurement, csv_dir=None, packed=False,
+             batch_size=1000, seed=0):
+    """
+    Build `directory`/project.db with `count` synthetic measurements (and the
+    CSV tree in `csv_dir`), replacing any previous fixture there.
+    """
+    os.makedirs(directory, exist_ok=True)
+    db_path = os.path.join(directory, 'project.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    if csv_dir:
+        shutil.rmtree(csv_dir, ignore_errors=True)
+        os.makedirs(csv_dir)
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(db_path)})
+    with app.app_context():
+        migrate()
+        factors = spindles.factors()
+        measurement_rows, point_rows = [], []
+
+        def flush():
+            db.session.execute(insert(Measurement), measurement_rows)
+            db.session.execute(insert(Point), point_rows)
+            if packed:
+                point_store.pack([row["id"] for row in measurement_rows])
+            summaries.refresh([row["id"] for row in measurement_rows])
+            db.session.commit()
+            measurement_rows.clear()
+            point_rows.clear()
+
+        for meas_data, points in synthetic_measurements(count, points_per_measurement, factors, seed):
+            measurement_rows.append(meas_data)
+            point_rows.extend(points)
+            if csv_dir:
+                write_csv(os.path.join(csv_dir, f"{meas_data['id']}_synthetic.csv"), meas_data, points)
+            if len(measurement_rows) >= batch_size:
+                flush()
+                print(f"Generated {meas_data['id']}/{count} measurements")
+        if measurement_rows:
+            flush()
+
+        # The inserts above published one event each; a fixture starts quiet
+        db.session.execute(delete(Event))
+        db.session.commit()
+        db.session.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        db.engine.dispose()
+    return db_path
+
+
+# --- Timing ---
+
+class Bench:
+    """A scratch copy of a fixture database with a test client in front of it."""
+
+    def __init__(self, db_path, point_storage='rows', seed=0):
+        self.workdir = tempfile.mkdtemp(prefix='keyin-bench-')
+        self.db_path = os.path.join(self.workdir, 'project.db')
+        # The backup API copies a consistent snapshot even if the fixture is in WAL mode
+        with contextlib.closing(sqlite3.connect(db_path)) as source, \
+                contextlib.closing(sqlite3.connect(self.db_path)) as target:
+            source.backup(target)
+        self.app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + self.db_path,
+            'POINT_STORAGE': point_storage,
+        })
+        self.client = self.app.test_client()
+        self.rng = random.Random(seed)
+        with self.app.app_context():
+            migrate()
+            self.ids = db.session.execute(
+                select(Measurement.id).where(Measurement.is_draft.is_(False)).order_by(Measurement.id)
+            ).scalars().all()
+            self.points = db.session.execute(select(func.count()).select_from(Point)).scalar()
+        if not self.ids:
+            raise SystemExit(f"{db_path} has no measurements: run `python benchmark.py generate` first")
+
+    def close(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def pick(self):
+        return self.rng.choice(self.ids)
+
+    def request(self, method, url, expect=200, **kwargs):
+        response = self.client.open(url, method=method, **kwargs)
+        if response.status_code != expect:
+            raise RuntimeError(f"{method} {url}: {response.status_code} {response.get_data(as_text=True)[:200]}")
+        return response
+
+    def editor(self):
+        """Hold the editor lock for the edit cases."""
+        self.request('POST', '/api/lock/acquire', expect=201,
+                     json={"user_name": "benchmark", "session_id": SESSION_ID})
+        return {'X-Session-ID': SESSION_ID}
+
+
+def summarize(samples):
+    """Return the statistics of a list of durations in seconds, in milliseconds."""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+    return {
+        "n": len(ordered),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def timed(step, repeat, warmup=1):
+    """Call `step()` `warmup` + `repeat` times and return the durations of the last `repeat`.
+
+    A step may return a callable: then only that callable is timed, and the
+    step itself is the untimed setup.
+    """
+    samples = []
+    for i in range(warmup + repeat):
+        call = step()
+        started = time.perf_counter()
+        if callable(call):
+            call()
+        if i >= warmup:
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def case_list(bench, repeat):
+    return timed(lambda: lambda: bench.request('GET', '/api/measurements'), repeat)
+
+
+def case_list_search(bench, repeat):
+    liquids = iter(LIQUIDS * (repeat + 1))
+    return timed(lambda: lambda: bench.request(
+        'GET', '/api/measurements', query_string={"q": next(liquids).split()[0].lower()}), repeat)
+
+
+def case_detail(bench, repeat):
+    return timed(lambda: lambda: bench.request('GET', f'/api/measurements/{bench.pick()}'), repeat)
+
+
+def case_detail_binary(bench, repeat):
+    return timed(lambda: lambda: bench.request(
+        'GET', f'/api/measurements/{bench.pick()}', query_string={"format": "binary"}), repeat)
+
+
+def _regression_case(kind):
+    def case(bench, repeat):
+        def step():
+            regression_cache.clear()  # Time the fit, not the cache
+            measurement_id = bench.pick()
+            return lambda: bench.request('GET', f'/api/measurements/{measurement_id}/{kind}')
+        return timed(step, repeat)
+    return case
+
+
+def case_edit(bench, repeat):
+    """Time edit/start and edit/commit of a one-point change; returns both series."""
+    headers = bench.editor()
+    start_samples, commit_samples = [], []
+    with bench.app.app_context():
+        first_points = dict(db.session.execute(
+            select(Point.measurement_id, func.min(Point.id)).group_by(Point.measurement_id)).all())
+    for i in range(repeat + 1):
+        measurement_id = bench.pick()
+        started = time.perf_counter()
+        draft_id = bench.request('POST', f'/api/measurements/{measurement_id}/edit/start',
+                                 expect=201, headers=headers).get_json()["id"]
+        started_at = time.perf_counter()
+        bench.request('PUT', f'/api/measurements/{draft_id}/points/{first_points[measurement_id]}',
+                      headers=headers, json={"N": 1.5})
+        committing = time.perf_counter()
+        bench.request('POST', f'/api/measurements/{draft_id}/edit/commit', headers=headers)
+        if i:
+            start_samples.append(started_at - started)
+            commit_samples.append(time.perf_counter() - committing)
+    return {"edit_start": start_samples, "edit_commit": commit_samples}
+
+
+CASES = {
+    'list_measurements': case_list,
+    'list_measurements_search': case_list_search,
+    'get_measurement': case_detail,
+    'get_measurement_binary': case_detail_binary,
+    'regression_linear': _regression_case('regression'),
+    'regression_power': _regression_case('power-regression'),
+    'edit': case_edit,
+}
+
+
+def time_bulk_import(csv_dir, repeat, workers=None):
+    """Time `import_measurements.bulk_import` of `csv_dir` into empty databases."""
+    csv_files = sorted(glob.glob(os.path.join(csv_dir, '*.csv')))
+    if not csv_files:
+        raise SystemExit(f"No CSV files in {csv_dir}: run `python benchmark.py generate --csv` first")
+    samples = []
+    for _ in range(repeat):
+        workdir = tempfile.mkdtemp(prefix='keyin-bench-import-')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'project.db')})
+        try:
+            with app.app_context():
+                migrate()
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    import_measurements.bulk_import(csv_files, workers=workers)
+                samples.append(time.perf_counter() - started)
+                db.engine.dispose()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return samples, len(csv_files)
+
+
+def run(db_path, csv_dir=None, repeat=20, import_repeat=1, cases=None, point_storage='rows', seed=0):
+    """Run the benchmark cases and return the results document."""
+    bench = Bench(db_path, point_storage, seed)
+    results = {}
+    try:
+        for name in cases or CASES:
+            print(f"Running {name} ...", flush=True)
+            with bench.app.app_context():
+                samples = CASES[name](bench, repeat)
+                db.session.remove()
+            series = samples if isinstance(samples, dict) else {name: samples}
+            for label, values in series.items():
+                results[label] = summarize(values)
+    finally:
+        bench.close()
+
+    if csv_dir:
+        print("Running bulk_import ...", flush=True)
+        samples, files = time_bulk_import(csv_dir, import_repeat)
+        results["bulk_import"] = {**summarize(samples), "files": files,
+                                  "files_per_s": round(files / statistics.median(samples), 1)}
+
+    return {
+        "created_at": datetime.now(UTC).isoformat(timespec='seconds'),
+        "database": os.path.abspath(db_path),
+        "measurements": len(bench.ids),
+        "points": bench.points,
+        "point_storage": point_storage,
+        "repeat": repeat,
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+# --- Baselines ---
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compare the median of every case present in both documents. Returns
+    (rows, regressions): rows are (case, baseline ms, current ms, ratio).
+    """
+    rows, regressions = [], []
+    for name, current in results["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        ratio = current["median_ms"] / previous["median_ms"] if previous["median_ms"] else math.inf
+        rows.append((name, previous["median_ms"], current["median_ms"], ratio))
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_comparison(rows, regressions, threshold):
+    print(f"{'case':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, previous, current, ratio in rows:
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<28} {previous:>10.2f}ms {current:>10.2f}ms {ratio - 1:>+8.1%}{flag}")
+    if regressions:
+        print(f"{len(regressions)} case(s) more than {threshold:.0%} slower than the baseline")
+    else:
+        print(f"No case more than {threshold:.0%} slower than the baseline")
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def print_results(document):
+    print(f"{document['measurements']} measurements, {document['points']} points "
+          f"({document['point_storage']})")
+    for name, stats in document["results"].items():
+        print(f"  {name:<28} median {stats['median_ms']:>10.2f}ms   p95 {stats['p95_ms']:>10.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API, import and fitting hot paths")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="Build a synthetic fixture database (and CSV tree)")
+    gen.add_argument("--scale", choices=SCALES, default='small')
+    gen.add_argument("--measurements", type=int, help="Override the measurement count of the scale")
+    gen.add_argument("--points", type=int, help="Override the points per measurement of the scale")
+    gen.add_argument("--dir", default=None, help=f"Output directory (default: {DEFAULT_DIR}/<scale>)")
+    gen.add_argument("--csv", action="store_true", help="Also write the CSV tree to <dir>/csv")
+    gen.add_argument("--packed", action="store_true", help="Also build packed point columns")
+    gen.add_argument("--seed", type=int, default=0)
+
+    run_parser = commands.add_parser("run", help="Time the benchmark cases against a fixture")
+    run_parser.add_argument("--scale", choices=SCALES, default='small')
+    run_parser.add_argument("--dir", default=None, help=f"Fixture directory (default: {DEFAULT_DIR}/<scale>)")
+    run_parser.add_argument("--repeat", type=int, default=20, help="Timed calls per case")
+    run_parser.add_argument("--case", action="append", choices=CASES, help="Only run these cases")
+    run_parser.add_argument("--no-import", action="store_true", help="Skip the bulk import case")
+    run_parser.add_argument("--import-repeat", type=int, default=1, help="Timed bulk imports")
+    run_parser.add_argument("--point-storage", choices=('rows', 'packed'), default='rows')
+    run_parser.add_argument("--output", default=None, help="Write the results JSON here")
+    run_parser.add_argument("--baseline", default=None, help="Compare against this results JSON")
+    run_parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Allowed slowdown of the median as a fraction (default: 0.2)")
+    run_parser.add_argument("--seed", type=int, default=0)
+
+    cmp_parser = commands.add_parser("compare", help="Compare a results JSON against a baseline")
+    cmp_parser.add_argument("results")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        rows, regressions = compare(_load(args.results), _load(args.baseline), args.threshold)
+        print_comparison(rows, regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    directory = args.dir or os.path.join(DEFAULT_DIR, args.scale)
+    csv_dir = os.path.join(directory, 'csv')
+
+    if args.command == "generate":
+        count, points = SCALES[args.scale]
+        count = args.measurements or count
+        points = args.points or points
+        started = time.perf_counter()
+        db_path = generate(directory, count, points, csv_dir if args.csv else None,
+                           packed=args.packed, seed=args.seed)
+        print(f"Wrote {db_path}: {count} measurements, {count * points} points "
+              f"in {time.perf_counter() - started:.1f}s")
+        return
+
+    document = run(os.path.join(directory, 'project.db'),
+                   csv_dir=None if args.no_import or not os.path.isdir(csv_dir) else csv_dir,
+                   repeat=args.repeat, import_repeat=args.import_repeat, cases=args.case,
+                   point_storage=args.point_storage, seed=args.seed)
+    print_results(document)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        rows, regressions = compare(document, _load(args.baseline), args.threshold)
+        print_comparison(rows, regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
-# Spindle factors used for shear rate and shear stress calculations
+# Initial spindle factors, copied into the `spindles` table by migrations.py.
+# Change factors afterwards with `python spindles.py`.
 # Shear Rate (1/s) = N (RPM) * Factor
 # Shear Stress (Pa) = eta (mPa·s) * Shear Rate * 0.001
 
@@ -0,0 +1,156 @@
+"""
+Drafts stored as an overlay on their original measurement.
+
+Starting an edit copies only the measurement row. Points added while editing
+belong to the draft; changed and deleted points of the original are recorded
+in `point_overlay`. Reads merge the two on the fly (`merged_rows`), and
+`commit` applies the overlay with a few set-based statements, so edit and
+commit cost grows with the size of the change, not of the measurement.
+"""
+
+from sqlalchemy import and_, case, delete, insert, literal, or_, select, union_all, update
+
+import spindles
+from models import db, Measurement, Point, PointOverlay
+
+VALUE_COLUMNS = ('N', 'eta', 'torque', 'shear_rate', 'shear_stress')
+
+# Bulk statements below never touch objects already loaded in the session
+_NO_SYNC = {"synchronize_session": False}
+
+
+def is_overlay(measurement):
+    """True for drafts that edit an existing measurement (new-measurement drafts own all points)."""
+    return measurement.is_draft and measurement.original_id is not None
+
+
+def create_draft(measurement):
+    """Start a draft of `measurement`; no points are copied."""
+    draft = Measurement(
+        liquid_name=measurement.liquid_name,
+        date=measurement.date,
+        serial_id=measurement.serial_id,
+        spindle_id=measurement.spindle_id,
+        experiment_note=measurement.experiment_note,
+        is_draft=True,
+        original_id=measurement.id
+    )
+    db.session.add(draft)
+    return draft
+
+
+def merged_rows(draft):
+    """Return the points visible in a draft as (id, N, eta, torque, shear_rate, shear_stress), by ID."""
+    edited = PointOverlay.point_id.isnot(None)
+    originals = (
+        select(Point.id, *(
+            case((edited, getattr(PointOverlay, name)), else_=getattr(Point, name)).label(name)
+            for name in VALUE_COLUMNS))
+        .outerjoin(PointOverlay, and_(PointOverlay.draft_id == draft.id, PointOverlay.point_id == Point.id))
+        .where(Point.measurement_id == draft.original_id,
+               or_(PointOverlay.deleted.is_(None), PointOverlay.deleted.is_(False)))
+    )
+    added = select(Point.id, *(getattr(Point, name) for name in VALUE_COLUMNS)).where(
+        Point.measurement_id == draft.id)
+    merged = union_all(originals, added).subquery()
+    return db.session.execute(select(merged).order_by(merged.c.id)).all()
+
+
+def overlay_points(draft, point_ids):
+    """
+    Return {point_id: entry} for the original points of `point_ids` that are
+    visible in the draft, creating overlay entries seeded with the original's
+    values where needed (two queries). Entries have the same value attributes
+    as `Point`, so callers edit both alike.
+    """
+    point_ids = list(point_ids)
+    entries = {entry.point_id: entry for entry in PointOverlay.query.filter(
+        PointOverlay.draft_id == draft.id, PointOverlay.point_id.in_(point_ids))}
+    missing = [point_id for point_id in point_ids if point_id not in entries]
+    if missing:
+        originals = Point.query.filter(
+            Point.measurement_id == draft.original_id, Point.id.in_(missing))
+        for original in originals:
+            entry = PointOverlay(draft_id=draft.id, point_id=original.id,
+                                 **{name: getattr(original, name) for name in VALUE_COLUMNS})
+            db.session.add(entry)
+            entries[original.id] = entry
+    return {point_id: entry for point_id, entry in entries.items() if not entry.deleted}
+
+
+def delete_point(point):
+    """Delete a draft-owned `Point`, or mark an overlay entry as a deletion."""
+    if isinstance(point, PointOverlay):
+        point.deleted = True
+    else:
+        db.session.delete(point)
+
+
+def recompute_shear(measurement, factor):
+    """
+    Recompute shear_rate / shear_stress of every visible point for a spindle
+    factor (None clears them). For overlay drafts, the original's points get
+    overlay entries, since all of them change.
+    """
+    db.session.execute(
+        update(Point).where(Point.measurement_id == measurement.id)
+        .values(spindles.shear_values(Point, factor))
+        .execution_options(**_NO_SYNC))
+    if not is_overlay(measurement):
+        return
+
+    db.session.execute(
+        update(PointOverlay)
+        .where(PointOverlay.draft_id == measurement.id, PointOverlay.deleted.is_(False))
+        .values(spindles.shear_values(PointOverlay, factor))
+        .execution_options(**_NO_SYNC))
+    already = select(PointOverlay.point_id).where(PointOverlay.draft_id == measurement.id)
+    shear = spindles.shear_values(Point, factor)
+    db.session.execute(insert(PointOverlay).from_select(
+        ['draft_id', 'point_id', 'deleted', *VALUE_COLUMNS],
+        select(literal(measurement.id), Point.id, literal(False), Point.N, Point.eta, Point.torque,
+               shear['shear_rate'], shear['shear_stress'])
+        .where(Point.measurement_id == measurement.original_id, Point.id.not_in(already))))
+
+
+def promote(draft):
+    """Turn a new-measurement draft into a production measurement."""
+    draft.is_draft = False
+    db.session.execute(
+        update(Point).where(Point.measurement_id == draft.id).values(is_draft=False)
+        .execution_options(**_NO_SYNC))
+
+
+def commit(draft, original):
+    """
+    Apply the draft's point changes to `original` (metadata is copied by the
+    caller). Returns the IDs of the points changed in place, or None when
+    points were added or deleted.
+    """
+    overlay = db.session.execute(
+        select(PointOverlay.point_id, PointOverlay.deleted).where(PointOverlay.draft_id == draft.id)).all()
+    added = db.session.execute(select(Point.id).where(Point.measurement_id == draft.id).limit(1)).first()
+    in_place = None if added or any(deleted for _, deleted in overlay) else [point_id for point_id, _ in overlay]
+
+    changed = and_(PointOverlay.draft_id == draft.id, PointOverlay.deleted.is_(False),
+                   PointOverlay.point_id == Point.id, Point.measurement_id == original.id)
+    db.session.execute(
+        update(Point).where(changed)
+        .values({name: getattr(PointOverlay, name) for name in VALUE_COLUMNS})
+        .execution_options(**_NO_SYNC))
+
+    deleted = select(PointOverlay.point_id).where(
+        PointOverlay.draft_id == draft.id, PointOverlay.deleted.is_(True))
+    db.session.execute(
+        delete(Point).where(Point.measurement_id == original.id, Point.id.in_(deleted))
+        .execution_options(**_NO_SYNC))
+
+    # Added points move to the original instead of being copied
+    db.session.execute(
+        update(Point).where(Point.measurement_id == draft.id)
+        .values(measurement_id=original.id, is_draft=False)
+        .execution_options(**_NO_SYNC))
+    db.session.execute(
+        delete(PointOverlay).where(PointOverlay.draft_id == draft.id)
+        .execution_options(**_NO_SYNC))
+    return in_place
@@ -0,0 +1,219 @@
+"""
+Change notifications for the `/api/events` server-sent event stream.
+
+Triggers on `measurements` (models.EVENT_DDL) and the lease manager append rows
+to `events`, so every worker process, import script and bulk job publishes
+through the same table. The row ID is the event's version: clients resume after
+a reconnect with `Last-Event-ID`.
+
+One poller thread per process reads new rows every `poll_interval` seconds and
+fans them out to the connected streams. Idle viewers therefore cost one indexed
+query per process per interval in total, instead of a poll request each.
+
+Under a WSGI server every open stream holds a request thread, so a process
+keeps at most `max_streams` of them open. Further clients get a `busy` event
+and a `retry:` hint of `busy_retry` seconds and are disconnected: the browser
+falls back to polling the lock and reconnects by itself after the hint. The
+remaining threads always serve API requests (see serve.py --max-streams).
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import delete, func, select
+
+from models import db, Event
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def format_event(event):
+    """Encode an event dict as one SSE message."""
+    return f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
+
+
+class EventBroker:
+    """Per-process fan-out of new `events` rows to subscriber queues."""
+
+    def __init__(self, poll_interval=1.0, retention=3600, keepalive=15, queue_size=1000,
+                 max_streams=4, busy_retry=30):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.keepalive = keepalive
+        self.queue_size = queue_size
+        self.max_streams = max_streams
+        self.busy_retry = busy_retry
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+
+    def configure(self, poll_interval, retention, keepalive, max_streams, busy_retry):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.keepalive = keepalive
+        self.max_streams = max_streams
+        self.busy_retry = busy_retry
+
+    # --- Poller ---
+
+    def _start(self, app):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._last_id = self.latest_id()
+            self._thread = threading.Thread(target=self._run, args=(app,), name="event-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self, app):
+        last_prune = 0.0
+        while True:
+            time.sleep(self.poll_interval)
+            with app.app_context():
+                try:
+                    if self._subscribers:
+                        self._poll()
+                    if time.monotonic() - last_prune > self.retention / 10:
+                        self.prune()
+                        last_prune = time.monotonic()
+                except Exception:
+                    logger.exception("Event poll failed")
+                finally:
+                    db.session.remove()  # Never keep a read transaction open between polls
+
+    def _poll(self):
+        events = self.since(self._last_id, BATCH_SIZE)
+        if not events:
+            return
+        self._last_id = events[-1]["id"]
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    # A stream that cannot keep up starts over from a fresh list
+                    self._reset(subscriber)
+                    break
+
+    def _reset(self, subscriber):
+        with subscriber.mutex:
+            subscriber.queue.clear()
+        subscriber.put_nowait({"id": self._last_id, "kind": "reset"})
+
+    def prune(self):
+        """Drop events older than `retention` seconds."""
+        cutoff = datetime.now(UTC).replace(tzinfo=None) - timedelta(seconds=self.retention)
+        db.session.execute(delete(Event).where(Event.created_at < cutoff))
+        db.session.commit()
+
+    # --- Reading ---
+
+    def latest_id(self):
+        return db.session.execute(select(func.max(Event.id))).scalar() or 0
+
+    def since(self, last_id, limit=None):
+        """Return the events after `last_id` as dicts, oldest first."""
+        query = select(Event).where(Event.id > last_id).order_by(Event.id)
+        if limit:
+            query = query.limit(limit)
+        return [event.to_dict() for event in db.session.execute(query).scalars()]
+
+    def backlog(self, last_id):
+        """
+        Return the events a client resuming after `last_id` missed, or None
+        when some were already pruned and it has to reload everything.
+        """
+        oldest = db.session.execute(select(func.min(Event.id))).scalar()
+        if oldest is not None and last_id < oldest - 1:
+            return None
+        return self.since(last_id)
+
+    # --- Streams ---
+
+    def subscribe(self, app):
+        """Register a new stream and return its queue, or None when `max_streams` are open."""
+        self._start(app)
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_streams:
+                return None
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, app, last_id=None):
+        """
+        Subscribe and return a generator of SSE messages. Without `last_id` the
+        stream starts with a `ready` event carrying the current version; with
+        it, missed events are replayed first (or a `reset` is sent). Above
+        `max_streams` the stream is only a `busy` event and a retry hint.
+        """
+        subscriber = self.subscribe(app)
+        if subscriber is None:
+            db.session.remove()
+            return self._busy(last_id)
+        if last_id is None:
+            sent = self.latest_id()
+            first = [{"id": sent, "kind": "ready"}]
+        else:
+            sent = last_id
+            first = self.backlog(last_id)
+            if first is None:
+                sent = self.latest_id()
+                first = [{"id": sent, "kind": "reset"}]
+        db.session.remove()  # The stream outlives the request's session
+
+        def generate():
+            nonlocal sent
+            try:
+                yield f"retry: {int(self.poll_interval * 3000)}\n\n"
+                for event in first:
+                    sent = max(sent, event["id"])
+                    yield format_event(event)
+                while True:
+                    try:
+                        event = subscriber.get(timeout=self.keepalive)
+                    except queue.Empty:
+                        yield ": keepalive\n\n"  # Also detects closed connections
+                        continue
+                    if event["kind"] == "reset" or event["id"] > sent:  # Skip replayed events
+                        sent = max(sent, event["id"])
+                        yield format_event(event)
+            finally:
+                self.unsubscribe(subscriber)
+
+        return generate()
+
+    def _busy(self, last_id):
+        # Ending the response makes EventSource reconnect after the retry hint
+        yield f"retry: {int(self.busy_retry * 1000)}\n\n"
+        event = {"id": last_id or 0, "kind": "busy", "retry_after": self.busy_retry}
+        yield f"data: {json.dumps(event)}\n\n"  # No id: keeps the client's Last-Event-ID
+
+
+event_broker = EventBroker()
+
+
+def init_app(app):
+    """Apply the EVENTS_* settings of `app`."""
+    app.config.setdefault('EVENTS_POLL_INTERVAL', 1.0)
+    app.config.setdefault('EVENTS_RETENTION', 3600)
+    app.config.setdefault('EVENTS_KEEPALIVE', 15)
+    app.config.setdefault('EVENTS_MAX_STREAMS', 4)
+    app.config.setdefault('EVENTS_BUSY_RETRY', 30)
+    event_broker.configure(app.config['EVENTS_POLL_INTERVAL'],
+                           app.config['EVENTS_RETENTION'],
+                           app.config['EVENTS_KEEPALIVE'],
+                           app.config['EVENTS_MAX_STREAMS'],
+                           app.config['EVENTS_BUSY_RETRY'])
@@ -0,0 +1,242 @@
+"""
+Streaming export of many measurements.
+
+    layout  A zip of one CSV per measurement, in the layout
+            `import_measurements.MAPPING_CONFIG` reads (re-importable as is)
+    long    One CSV with a row per point and the measurement fields repeated
+    npz     A NumPy archive with one float64 array per measurement, named by its
+            ID, whose rows are the columns listed in `measurements/columns`
+            (point ID first), and the measurement fields as
+            `measurements/<field>` arrays
+
+Rows are read with one query in chunks of `chunk_rows` (`yield_per`) and the
+output is produced per measurement, so memory does not grow with the number of
+points. Only the zip directory (one entry per file, a few hundred bytes) and the
+npz field arrays grow with the number of measurements. Only production
+measurements are exported.
+
+    python export.py --format npz --query "b:<0.6" -o export.npz
+    python export.py --format layout --ids 1,2,3 -o export.zip
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import re
+import sys
+import zipfile
+
+import numpy as np
+from sqlalchemy import and_, select
+
+import rql
+from app import create_app
+from import_measurements import MAPPING_CONFIG
+from migrations import migrate
+from models import db, Measurement, Point
+
+FORMATS = {
+    'layout': ('application/zip', 'zip'),
+    'long': ('text/csv', 'csv'),
+    'npz': ('application/octet-stream', 'npz'),
+}
+CHUNK_ROWS = 5000
+
+FIELDS = ('id', 'liquid_name', 'date', 'serial_id', 'spindle_id', 'experiment_note')
+COLUMNS = ('N', 'eta', 'torque', 'shear_rate', 'shear_stress')
+
+# Labels written next to the fields of the importer layout; they are not read back
+LAYOUT_LABELS = {'liquid_name': 'Sample', 'date': 'Date', 'serial_id': 'Serial', 'spindle_id': 'Spindle'}
+LAYOUT_HEADERS = {'N': 'Speed (RPM)', 'eta': 'Viscosity (mPa.s)', 'torque': 'Torque',
+                  'shear_rate': 'Shear Rate (1/s)', 'shear_stress': 'Shear Stress (Pa)'}
+
+
+def selection(ids=None, query=None):
+    """WHERE clause for the measurements picked by `ids` and the RQL `query` (both optional)."""
+    conditions = []
+    if ids:
+        conditions.append(Measurement.id.in_(list(ids)))
+    compiled = rql.compile_query(query or '')
+    if compiled is not None:
+        conditions.append(compiled)
+    return and_(*conditions) if conditions else None
+
+
+def measurements(condition=None, chunk_rows=CHUNK_ROWS):
+    """
+    Yield (fields, points) per production measurement in ID order, where
+    `fields` is a dict of `FIELDS` and `points` a list of (id, *COLUMNS) tuples.
+    """
+    query = (
+        select(*(getattr(Measurement, name) for name in FIELDS),
+               Point.id, *(getattr(Point, name) for name in COLUMNS))
+        .outerjoin(Point, Point.measurement_id == Measurement.id)
+        .where(Measurement.is_draft.is_(False))
+        .order_by(Measurement.id, Point.id)
+        .execution_options(yield_per=chunk_rows)
+    )
+    if condition is not None:
+        query = query.where(condition)
+    width = len(FIELDS)
+    for _, rows in itertools.groupby(db.session.execute(query), key=lambda row: row[0]):
+        rows = list(rows)
+        fields = dict(zip(FIELDS, rows[0][:width]))
+        yield fields, [tuple(row[width:]) for row in rows if row[width] is not None]
+
+
+def _number(value):
+    return '' if value is None else repr(value)
+
+
+# --- Importer layout ---
+
+def layout_rows(fields, points):
+    """Return the CSV rows of one measurement in the importer layout."""
+    config = MAPPING_CONFIG["measurement"]
+    start_row = config["points_start_row"]
+    width = max([item["col"] for item in config["metadata"]] +
+                [item["col"] for item in MAPPING_CONFIG["points"]]) + 1
+    header = [[''] * width for _ in range(start_row)]
+    for item in config["metadata"]:
+        value = fields.get(item["field"])
+        if item["field"] == 'date':
+            value = value.strftime("%m/%d/%Y") if value else ''
+        header[item["row"]][item["col"]] = value or ''
+        label = LAYOUT_LABELS.get(item["field"])
+        if label and item["col"] > 0:
+            header[item["row"]][item["col"] - 1] = label
+    titles = header[start_row - 1]
+    titles[0] = '#'
+    for item in MAPPING_CONFIG["points"]:
+        titles[item["col"]] = LAYOUT_HEADERS[item["field"]]
+
+    rows = header
+    for index, point in enumerate(points, start=1):
+        row = [''] * width
+        row[0] = index
+        for item, value in zip(MAPPING_CONFIG["points"], point[1:]):
+            text = _number(value)
+            row[item["col"]] = text + '%' if text and item["field"] == 'torque' else text
+        rows.append(row)
+    return rows
+
+
+def write_layout(f, fields, points):
+    """Write one measurement in the importer layout to the text file `f`."""
+    csv.writer(f).writerows(layout_rows(fields, points))
+
+
+def layout_filename(fields):
+    """`<id>_<name>.csv`: the ID prefix is what the importer reads back."""
+    name = re.sub(r'[^\w.-]+', '_', fields['liquid_name'] or '').strip('_.') or 'measurement'
+    return f"{fields['id']}_{name}.csv"
+
+
+class _Sink:
+    """Write-only file that collects the bytes a ZipFile writes until drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _stream_layout(records):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for fields, points in records:
+            text = io.StringIO()
+            write_layout(text, fields, points)
+            archive.writestr(layout_filename(fields), text.getvalue())
+            yield sink.drain()
+    yield sink.drain()
+
+
+# --- Long format ---
+
+def _stream_long(records):
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(['measurement_id', *FIELDS[1:], 'point_id', *COLUMNS])
+    for fields, points in records:
+        date = fields['date'].isoformat() if fields['date'] else ''
+        metadata = [fields['id'], fields['liquid_name'], date, *(fields[name] for name in FIELDS[3:])]
+        writer.writerows([*metadata, point[0], *map(_number, point[1:])] for point in points)
+        yield text.getvalue().encode()
+        text.seek(0)
+        text.truncate()
+    yield text.getvalue().encode()
+
+
+# --- NumPy archive ---
+
+def _write_array(archive, name, array):
+    with archive.open(name + '.npy', 'w') as f:
+        np.lib.format.write_array(f, np.asarray(array), allow_pickle=False)
+
+
+def _stream_npz(records):
+    sink = _Sink()
+    index = {name: [] for name in FIELDS}
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for fields, points in records:
+            # One member per measurement keeps the zip directory small; rows are columns
+            table = np.array(points, dtype=float).reshape(len(points), len(COLUMNS) + 1)  # None -> NaN
+            _write_array(archive, str(fields['id']), np.ascontiguousarray(table.T))
+            for name in FIELDS:
+                index[name].append(fields[name])
+            yield sink.drain()
+        _write_array(archive, 'measurements/columns', np.array(('id',) + COLUMNS))
+        _write_array(archive, 'measurements/id', np.array(index['id'], dtype=np.int64))
+        for name in FIELDS[1:]:
+            values = [value.isoformat() if name == 'date' and value else value or '' for value in index[name]]
+            _write_array(archive, f'measurements/{name}', np.array(values, dtype=str))
+    yield sink.drain()
+
+
+STREAMS = {'layout': _stream_layout, 'long': _stream_long, 'npz': _stream_npz}
+
+
+def stream(fmt, condition=None, chunk_rows=CHUNK_ROWS):
+    """Return a generator of the bytes of an export in `fmt` (see `FORMATS`)."""
+    for data in STREAMS[fmt](measurements(condition, chunk_rows)):
+        if data:
+            yield data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export measurements from project.db")
+    parser.add_argument("--format", choices=FORMATS, default='layout')
+    parser.add_argument("--ids", default='', help="Comma-separated measurement IDs")
+    parser.add_argument("--query", default='', help="RQL filter, e.g. 'b:<0.6'")
+    parser.add_argument("-o", "--output", help="Output file (default: export.<format extension>)")
+    args = parser.parse_args()
+
+    output = args.output or f"export.{FORMATS[args.format][1]}"
+    app = create_app()
+    with app.app_context():
+        migrate()
+        try:
+            ids = [int(i) for i in args.ids.split(',') if i.strip()]
+            condition = selection(ids, args.query)
+        except ValueError as e:
+            sys.exit(f"Invalid selection: {e}")
+        with open(output, 'wb') as f:
+            for data in stream(args.format, condition):
+                f.write(data)
+    print(f"Wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
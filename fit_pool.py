@@ -0,0 +1,87 @@
+"""
+Worker processes for the nonlinear model fits.
+
+The Levenberg-Marquardt loop in `fitting.model_fit` is NumPy calls driven from
+Python, so a large batch would hold the GIL and stall every other request
+thread of the worker. Batches above `inline_points` points are therefore solved
+in a small process pool; the request thread only waits on the result, for at
+most `timeout` seconds. Small batches (one measurement, usually) are cheaper to
+solve inline than to ship to another process.
+
+The pool is started on first use, with the `spawn` method so the children never
+inherit the server's threads or database connections, and again in each forked
+server worker.
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import fitting
+
+
+class FitTimeout(Exception):
+    """Raised when a pooled fit did not finish within the timeout."""
+
+
+class FitPool:
+    """Lazily started process pool for `fitting.model_fit`."""
+
+    def __init__(self, workers=2, timeout=30.0, inline_points=2000):
+        self.workers = workers
+        self.timeout = timeout
+        self.inline_points = inline_points
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, workers, timeout, inline_points):
+        self.shutdown()
+        self.workers = workers
+        self.timeout = timeout
+        self.inline_points = inline_points
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # A pool inherited through fork belongs to the parent process
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor
+
+    def fit(self, model, x, y):
+        """Return `fitting.model_fit(model, x, y)`, solved in the pool when the batch is large."""
+        if not self.workers or x.size <= self.inline_points:
+            return fitting.model_fit(model, x, y)
+        future = self._get_executor().submit(fitting.model_fit, model, x, y)
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise FitTimeout(f"The {model} fit did not finish within {self.timeout:g}s")
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OS); start a fresh pool next time
+            self.shutdown()
+            return fitting.model_fit(model, x, y)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+fit_pool = FitPool()
+
+
+def init_app(app):
+    """Apply the FIT_* settings of `app`."""
+    app.config.setdefault('FIT_WORKERS', min(4, os.cpu_count() or 1))
+    app.config.setdefault('FIT_TIMEOUT', 30.0)
+    app.config.setdefault('FIT_INLINE_POINTS', 2000)
+    fit_pool.configure(app.config['FIT_WORKERS'],
+                       app.config['FIT_TIMEOUT'],
+                       app.config['FIT_INLINE_POINTS'])
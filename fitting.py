@@ -0,0 +1,336 @@
+"""
+Least-squares fits for rheology curves: closed-form linear and power-law fits,
+and the nonlinear models of `MODELS`.
+
+Every fit accepts either one curve (1-D arrays) or a stack of curves (2-D
+arrays, one measurement per row) and fits all rows in a single vectorized pass.
+Ragged sets are padded with NaN by `stack_columns`; NaN entries are ignored.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+LinearFit = namedtuple('LinearFit', 'slope intercept r_squared count x_min x_max')
+PowerFit = namedtuple('PowerFit', 'a b r_squared count x_min x_max')
+
+
+def stack_columns(columns):
+    """Stack 1-D arrays of different lengths into a NaN-padded 2-D array."""
+    width = max((len(c) for c in columns), default=0)
+    stacked = np.full((len(columns), width), np.nan)
+    for row, column in enumerate(columns):
+        stacked[row, :len(column)] = column
+    return stacked
+
+
+def _as_rows(x, y):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return np.atleast_2d(x), np.atleast_2d(y), x.ndim == 1
+
+
+def _least_squares(x, y, mask):
+    """Row-wise y = slope * x + intercept over the entries selected by `mask`."""
+    count = mask.sum(axis=1)
+    safe_count = np.maximum(count, 1)
+    x0 = np.where(mask, x, 0.0)
+    y0 = np.where(mask, y, 0.0)
+    mean_x = x0.sum(axis=1) / safe_count
+    mean_y = y0.sum(axis=1) / safe_count
+
+    dx = np.where(mask, x - mean_x[:, None], 0.0)
+    dy = np.where(mask, y - mean_y[:, None], 0.0)
+    sxx = (dx * dx).sum(axis=1)
+    sxy = (dx * dy).sum(axis=1)
+    syy = (dy * dy).sum(axis=1)
+
+    # A vertical cloud has no unique slope; match the minimum-norm solution
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+    intercept = mean_y - slope * mean_x
+
+    residual = np.where(mask, y - (slope[:, None] * x + intercept[:, None]), 0.0)
+    ss_res = (residual * residual).sum(axis=1)
+    # Constant y: R² is 1 for a perfect fit and 0 otherwise (sklearn's convention)
+    r_squared = np.where(
+        syy > 0,
+        1.0 - np.divide(ss_res, syy, out=np.zeros_like(ss_res), where=syy > 0),
+        np.where(ss_res == 0, 1.0, 0.0))
+
+    too_few = count < 2
+    slope[too_few] = intercept[too_few] = r_squared[too_few] = np.nan
+    return slope, intercept, r_squared, count
+
+
+def _range(x, mask):
+    x_min = np.where(mask, x, np.inf).min(axis=1, initial=np.inf)
+    x_max = np.where(mask, x, -np.inf).max(axis=1, initial=-np.inf)
+    empty = ~mask.any(axis=1)
+    x_min[empty] = x_max[empty] = np.nan
+    return x_min, x_max
+
+
+def _unwrap(fit, single):
+    if not single:
+        return fit
+    return type(fit)(*(value[0].item() for value in fit))
+
+
+def linear_fit(x, y):
+    """Fit y = slope * x + intercept; R² is computed on the raw values."""
+    x, y, single = _as_rows(x, y)
+    mask = ~(np.isnan(x) | np.isnan(y))
+    slope, intercept, r_squared, count = _least_squares(x, y, mask)
+    return _unwrap(LinearFit(slope, intercept, r_squared, count, *_range(x, mask)), single)
+
+
+def power_fit(x, y):
+    """Fit y = a * x^b by least squares in log-log space; R² is in log space."""
+    x, y, single = _as_rows(x, y)
+    with np.errstate(invalid='ignore'):
+        mask = (x > 0) & (y > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_x = np.log(np.where(mask, x, 1.0))
+        log_y = np.log(np.where(mask, y, 1.0))
+    b, log_a, r_squared, count = _least_squares(log_x, log_y, mask)
+    return _unwrap(PowerFit(np.exp(log_a), b, r_squared, count, *_range(x, mask)), single)
+
+
+# --- Nonlinear rheology models ---
+#
+# The models below are fitted with a batched Levenberg-Marquardt solve: every
+# row of the stack takes its own damped Gauss-Newton steps, but all rows are
+# evaluated together, so a comparison set costs about as much as one curve.
+# Parameters are solved in a transformed space (logs for the strictly positive
+# ones, bounds for the others) and the starting point comes from `power_fit`.
+
+ModelFit = namedtuple('ModelFit', 'model params r_squared count iterations converged at_bound x_min x_max')
+
+_LOG_LIMIT = 60.0  # Bound for log-transformed parameters (e^60 ~ 1e26)
+
+
+class Model:
+    """A shear stress model sigma(gamma) with its parameter transform and start values."""
+
+    def __init__(self, name, params, log_params, log_residuals, stress, initial, lower, upper):
+        self.name = name
+        self.params = params
+        self.log_params = np.isin(np.arange(len(params)), log_params)  # solved as log(value)
+        self.log_residuals = log_residuals  # fit log(sigma) instead of sigma
+        self.stress = stress  # (theta rows, x rows) -> sigma
+        self.initial = initial  # (x, y, mask) -> theta rows
+        self.lower = np.array(lower, dtype=float)
+        self.upper = np.array(upper, dtype=float)
+
+    def decode(self, theta):
+        """Solver rows -> parameter values, one column per parameter."""
+        return np.where(self.log_params, np.exp(theta), theta)
+
+    def encode(self, values):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.log_params, np.log(values), values)
+
+
+def _power_start(x, y, mask):
+    """Power-law coefficients per row, with usable defaults where the fit failed."""
+    power = power_fit(np.where(mask, x, np.nan), np.where(mask, y, np.nan))
+    a = np.where(np.isfinite(power.a) & (power.a > 0), power.a, 1.0)
+    b = np.where(np.isfinite(power.b), np.clip(power.b, 0.05, 2.0), 0.5)
+    return a, b
+
+
+def _hb_stress(theta, x):
+    return theta[:, 0:1] + np.exp(theta[:, 1:2]) * x ** np.exp(theta[:, 2:3])
+
+
+def _hb_initial(x, y, mask):
+    # With n from the power law, tau0 and K are a linear fit of sigma on gamma^n
+    a, b = _power_start(x, y, mask)
+    slope, intercept, _, _ = _least_squares(x ** b[:, None], y, mask)
+    k = np.where(np.isfinite(slope) & (slope > 0), slope, a)
+    tau0 = np.where(np.isfinite(intercept), np.maximum(intercept, 0.0), 0.0)
+    return np.column_stack([tau0, np.log(k), np.log(b)])
+
+
+def _viscosity_initial(x, y, mask):
+    """eta0, eta_inf, lambda and the thinning exponent matching the power-law region."""
+    a, b = _power_start(x, y, mask)
+    b = np.minimum(b, 0.95)
+    eta = np.where(mask, y / np.where(mask, x, 1.0), np.nan)
+    eta0 = 2.0 * np.where(mask, eta, -np.inf).max(axis=1, initial=-np.inf)
+    eta_inf = 0.01 * np.where(mask, eta, np.inf).min(axis=1, initial=np.inf)
+    eta0 = np.where(np.isfinite(eta0) & (eta0 > 0), eta0, 1.0)
+    eta_inf = np.where(np.isfinite(eta_inf) & (eta_inf > 0), eta_inf, 1e-3)
+    # eta ~ eta0 * (lambda * gamma)^(b - 1) = a * gamma^(b - 1) where the fluid thins
+    lam = (eta0 / a) ** (1.0 / (1.0 - b))
+    lam = np.where(np.isfinite(lam) & (lam > 0), lam, 1.0)
+    return eta0, eta_inf, lam, b
+
+
+def _cross_stress(theta, x):
+    eta0, lam, m = (np.exp(theta[:, i:i + 1]) for i in (0, 2, 3))
+    eta_inf = theta[:, 1:2]
+    return (eta_inf + (eta0 - eta_inf) / (1.0 + (lam * x) ** m)) * x
+
+
+def _cross_initial(x, y, mask):
+    eta0, eta_inf, lam, b = _viscosity_initial(x, y, mask)
+    return np.column_stack([np.log(eta0), eta_inf, np.log(lam), np.log(1.0 - b)])
+
+
+def _carreau_stress(theta, x):
+    eta0, lam = np.exp(theta[:, 0:1]), np.exp(theta[:, 2:3])
+    eta_inf, n = theta[:, 1:2], theta[:, 3:4]
+    return (eta_inf + (eta0 - eta_inf) * (1.0 + (lam * x) ** 2) ** ((n - 1.0) / 2.0)) * x
+
+
+def _carreau_initial(x, y, mask):
+    eta0, eta_inf, lam, b = _viscosity_initial(x, y, mask)
+    return np.column_stack([np.log(eta0), eta_inf, np.log(lam), b])
+
+
+MODELS = {
+    # sigma = tau0 + K * gamma^n, fitted on sigma (the yield stress is an offset)
+    'herschel_bulkley': Model(
+        'herschel_bulkley', ('tau0', 'k', 'n'), (1, 2), False, _hb_stress, _hb_initial,
+        lower=(0.0, -_LOG_LIMIT, np.log(1e-3)), upper=(np.inf, _LOG_LIMIT, np.log(10.0))),
+    # eta = eta_inf + (eta0 - eta_inf) / (1 + (lambda * gamma)^m), fitted on log(sigma)
+    'cross': Model(
+        'cross', ('eta0', 'eta_inf', 'lambda', 'm'), (0, 2, 3), True, _cross_stress, _cross_initial,
+        lower=(-_LOG_LIMIT, 0.0, -_LOG_LIMIT, np.log(1e-3)), upper=(_LOG_LIMIT, np.inf, _LOG_LIMIT, np.log(5.0))),
+    # eta = eta_inf + (eta0 - eta_inf) * (1 + (lambda * gamma)^2)^((n - 1) / 2), fitted on log(sigma)
+    'carreau': Model(
+        'carreau', ('eta0', 'eta_inf', 'lambda', 'n'), (0, 2), True, _carreau_stress, _carreau_initial,
+        lower=(-_LOG_LIMIT, 0.0, -_LOG_LIMIT, -1.0), upper=(_LOG_LIMIT, np.inf, _LOG_LIMIT, 3.0)),
+}
+
+
+def _residuals(model, theta, x, y, mask):
+    with np.errstate(all='ignore'):
+        predicted = model.stress(theta, x)
+        if model.log_residuals:
+            predicted = np.log(np.maximum(predicted, 1e-300))
+        residual = np.where(mask, predicted - y, 0.0)
+    return np.where(np.isfinite(residual), residual, 1e150)
+
+
+def _cost(residual):
+    return (residual * residual).sum(axis=1)
+
+
+def _solve(normal, gradient):
+    try:
+        return np.linalg.solve(normal, -gradient[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return -(np.linalg.pinv(normal) @ gradient[..., None])[..., 0]
+
+
+def _levenberg_marquardt(model, theta, x, y, mask, max_iter, tol):
+    """Minimize the squared residuals of every row; returns (theta, cost, iterations, converged)."""
+    rows, n_params = theta.shape
+    residual = _residuals(model, theta, x, y, mask)
+    cost = _cost(residual)
+    damping = np.full(rows, 1e-3)
+    iterations = np.zeros(rows, dtype=int)
+    converged = np.zeros(rows, dtype=bool)
+    active = mask.sum(axis=1) >= n_params
+    eye = np.eye(n_params)
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(active)
+        if not idx.size:
+            break
+        t, r, c = theta[idx], residual[idx], cost[idx]
+        xs, ys, ms = x[idx], y[idx], mask[idx]
+
+        # Forward-difference Jacobian, one extra evaluation per parameter
+        jacobian = np.empty(r.shape + (n_params,))
+        for p in range(n_params):
+            h = 1e-7 * np.maximum(np.abs(t[:, p]), 1.0)
+            shifted = t.copy()
+            shifted[:, p] += h
+            jacobian[:, :, p] = (_residuals(model, shifted, xs, ys, ms) - r) / h[:, None]
+        jacobian = np.nan_to_num(jacobian, nan=0.0, posinf=0.0, neginf=0.0)
+        gradient = np.einsum('bni,bn->bi', jacobian, r)
+        # Parameters held at a bound by the gradient stay there for this step
+        blocked = (t <= model.lower) & (gradient > 0) | (t >= model.upper) & (gradient < 0)
+        jacobian[blocked[:, None, :].repeat(jacobian.shape[1], axis=1)] = 0.0
+        gradient[blocked] = 0.0
+
+        normal = np.einsum('bni,bnj->bij', jacobian, jacobian)
+        scale = np.diagonal(normal, axis1=1, axis2=2)
+        damped = normal + damping[idx, None, None] * (scale[:, :, None] * eye + 1e-12 * eye)
+        step = _solve(damped, gradient)
+        trial = np.clip(t + step, model.lower, model.upper)
+        trial_residual = _residuals(model, trial, xs, ys, ms)
+        trial_cost = _cost(trial_residual)
+
+        better = np.isfinite(trial_cost) & (trial_cost < c)
+        theta[idx[better]] = trial[better]
+        residual[idx[better]] = trial_residual[better]
+        cost[idx[better]] = trial_cost[better]
+        damping[idx] = np.where(better, damping[idx] * 0.3, damping[idx] * 10.0)
+        iterations[idx] += 1
+
+        # Done when the cost stops improving, an accepted step vanishes or the
+        # gradient is flat. Rejected steps shrink with the damping, so they
+        # never count as convergence.
+        with np.errstate(all='ignore'):
+            small_gain = better & ((c - trial_cost) <= tol * np.maximum(c, 1e-300))
+            small_step = better & (np.linalg.norm(trial - t, axis=1) <= tol * (np.linalg.norm(t, axis=1) + tol))
+        flat = np.abs(gradient).max(axis=1) <= tol * (1.0 + c)
+        done = small_gain | small_step | flat | (c == 0)
+        converged[idx[done]] = True
+        active[idx[done | (damping[idx] > 1e16)]] = False
+
+    return theta, cost, iterations, converged
+
+
+def model_fit(name, x, y, max_iter=200, tol=1e-10):
+    """
+    Fit the model `name` of `MODELS` to every row. R² is computed in the space
+    the model is fitted in (log space for the viscosity models, like `power_fit`).
+    """
+    model = MODELS[name]
+    x, y, single = _as_rows(x, y)
+    with np.errstate(invalid='ignore'):
+        mask = np.isfinite(x) & np.isfinite(y) & (x > 0)
+        if model.log_residuals:
+            mask &= y > 0
+    x = np.where(mask, x, 1.0)
+    y = np.where(mask, y, 1.0)
+    target = np.log(y) if model.log_residuals else y
+
+    theta = np.clip(np.nan_to_num(model.initial(x, y, mask), nan=0.0), model.lower, model.upper)
+    theta, cost, iterations, converged = _levenberg_marquardt(model, theta, x, target, mask, max_iter, tol)
+
+    count = mask.sum(axis=1)
+    mean = np.where(mask, target, 0.0).sum(axis=1) / np.maximum(count, 1)
+    total = (np.where(mask, target - mean[:, None], 0.0) ** 2).sum(axis=1)
+    r_squared = np.where(total > 0, 1.0 - cost / np.where(total > 0, total, 1.0), np.where(cost == 0, 1.0, 0.0))
+    params = dict(zip(model.params, model.decode(theta).T.copy()))
+    # A parameter that ends on its bound is a limit of the search, not a fitted value
+    at_bound = dict(zip(model.params, ((theta <= model.lower) | (theta >= model.upper)).T.copy()))
+
+    too_few = count < len(model.params)
+    r_squared[too_few] = np.nan
+    for values in params.values():
+        values[too_few] = np.nan
+    converged[too_few] = False
+    for values in at_bound.values():
+        values[too_few] = False
+    fit = ModelFit(name, params, r_squared, count, iterations, converged, at_bound, *_range(x, mask))
+    if not single:
+        return fit
+    return fit._replace(params={k: v[0].item() for k, v in params.items()},
+                        at_bound={k: v[0].item() for k, v in at_bound.items()},
+                        **{field: getattr(fit, field)[0].item()
+                           for field in ('r_squared', 'count', 'iterations', 'converged', 'x_min', 'x_max')})
+
+
+def model_stress(name, params, x):
+    """Evaluate the fitted model `name` at shear rates `x` for one row of `params`."""
+    model = MODELS[name]
+    theta = model.encode(np.array([[params[p] for p in model.params]], dtype=float))
+    with np.errstate(all='ignore'):
+        return model.stress(theta, np.atleast_2d(np.asarray(x, dtype=float)))[0]
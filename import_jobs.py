@@ -0,0 +1,322 @@
+"""
+Background import of uploaded CSV files.
+
+`POST /api/import/jobs` stores the uploaded CSVs (or the CSVs of an uploaded
+zip) under `IMPORT_UPLOAD_DIR/<job id>/`, records an `ImportJob` with one
+`ImportJobFile` per file and answers 202 right away. The jobs are queued in the
+database, so any worker process may run them and queued jobs survive a restart.
+
+Each process that has served an import request runs `IMPORT_WORKERS` threads.
+Each thread claims the oldest queued job with a conditional UPDATE, parses its
+files with `import_measurements.parse_csv` (the `MAPPING_CONFIG` layout) and
+inserts them in batches of about `IMPORT_BATCH_SIZE` points. Every batch
+commits the rows together with the per-file results and the job counters, so a
+job whose worker died (no heartbeat for `IMPORT_STALE_AFTER` seconds) is simply
+claimed again and resumes with its remaining files.
+
+Files follow the CLI importer's rules: the name starts with the measurement ID
+(`42_water.csv`), and IDs that already exist are skipped.
+"""
+
+import csv
+import logging
+import os
+import shutil
+import threading
+import zipfile
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import and_, func, or_, select, update
+from werkzeug.utils import secure_filename
+
+from import_measurements import flush_bulk, measurement_id_from_filename, parse_csv
+from models import db, ImportJob, ImportJobFile, Measurement
+
+logger = logging.getLogger(__name__)
+
+FILES_PER_BATCH = 500
+
+
+class UploadError(ValueError):
+    """Raised for uploads that cannot be queued."""
+
+
+class UploadTooLarge(UploadError):
+    """Raised for uploads that unpack to more than IMPORT_MAX_EXTRACTED bytes or IMPORT_MAX_FILES files."""
+
+
+def _now():
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+# --- Uploads ---
+
+def _csv_name(name):
+    """Safe file name for an uploaded CSV, or None for anything else."""
+    name = secure_filename(os.path.basename(name.replace('\\', '/')))
+    if not name.lower().endswith('.csv') or name.startswith('.'):
+        return None
+    return name
+
+
+def _extract_zip(stream, directory, max_bytes, max_files):
+    """
+    Extract the CSV members of a zip into `directory`; return (names, bytes written).
+    The member count and declared sizes are checked before anything is written,
+    and the bytes actually inflated while extracting, since headers can lie.
+    """
+    names = []
+    written = 0
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            members = archive.infolist()
+            if len(members) > max_files:
+                raise UploadTooLarge(f"The zip has more than {max_files} members")
+            members = [(member, _csv_name(member.filename)) for member in members
+                       if not member.is_dir() and '__MACOSX/' not in member.filename]
+            members = [(member, name) for member, name in members if name is not None]
+            if sum(member.file_size for member, _ in members) > max_bytes:
+                raise UploadTooLarge(f"The zip unpacks to more than {max_bytes} bytes")
+            for member, name in members:
+                with archive.open(member) as src, open(os.path.join(directory, name), 'wb') as out:
+                    while chunk := src.read(1024 * 1024):
+                        written += len(chunk)
+                        if written > max_bytes:
+                            raise UploadTooLarge(f"The zip unpacks to more than {max_bytes} bytes")
+                        out.write(chunk)
+                names.append(name)
+    except zipfile.BadZipFile as e:
+        raise UploadError(f"Invalid zip file: {e}") from e
+    return names, written
+
+
+def create_job(uploads, upload_dir, user_name=None, max_bytes=2 * 1024 ** 3, max_files=100_000):
+    """
+    Store `uploads` (werkzeug FileStorage objects: CSVs or zips of CSVs) and
+    queue them as one job; returns the committed `ImportJob`. Zips may unpack
+    to at most `max_bytes` and the job may hold at most `max_files` files.
+    """
+    job = ImportJob(status='uploading', user_name=user_name)
+    db.session.add(job)
+    db.session.commit()  # The ID names the upload directory
+    directory = os.path.join(upload_dir, str(job.id))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        names = []
+        for upload in uploads:
+            if (upload.filename or '').lower().endswith('.zip'):
+                extracted, written = _extract_zip(upload.stream, directory, max_bytes, max_files - len(names))
+                names += extracted
+                max_bytes -= written
+                continue
+            name = _csv_name(upload.filename or '')
+            if name is None:
+                raise UploadError(f"Not a CSV or zip file: {upload.filename}")
+            upload.save(os.path.join(directory, name))
+            names.append(name)
+            if len(names) > max_files:
+                raise UploadTooLarge(f"More than {max_files} files in the upload")
+        names = sorted(set(names))  # Same name twice: the later upload replaced the file
+        if not names:
+            raise UploadError("No CSV files in the upload")
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        db.session.delete(job)
+        db.session.commit()
+        raise
+    job.files = [ImportJobFile(filename=name) for name in names]
+    job.total_files = len(names)
+    job.status = 'queued'
+    db.session.commit()
+    return job
+
+
+def job_payload(job, with_files=True):
+    """Status of a job with its counters, throughput and (optionally) per-file results."""
+    end = job.finished_at or _now()
+    elapsed = (end - job.started_at).total_seconds() if job.started_at else 0.0
+    payload = {
+        "id": job.id, "status": job.status, "user_name": job.user_name,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "total_files": job.total_files, "processed_files": job.processed_files,
+        "imported": job.imported, "skipped": job.skipped, "failed": job.failed, "points": job.points,
+        "elapsed": elapsed,
+        "files_per_second": job.processed_files / elapsed if elapsed > 0 else None,
+        "points_per_second": job.points / elapsed if elapsed > 0 else None,
+        "error": job.error,
+    }
+    if with_files:
+        payload["files"] = [f.to_dict() for f in job.files]
+    return payload
+
+
+# --- Running jobs ---
+
+class ImportQueue:
+    """Per-process worker threads that claim and run queued import jobs."""
+
+    def __init__(self, workers=1, upload_dir='uploads', batch_size=50000, poll_interval=2.0, stale_after=300):
+        self.workers = workers
+        self.upload_dir = upload_dir
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._threads = []
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def configure(self, workers, upload_dir, batch_size, poll_interval, stale_after):
+        self.workers = workers
+        self.upload_dir = upload_dir
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+
+    def start(self, app):
+        """Start the worker threads of this process (once) and wake them."""
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run, args=(app,), name=f"import-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self._wake.set()
+
+    def _run(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    while (job_id := self.claim()) is not None:
+                        self.run_job(job_id)
+                except Exception:
+                    logger.exception("Import worker failed")
+                finally:
+                    db.session.remove()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def claim(self):
+        """Mark the oldest runnable job as running for this worker; return its ID or None."""
+        stale = _now() - timedelta(seconds=self.stale_after)
+        runnable = or_(ImportJob.status == 'queued',
+                       and_(ImportJob.status == 'running', ImportJob.heartbeat_at < stale))
+        while True:
+            job_id = db.session.execute(
+                select(ImportJob.id).where(runnable).order_by(ImportJob.id).limit(1)).scalar()
+            if job_id is None:
+                db.session.rollback()
+                return None
+            now = _now()
+            claimed = db.session.execute(
+                update(ImportJob).where(ImportJob.id == job_id, runnable)
+                .values(status='running', heartbeat_at=now,
+                        started_at=func.coalesce(ImportJob.started_at, now))
+                .execution_options(synchronize_session=False)).rowcount
+            db.session.commit()
+            if claimed:
+                return job_id  # Otherwise another worker was faster: try the next one
+
+    def run_job(self, job_id):
+        job = db.session.get(ImportJob, job_id)
+        directory = os.path.join(self.upload_dir, str(job.id))
+        try:
+            pending = [f for f in job.files if f.status == 'queued']
+            self._import_files(job, directory, pending)
+            job.status = 'done'
+        except Exception as e:
+            logger.exception("Import job %s failed", job_id)
+            db.session.rollback()
+            job = db.session.get(ImportJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = _now()
+        db.session.commit()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def _import_files(self, job, directory, files):
+        batch, measurement_rows, point_rows = [], [], []
+        seen = set()
+        ids = {measurement_id_from_filename(f.filename) for f in files} - {None}
+        existing = set(db.session.execute(select(Measurement.id).where(Measurement.id.in_(ids))).scalars())
+
+        def flush():
+            # IDs created since the job started are skipped as well
+            ids = [row["id"] for row in measurement_rows]
+            created = set(db.session.execute(select(Measurement.id).where(Measurement.id.in_(ids))).scalars())
+            kept = [row for row in measurement_rows if row["id"] not in created]
+            for result in batch:
+                if result.status == 'imported' and result.measurement_id in created:
+                    result.status, result.points = 'skipped', None
+                    result.message = f"Measurement {result.measurement_id} already exists"
+            job.processed_files += len(batch)
+            job.imported += sum(r.status == 'imported' for r in batch)
+            job.skipped += sum(r.status == 'skipped' for r in batch)
+            job.failed += sum(r.status == 'failed' for r in batch)
+            job.points += sum(r.points or 0 for r in batch if r.status == 'imported')
+            job.heartbeat_at = _now()
+            flush_bulk(kept, [p for p in point_rows if p["measurement_id"] not in created])  # Commits
+            batch.clear()
+            measurement_rows.clear()
+            point_rows.clear()
+
+        for result in files:
+            self._parse_file(result, directory, existing, seen, measurement_rows, point_rows)
+            batch.append(result)
+            if len(point_rows) >= self.batch_size or len(batch) >= FILES_PER_BATCH:
+                flush()
+        flush()
+
+    def _parse_file(self, result, directory, existing, seen, measurement_rows, point_rows):
+        """Parse one file into the pending rows and fill in its result."""
+        meas_id = measurement_id_from_filename(result.filename)
+        result.measurement_id = meas_id
+        if meas_id is None:
+            result.status = 'failed'
+            result.message = "The file name must start with the measurement ID, e.g. 42_water.csv"
+            return
+        if meas_id in existing:
+            result.status = 'skipped'
+            result.message = f"Measurement {meas_id} already exists"
+            return
+        if meas_id in seen:
+            result.status = 'skipped'
+            result.message = f"Another file of this job already has ID {meas_id}"
+            return
+        try:
+            parsed = parse_csv(os.path.join(directory, result.filename))
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            result.status, result.message = 'failed', f"Cannot read the file: {e}"
+            return
+        if parsed is None:
+            result.status, result.message = 'failed', "Too short for the measurement CSV layout"
+            return
+        meas_data, points = parsed
+        if not meas_data.get("liquid_name"):
+            result.status, result.message = 'skipped', "Missing liquid name"
+            return
+        seen.add(meas_id)
+        measurement_rows.append(meas_data)
+        point_rows.extend(points)
+        result.status, result.points = 'imported', len(points)
+
+
+import_queue = ImportQueue()
+
+
+def init_app(app):
+    """Apply the IMPORT_* settings of `app`; the workers start with the first import request."""
+    app.config.setdefault('IMPORT_WORKERS', 1)
+    app.config.setdefault('IMPORT_UPLOAD_DIR', os.path.join(app.root_path, 'uploads'))
+    app.config.setdefault('IMPORT_BATCH_SIZE', 50000)
+    app.config.setdefault('IMPORT_POLL_INTERVAL', 2.0)
+    app.config.setdefault('IMPORT_STALE_AFTER', 300)
+    app.config.setdefault('IMPORT_MAX_UPLOAD', 512 * 1024 * 1024)
+    app.config.setdefault('IMPORT_MAX_EXTRACTED', 2 * 1024 ** 3)
+    app.config.setdefault('IMPORT_MAX_FILES', 100_000)
+    import_queue.configure(app.config['IMPORT_WORKERS'],
+                           app.config['IMPORT_UPLOAD_DIR'],
+                           app.config['IMPORT_BATCH_SIZE'],
+                           app.config['IMPORT_POLL_INTERVAL'],
+                           app.config['IMPORT_STALE_AFTER'])
@@ -3,9 +3,15 @@ import csv
 import glob
 import re
 import argparse
-from datetime import datetime
-from app import create_app
-from models import db, Measurement, Point
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, UTC
+from sqlalchemy import delete, insert, select
+from api import touch_measurement
+from models import db, Measurement, Point, ImportManifest
+import point_store
+import summaries
 
 # Configuration-driven mapping for easy maintenance
 # Update this object if the CSV layout or Database field names change.
@@ -55,79 +61,324 @@ MAPPING_CONFIG = {
     ]
 }
 
-def import_csv(file_path):
+def measurement_id_from_filename(file_path):
+    """Return the measurement ID encoded in the filename prefix, or None."""
     filename = os.path.basename(file_path)
     if filename.startswith('.~lock'):
-        return
+        return None
 
     # Extract ID from filename prefix
     match = re.match(r'^(\d+)_', filename)
     if not match:
-        return
-    meas_id = int(match.group(1))
+        return None
+    return int(match.group(1))
+
 
+def compile_mapping(config):
+    """
+    Precompute the lookups parse_rows needs (max column, anchor column, field
+    tuples) once, instead of re-deriving them from the config for every row.
+    """
+    point_items = config["points"]
+    return {
+        "metadata": config["measurement"]["metadata"],
+        "points_start_row": config["measurement"]["points_start_row"],
+        "points": [(item["field"], item["col"], item["transform"]) for item in point_items],
+        "max_col": max(item["col"] for item in point_items),
+        "rpm_col": next(item["col"] for item in point_items if item["field"] == "N"),
+    }
+
+
+COMPILED_MAPPING = compile_mapping(MAPPING_CONFIG)
+
+
+def extract_metadata(header, meas_id, mapping=COMPILED_MAPPING):
+    """Extract measurement metadata from the header rows of one CSV."""
+    meas_data = {"id": meas_id, "is_draft": False}
+    for item in mapping["metadata"]:
+        try:
+            if item["field"] == "experiment_note":
+                raw_val = ""
+                for c in range(0, 3):
+                    for r in range(0, 2):
+                        raw_val += header[item["row"] + r][item["col"] + c]
+                        raw_val += " "
+            else:
+                raw_val = header[item["row"]][item["col"]]
+            meas_data[item["field"]] = item["transform"](raw_val)
+        except IndexError:
+            meas_data[item["field"]] = None
+    return meas_data
+
+
+def parse_rows(rows, meas_id, mapping=COMPILED_MAPPING):
+    """
+    Extract measurement metadata and point dicts from an iterable of CSV rows.
+    Rows are consumed as a stream; only the header rows are kept in memory.
+    Returns (meas_data, points), or None if the file is too short.
+    """
+    start_row = mapping["points_start_row"]
+    max_col = mapping["max_col"]
+    rpm_col = mapping["rpm_col"]
+    point_fields = mapping["points"]
+
+    header = []
+    points = []
+    for row_idx, row in enumerate(rows):
+        if row_idx < start_row:
+            header.append(row)
+            continue
+
+        # Skip rows that don't have enough columns for our mapping
+        if len(row) <= max_col:
+            continue
+
+        # Anchor check: Skip if RPM (N) is empty
+        if not row[rpm_col].strip():
+            continue
+
+        point_data = {"measurement_id": meas_id, "is_draft": False}
+        try:
+            for field, col, transform in point_fields:
+                point_data[field] = transform(row[col])
+
+            # Requirements check: N and eta are mandatory for a valid point
+            if point_data["N"] is not None and point_data["eta"] is not None:
+                points.append(point_data)
+        except (ValueError, IndexError):
+            continue
+
+    if len(header) < start_row:
+        return None
+    return extract_metadata(header, meas_id, mapping), points
+
+
+def parse_csv(file_path):
+    """Parse one CSV file into (meas_data, points), or None if it is not importable."""
+    meas_id = measurement_id_from_filename(file_path)
+    if meas_id is None:
+        return None
     with open(file_path, 'r', encoding='utf-8') as f:
-        reader = list(csv.reader(f))
+        return parse_rows(csv.reader(f), meas_id)
 
-        if len(reader) < MAPPING_CONFIG["measurement"]["points_start_row"]:
-            return
 
-        # Check for existence using modern Session.get()
-        if db.session.get(Measurement, meas_id):
-            print(f"Skipping existing measurement {meas_id} ({filename})")
-            return
+def import_csv(file_path):
+    meas_id = measurement_id_from_filename(file_path)
+    if meas_id is None:
+        return
+    filename = os.path.basename(file_path)
+
+    # Check for existence using modern Session.get()
+    if db.session.get(Measurement, meas_id):
+        print(f"Skipping existing measurement {meas_id} ({filename})")
+        return
+
+    parsed = parse_csv(file_path)
+    if parsed is None:
+        return
+    meas_data, points = parsed
+
+    measurement = Measurement(**meas_data)
+    db.session.add(measurement)
+    for point_data in points:
+        db.session.add(Point(**point_data))
+
+    summaries.mark_dirty(measurement)
+    db.session.commit()
+    print(f"Imported ID {meas_id} | {meas_data['liquid_name']} | {len(points)} points")
 
-        # Extract Measurement Metadata
-        meas_data = {"id": meas_id, "is_draft": False}
-        for item in MAPPING_CONFIG["measurement"]["metadata"]:
-            try:
-                if item["field"] == "experiment_note":
-                    raw_val = ""
-                    for c in range(0, 3):
-                        for r in range(0, 2):
-                            raw_val += reader[item["row"] + r][item["col"] + c]
-                            raw_val += " "
-                else:
-                    raw_val = reader[item["row"]][item["col"]]
-                meas_data[item["field"]] = item["transform"](raw_val)
-            except IndexError:
-                meas_data[item["field"]] = None
-
-        measurement = Measurement(**meas_data)
-        db.session.add(measurement)
-
-        # Extract Points
-        points_added = 0
-        start_row = MAPPING_CONFIG["measurement"]["points_start_row"]
-        for row_idx in range(start_row, len(reader)):
-            row = reader[row_idx]
-
-            # Skip rows that don't have enough columns for our mapping
-            max_col = max(item["col"] for item in MAPPING_CONFIG["points"])
-            if len(row) <= max_col:
-                continue
 
-            # Anchor check: Skip if RPM (N) is empty
-            rpm_col = next(item["col"] for item in MAPPING_CONFIG["points"] if item["field"] == "N")
-            if not row[rpm_col].strip():
+def _parse_for_bulk(file_path):
+    """Process-pool worker: parse one file, never raising."""
+    try:
+        return file_path, parse_csv(file_path), None
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        return file_path, None, str(e)
+
+
+def flush_bulk(measurement_rows, point_rows):
+    """Insert one batch with core executemany statements in a single transaction."""
+    if measurement_rows:
+        db.session.execute(insert(Measurement), measurement_rows)
+    if point_rows:
+        db.session.execute(insert(Point), point_rows)
+    if point_store.packed_mode():
+        point_store.pack([row["id"] for row in measurement_rows])
+    summaries.refresh([row["id"] for row in measurement_rows])
+    db.session.commit()
+
+
+def bulk_import(csv_files, workers=None, batch_size=50000):
+    """
+    Import many files: parse across a process pool, check existence with one
+    query and insert measurements and points in large executemany batches.
+    """
+    started = time.perf_counter()
+
+    # One query for every existing ID instead of a lookup per file
+    existing = set(db.session.execute(select(Measurement.id)).scalars())
+    candidates = []
+    for file_path in csv_files:
+        meas_id = measurement_id_from_filename(file_path)
+        if meas_id is None:
+            continue
+        if meas_id in existing:
+            print(f"Skipping existing measurement {meas_id} ({os.path.basename(file_path)})")
+            continue
+        existing.add(meas_id)  # Later files with the same ID are duplicates
+        candidates.append(file_path)
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(candidates) // (workers * 4))
+    measurement_rows, point_rows = [], []
+    files_imported = points_imported = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for file_path, parsed, error in pool.map(_parse_for_bulk, candidates, chunksize=chunksize):
+            filename = os.path.basename(file_path)
+            if error:
+                print(f"Failed to read {filename}: {error}")
                 continue
+            if parsed is None:
+                continue
+            meas_data, points = parsed
+            if not meas_data.get("liquid_name"):
+                print(f"Skipping {filename}: missing liquid name")
+                continue
+
+            measurement_rows.append(meas_data)
+            point_rows.extend(points)
+            files_imported += 1
+            points_imported += len(points)
+
+            if len(point_rows) >= batch_size:
+                flush_bulk(measurement_rows, point_rows)
+                measurement_rows, point_rows = [], []
+
+    flush_bulk(measurement_rows, point_rows)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"Imported {files_imported} files ({points_imported} points) in {elapsed:.2f}s: "
+          f"{files_imported / elapsed:.1f} files/s, {points_imported / elapsed:.0f} points/s")
+
+
+def content_hash(file_path):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def holds_file_data(measurement, meas_data, points):
+    """True when a production measurement still holds exactly the metadata and readings of a file."""
+    if measurement.is_draft or any(getattr(measurement, field) != value for field, value in meas_data.items()):
+        return False
+    stored = db.session.execute(
+        select(Point.N, Point.eta, Point.torque).where(Point.measurement_id == measurement.id).order_by(Point.id)
+    ).all()
+    return [tuple(row) for row in stored] == [(p["N"], p["eta"], p["torque"]) for p in points]
 
-            point_data = {"measurement": measurement, "is_draft": False}
-            try:
-                for item in MAPPING_CONFIG["points"]:
-                    raw_val = row[item["col"]]
-                    point_data[item["field"]] = item["transform"](raw_val)
-
-                # Requirements check: N and eta are usually mandatory for a valid point
-                if point_data.get("N") is not None:
-                    point = Point(**point_data)
-                    db.session.add(point)
-                    points_added += 1
-            except (ValueError, IndexError):
+
+def _has_draft(measurement_id):
+    return db.session.execute(select(Measurement.id).where(
+        Measurement.original_id == measurement_id, Measurement.is_draft.is_(True)).limit(1)).first() is not None
+
+
+def incremental_import(csv_files, commit_every=200):
+    """
+    Import only new or changed files, tracked in the import manifest.
+    Files whose size and mtime match the manifest are skipped without being
+    opened. A changed file replaces its measurement only if the manifest
+    already maps it to that measurement; other existing IDs are left alone.
+    A file that is not in the manifest yet but whose measurement still holds
+    exactly its data (e.g. from an earlier plain or bulk import) is recorded
+    without touching the rows, so later changes to it are picked up.
+    """
+    manifest = {entry.path: entry for entry in ImportManifest.query.all()}
+    counts = {"unchanged": 0, "imported": 0, "replaced": 0, "skipped": 0}
+    pending = 0
+
+    for file_path in csv_files:
+        meas_id = measurement_id_from_filename(file_path)
+        if meas_id is None:
+            continue
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        entry = manifest.get(path)
+        if entry and entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+            counts["unchanged"] += 1
+            continue
+
+        digest = content_hash(path)
+        if entry and entry.content_hash == digest:
+            # Touched but identical: remember the new stat so the next run skips it
+            entry.size, entry.mtime = stat.st_size, stat.st_mtime
+            counts["unchanged"] += 1
+            pending += 1
+        else:
+            parsed = parse_csv(path)
+            if parsed is None or not parsed[0].get("liquid_name"):
+                counts["skipped"] += 1
                 continue
+            meas_data, points = parsed
+
+            filename = os.path.basename(path)
+            measurement = db.session.get(Measurement, meas_id)
+            tracked = entry is not None and entry.measurement_id == meas_id
+            if measurement is not None and not tracked:
+                if holds_file_data(measurement, meas_data, points):
+                    # Imported before the manifest existed: track it, keep the rows
+                    entry = ImportManifest(path=path, size=stat.st_size, mtime=stat.st_mtime,
+                                           content_hash=digest, measurement_id=meas_id)
+                    db.session.add(entry)
+                    manifest[path] = entry
+                    counts["unchanged"] += 1
+                    pending += 1
+                else:
+                    # Edited in the UI since the import, or another measurement with the same ID
+                    print(f"Skipping existing measurement {meas_id} ({filename}): it differs from the file")
+                    counts["skipped"] += 1
+            elif measurement is not None and (measurement.is_draft or _has_draft(meas_id)):
+                print(f"Skipping measurement {meas_id} ({filename}): it is being edited")
+                counts["skipped"] += 1
+            else:
+                replaced = measurement is not None
+                if replaced:
+                    for field, value in meas_data.items():
+                        setattr(measurement, field, value)
+                    db.session.execute(delete(Point).where(Point.measurement_id == meas_id))
+                    counts["replaced"] += 1
+                else:
+                    measurement = Measurement(**meas_data)
+                    db.session.add(measurement)
+                    counts["imported"] += 1
+                db.session.flush()
+                if points:
+                    db.session.execute(insert(Point), points)
+                touch_measurement(measurement)
+
+                if entry is None:
+                    entry = ImportManifest(path=path)
+                    db.session.add(entry)
+                    manifest[path] = entry
+                entry.size, entry.mtime = stat.st_size, stat.st_mtime
+                entry.content_hash = digest
+                entry.measurement_id = meas_id
+                entry.imported_at = datetime.now(UTC).replace(tzinfo=None)
+                pending += 1
+                print(f"{'Re-imported' if replaced else 'Imported'} ID {meas_id} | "
+                      f"{meas_data['liquid_name']} | {len(points)} points")
+
+        if pending >= commit_every:
+            db.session.commit()
+            pending = 0
+
+    db.session.commit()
+    print(f"Incremental import: {counts['imported']} new, {counts['replaced']} replaced, "
+          f"{counts['unchanged']} unchanged, {counts['skipped']} skipped")
 
-        db.session.commit()
-        print(f"Imported ID {meas_id} | {meas_data['liquid_name']} | {points_added} points")
 
 def main():
     parser = argparse.ArgumentParser(description="Import Rheology CSV files into project.db")
@@ -136,11 +387,31 @@ def main():
         default="measurement_csv_test",
         help="Directory containing CSV files (default: measurement_csv_test)"
     )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--bulk", action="store_true",
+        help="Parse files in parallel and insert them in large batched transactions"
+    )
+    mode.add_argument(
+        "--incremental", action="store_true",
+        help="Use the import manifest to skip unchanged files and re-import changed ones"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Parser processes for --bulk (default: CPU count)"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=50000,
+        help="Points inserted per transaction in --bulk mode (default: 50000)"
+    )
     args = parser.parse_args()
 
+    from app import create_app  # Deferred: app imports this module through import_jobs
+    from migrations import migrate
+
     app = create_app()
     with app.app_context():
-        db.create_all()
+        migrate()
 
         input_path = args.input
         if not os.path.exists(input_path):
@@ -153,8 +424,13 @@ def main():
             return
 
         print(f"Found {len(csv_files)} files in '{input_path}'. Starting import...")
-        for f in sorted(csv_files):
-            import_csv(f)
+        if args.bulk:
+            bulk_import(sorted(csv_files), workers=args.workers, batch_size=args.batch_size)
+        elif args.incremental:
+            incremental_import(sorted(csv_files))
+        else:
+            for f in sorted(csv_files):
+                import_csv(f)
         print("Done.")
 
 if __name__ == '__main__':
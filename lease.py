@@ -0,0 +1,212 @@
+"""
+Lease manager for the global editor lock.
+
+The holder is kept in memory and the `global_lock` row is only written when
+ownership changes or, for heartbeats, at most every `write_interval` seconds.
+Ownership changes are also published as `lock.*` events (see events.py).
+A lock check that hits the cache costs no SQL at all.
+
+The row is the shared state between worker processes. It always has ID 1, and
+acquiring is a single conditional upsert that only replaces a holder whose
+heartbeat is older than `timeout`, so two workers can never both win. A cached
+holder is trusted for `revalidate` seconds by read-only status checks; `check`,
+which guards every write, always re-reads the row (one primary-key SELECT), so
+a lock taken over in another worker is never written through. Checks from any
+other session, and expired leases, also re-read the row first. Since heartbeats are written at least
+every `write_interval` seconds while the holder is active, the row never looks
+stale to another worker while it is in use (`write_interval` < `timeout`).
+"""
+
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, Event, GlobalLock
+
+LEASE_ID = 1
+
+
+def _now():
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+class Lease:
+    """The current holder as seen by this process."""
+
+    def __init__(self, session_id, user_name, heartbeat):
+        self.session_id = session_id
+        self.user_name = user_name
+        self.written = heartbeat  # last heartbeat stored in the row
+        self.last_seen = heartbeat  # last heartbeat seen by any check in this process
+
+    def idle_seconds(self, now):
+        return (now - self.last_seen).total_seconds()
+
+
+class LeaseManager:
+    """Process-wide cache of the editor lease, one per database engine."""
+
+    def __init__(self, timeout=120, write_interval=30, revalidate=5):
+        self.timeout = timeout
+        self.write_interval = write_interval
+        self.revalidate = revalidate
+        self._leases = weakref.WeakKeyDictionary()  # engine -> (loaded_at, Lease or None)
+        self._lock = threading.Lock()
+
+    def configure(self, timeout, write_interval, revalidate):
+        if write_interval >= timeout:
+            raise ValueError("The heartbeat write interval must be shorter than the lease timeout")
+        self.timeout = timeout
+        self.write_interval = write_interval
+        self.revalidate = revalidate
+
+    # --- Cache ---
+
+    def _cached(self):
+        """Return (lease, fresh): the cached holder, and whether it may be trusted."""
+        with self._lock:
+            entry = self._leases.get(db.engine)
+        if entry is None:
+            return None, False
+        loaded_at, lease = entry
+        return lease, time.monotonic() - loaded_at <= self.revalidate
+
+    def _store(self, lease):
+        with self._lock:
+            self._leases[db.engine] = (time.monotonic(), lease)
+        return lease
+
+    def _load(self):
+        row = db.session.execute(
+            select(GlobalLock.session_id, GlobalLock.user_name, GlobalLock.last_heartbeat)
+            .where(GlobalLock.id == LEASE_ID)
+        ).first()
+        if row is None:
+            return self._store(None)
+        lease = Lease(*row)
+        previous, _ = self._cached()
+        if previous is not None and previous.session_id == lease.session_id:
+            # Heartbeats seen here but not written yet still count
+            lease.last_seen = max(previous.last_seen, row.last_heartbeat)
+        return self._store(lease)
+
+    def _current(self, session_id=None, now=None, reload=False):
+        """
+        Return the holder, or None when the lock is free. The row is re-read
+        when `reload` is set or the cache is old, expired, or (with
+        `session_id`) names another holder, so a lock taken in another worker
+        is seen immediately.
+        """
+        now = now or _now()
+        lease, fresh = self._cached()
+        if (reload or not fresh or lease is None and session_id
+                or lease is not None and (session_id and lease.session_id != session_id
+                                          or lease.idle_seconds(now) > self.timeout)):
+            lease = self._load()
+        if lease is not None and lease.idle_seconds(now) > self.timeout:
+            return self._expire(lease, now)
+        return lease
+
+    def _expire(self, lease, now):
+        # Conditional: a heartbeat written by another worker since the read wins
+        deleted = db.session.execute(delete(GlobalLock).where(
+            GlobalLock.id == LEASE_ID, GlobalLock.session_id == lease.session_id,
+            GlobalLock.last_heartbeat < now - timedelta(seconds=self.timeout))).rowcount > 0
+        if deleted:
+            db.session.add(Event(kind='lock.released', user_name=lease.user_name))
+        db.session.commit()
+        return self._store(None) if deleted else self._load()
+
+    # --- Public API ---
+
+    def status(self, session_id=None):
+        """Return the active `Lease`, or None when the lock is free."""
+        return self._current(session_id)
+
+    def acquire(self, session_id, user_name):
+        """Take the lock if it is free or expired. Returns (acquired, holder's user name)."""
+        now = _now()
+        stale_before = now - timedelta(seconds=self.timeout)
+        claim = insert(GlobalLock).values(
+            id=LEASE_ID, session_id=session_id, user_name=user_name, last_heartbeat=now)
+        claim = claim.on_conflict_do_update(
+            index_elements=[GlobalLock.id],
+            set_={"session_id": claim.excluded.session_id, "user_name": claim.excluded.user_name,
+                  "last_heartbeat": claim.excluded.last_heartbeat},
+            where=GlobalLock.last_heartbeat < stale_before)
+        acquired = db.session.execute(claim).rowcount > 0
+        if acquired:
+            db.session.add(Event(kind='lock.acquired', user_name=user_name))
+        db.session.commit()
+        if acquired:
+            self._store(Lease(session_id, user_name, now))
+            return True, user_name
+        holder = self._load()
+        return False, holder.user_name if holder else None
+
+    def release(self, session_id):
+        """Give up the lock. Returns False when `session_id` did not hold it."""
+        lease, _ = self._cached()
+        released = db.session.execute(
+            delete(GlobalLock).where(GlobalLock.session_id == session_id)
+            .returning(GlobalLock.user_name)).scalars().all()
+        if released:
+            db.session.add(Event(kind='lock.released', user_name=released[0]))
+        db.session.commit()
+        if released or lease is not None and lease.session_id == session_id:
+            self._store(None)
+        return bool(released)
+
+    def check(self, session_id, commit=True):
+        """
+        Verify that `session_id` holds the lock and record a heartbeat.
+        Returns (ok, error message). The row is always re-read, since the
+        caller is about to write. The heartbeat is written through only
+        when the last write is `write_interval` seconds old; with commit=False
+        that write is left in the session for the caller's own transaction.
+        """
+        if not session_id:
+            return False, "Missing Session ID"
+        now = _now()
+        lease = self._current(session_id, now, reload=True)
+        if lease is None:
+            return False, "No active editor lock"
+        if lease.session_id != session_id:
+            return False, f"Lock held by {lease.user_name}"
+
+        lease.last_seen = now
+        if (now - lease.written).total_seconds() >= self.write_interval:
+            kept = db.session.execute(
+                update(GlobalLock)
+                .where(GlobalLock.id == LEASE_ID, GlobalLock.session_id == session_id)
+                .values(last_heartbeat=now)
+            ).rowcount > 0
+            if not kept:
+                self._store(None)
+                return False, "No active editor lock"
+            lease.written = now
+            if commit:
+                db.session.commit()
+        return True, None
+
+    def clear(self):
+        """Forget every cached lease (the rows are untouched)."""
+        with self._lock:
+            self._leases.clear()
+
+
+lease_manager = LeaseManager()
+
+
+def init_app(app):
+    """Apply the LOCK_* settings of `app`."""
+    app.config.setdefault('LOCK_TIMEOUT', 120)
+    app.config.setdefault('LOCK_HEARTBEAT_WRITE_INTERVAL', 30)
+    app.config.setdefault('LOCK_REVALIDATE', 5)
+    lease_manager.configure(app.config['LOCK_TIMEOUT'],
+                            app.config['LOCK_HEARTBEAT_WRITE_INTERVAL'],
+                            app.config['LOCK_REVALIDATE'])
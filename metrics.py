@@ -0,0 +1,286 @@
+"""
+Request metrics and on-demand profiling.
+
+Every request records, per endpoint (the URL rule, so IDs do not multiply the
+series), its latency, the number of SQL statements it ran, their total
+execution time (SQLAlchemy cursor events) and the time spent in the regression
+fits. The same breakdown is sent to the browser in a `Server-Timing` header.
+`GET /api/metrics` serves everything in the Prometheus text format.
+
+Metrics are kept per process: behind serve.py each scrape reports the worker
+that answered it (label the targets per worker, or run a single worker, when
+scraping).
+
+With `PROFILE_REQUESTS` enabled (always in debug mode), a request sent with an
+`X-Profile` header is run under cProfile and answered with the profile summary
+as text/plain instead of its body; the header value picks the sort order
+(`cumulative`, `tottime` or `calls`). Profiled requests run one at a time.
+"""
+
+import contextlib
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+PROFILE_SORTS = ('cumulative', 'tottime', 'calls')
+PROFILE_LINES = 40
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}  # labels -> [bucket counts..., sum]
+
+    def observe(self, labels, value):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [0] * len(self.buckets) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ('le',)
+        for labels, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """Process-wide request, SQL and fit metrics."""
+
+    def __init__(self):
+        endpoint = ('method', 'endpoint')
+        self.requests = Counter(
+            'keyin_http_requests_total', 'Requests by endpoint and status.', endpoint + ('status',))
+        self.latency = Histogram(
+            'keyin_http_request_duration_seconds', 'Request latency up to the response body.', endpoint)
+        self.sql_statements = Histogram(
+            'keyin_http_request_sql_statements', 'SQL statements per request.', endpoint,
+            STATEMENT_BUCKETS)
+        self.sql_time = Histogram(
+            'keyin_http_request_sql_seconds', 'Total SQL execution time per request.', endpoint)
+        self.fit_time = Histogram(
+            'keyin_http_request_fit_seconds', 'Time spent in regression fits per request.', endpoint)
+        self.fits = Histogram('keyin_fit_duration_seconds', 'Duration of one batch of fits.', ('kind',))
+        self._lock = threading.Lock()
+
+    def _all(self):
+        return (self.requests, self.latency, self.sql_statements, self.sql_time, self.fit_time, self.fits)
+
+    def record_request(self, method, endpoint, status, elapsed, sql_count, sql_time, fit_time):
+        labels = (method, endpoint)
+        with self._lock:
+            self.requests.inc(labels + (str(status),))
+            self.latency.observe(labels, elapsed)
+            self.sql_statements.observe(labels, sql_count)
+            self.sql_time.observe(labels, sql_time)
+            self.fit_time.observe(labels, fit_time)
+
+    def record_fit(self, kind, elapsed):
+        with self._lock:
+            self.fits.observe((kind,), elapsed)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            lines = [line for metric in self._all() for line in metric.render()]
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            for metric in self._all():
+                metric._values.clear()
+
+
+metrics = Metrics()
+_profile_lock = threading.Lock()
+_listening = False
+
+
+def _request_stats():
+    return g.get('request_stats') if has_app_context() else None
+
+
+def statement_count():
+    """SQL statements run so far by the current request, or None when it is not measured."""
+    stats = _request_stats()
+    return None if stats is None else stats['sql_count']
+
+
+@contextlib.contextmanager
+def fit_timer(kind):
+    """Record the time spent in the block as one fit of `kind`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.record_fit(kind, elapsed)
+        stats = _request_stats()
+        if stats is not None:
+            stats['fit_time'] += elapsed
+
+
+def timed_fit(kind):
+    """Decorator: record the duration of a fitting function under `kind`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with fit_timer(kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- SQL statements ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats()
+    if stats is None or context is None or not hasattr(context, '_metrics_started'):
+        return
+    stats['sql_count'] += 1
+    stats['sql_time'] += time.perf_counter() - context._metrics_started
+
+
+# --- Request hooks ---
+
+def _endpoint():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _profiling_requested():
+    app = current_app
+    return 'X-Profile' in request.headers and (app.config['PROFILE_REQUESTS'] or app.debug)
+
+
+def _start_request():
+    profile = _profiling_requested()
+    if not (current_app.config['METRICS_ENABLED'] or profile):
+        return
+    g.request_stats = {'started': time.perf_counter(), 'sql_count': 0, 'sql_time': 0.0, 'fit_time': 0.0}
+    if profile:
+        _profile_lock.acquire()
+        profiler = cProfile.Profile()
+        g.profiler = profiler
+        profiler.enable()
+
+
+def _stop_profiler():
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+    return profiler
+
+
+def _finish_request(response):
+    profiler = _stop_profiler()
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats['started']
+    if current_app.config['METRICS_ENABLED']:
+        metrics.record_request(request.method, _endpoint(), response.status_code, elapsed,
+                               stats['sql_count'], stats['sql_time'], stats['fit_time'])
+    response.headers['Server-Timing'] = (
+        f'sql;desc="{stats["sql_count"]} statements";dur={stats["sql_time"] * 1000:.2f}, '
+        f'fit;dur={stats["fit_time"] * 1000:.2f}, total;dur={elapsed * 1000:.2f}')
+    if profiler is not None:
+        return _profile_response(response, profiler, stats, elapsed)
+    return response
+
+
+def _teardown_request(error):
+    # Unhandled exceptions skip after_request: count them as 500s
+    _stop_profiler()
+    stats = g.pop('request_stats', None)
+    if stats is not None and error is not None and current_app.config['METRICS_ENABLED']:
+        metrics.record_request(request.method, _endpoint(), 500, time.perf_counter() - stats['started'],
+                               stats['sql_count'], stats['sql_time'], stats['fit_time'])
+
+
+def _profile_response(response, profiler, stats, elapsed):
+    sort = request.headers.get('X-Profile', '').strip().lower()
+    if sort not in PROFILE_SORTS:
+        sort = PROFILE_SORTS[0]
+    out = io.StringIO()
+    out.write(f"{request.method} {request.full_path.rstrip('?')} -> {response.status_code}\n")
+    out.write(f"total {elapsed * 1000:.2f} ms | sql {stats['sql_count']} statements, "
+              f"{stats['sql_time'] * 1000:.2f} ms | fit {stats['fit_time'] * 1000:.2f} ms\n\n")
+    pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(PROFILE_LINES)
+    profiled = current_app.response_class(out.getvalue(), status=response.status_code,
+                                          mimetype='text/plain')
+    profiled.headers['Server-Timing'] = response.headers['Server-Timing']
+    return profiled
+
+
+def init_app(app):
+    """Record metrics for every request of `app` (METRICS_ENABLED, PROFILE_REQUESTS)."""
+    global _listening
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('PROFILE_REQUESTS', False)
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listening = True
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,232 @@
+"""
+Versioned schema migrations for existing project.db files.
+
+`db.create_all()` only creates missing tables: it cannot add columns, indexes
+or triggers to tables that already exist. Each migration below does exactly
+that for one schema change. The number of applied migrations is stored in
+SQLite's `PRAGMA user_version`. Every step is idempotent, so databases that
+were patched before versioning existed (user_version 0), and runs interrupted
+midway, are brought up to date by simply running again.
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # show the database and target versions
+    python migrations.py --explain  # query plans of the hot queries, before and after
+"""
+
+import argparse
+
+from sqlalchemy import inspect, text
+
+import summaries
+from config import SPINDLE_ID2FACTOR
+from models import (db, CatalogueState, Event, ImportJob, ImportJobFile, MeasurementSummary, Spindle,
+                    CATALOGUE_VERSION_DDL, EVENT_DDL, SEARCH_INDEX_DDL, SPINDLE_VERSION_DDL,
+                    SUMMARY_VERSION_DDL)
+
+
+def _add_data_version():
+    columns = {c['name'] for c in inspect(db.engine).get_columns('measurements')}
+    if 'data_version' not in columns:
+        db.session.execute(text(
+            "ALTER TABLE measurements ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _add_search_index():
+    exists = inspect(db.engine).has_table('measurement_fts')
+    for statement in SEARCH_INDEX_DDL:
+        db.session.execute(text(statement))
+    if not exists:
+        db.session.execute(text("INSERT INTO measurement_fts(measurement_fts) VALUES ('rebuild')"))
+
+
+def _add_catalogue_version():
+    if not inspect(db.engine).has_table('catalogue_state'):
+        CatalogueState.__table__.create(db.engine)
+    for statement in CATALOGUE_VERSION_DDL:
+        db.session.execute(text(statement))
+
+
+def _add_lookup_indexes():
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_measurements_is_draft_original_id "
+        "ON measurements (is_draft, original_id)"))
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_points_measurement_id ON points (measurement_id)"))
+    db.session.execute(text("ANALYZE"))
+
+
+def _convert_cloned_drafts():
+    # Drafts opened before overlays existed hold a full copy of their original's
+    # points, linked through points.original_id. Turn the copies into overlay
+    # entries, mark originals without a copy as deleted and drop the copies.
+    legacy = ("SELECT id, original_id FROM measurements m WHERE is_draft = 1 AND original_id IS NOT NULL "
+              "AND EXISTS (SELECT 1 FROM points c WHERE c.measurement_id = m.id AND c.original_id IS NOT NULL)")
+    db.session.execute(text(f"""
+        INSERT OR REPLACE INTO point_overlay (draft_id, point_id, deleted, N, eta, torque, shear_rate, shear_stress)
+        SELECT c.measurement_id, c.original_id, 0, c.N, c.eta, c.torque, c.shear_rate, c.shear_stress
+        FROM points c JOIN ({legacy}) d ON c.measurement_id = d.id
+        WHERE c.original_id IS NOT NULL"""))
+    db.session.execute(text(f"""
+        INSERT OR IGNORE INTO point_overlay (draft_id, point_id, deleted)
+        SELECT d.id, p.id, 1 FROM points p JOIN ({legacy}) d ON p.measurement_id = d.original_id
+        WHERE p.id NOT IN (SELECT original_id FROM points c
+                           WHERE c.measurement_id = d.id AND c.original_id IS NOT NULL)"""))
+    db.session.execute(text(f"""
+        DELETE FROM points WHERE original_id IS NOT NULL
+        AND measurement_id IN (SELECT id FROM ({legacy}))"""))
+
+
+def _add_spindle_registry():
+    if not inspect(db.engine).has_table('spindles'):
+        Spindle.__table__.create(db.engine)
+    # Seed with the factors that used to be hardcoded; existing rows are kept
+    for spindle_id, factor in SPINDLE_ID2FACTOR.items():
+        db.session.execute(text(
+            "INSERT OR IGNORE INTO spindles (spindle_id, factor, updated_at) "
+            "VALUES (:spindle_id, :factor, CURRENT_TIMESTAMP)"), {"spindle_id": spindle_id, "factor": factor})
+
+
+def _pin_lock_row():
+    # The editor lease is claimed with an upsert on ID 1 (see lease.py); keep
+    # only the most recent holder and move it there
+    db.session.execute(text(
+        "DELETE FROM global_lock WHERE id <> "
+        "(SELECT id FROM global_lock ORDER BY last_heartbeat DESC LIMIT 1)"))
+    db.session.execute(text("UPDATE global_lock SET id = 1"))
+
+
+def _add_event_log():
+    if not inspect(db.engine).has_table('events'):
+        Event.__table__.create(db.engine)
+    for statement in EVENT_DDL:
+        db.session.execute(text(statement))
+
+
+def _add_measurement_summaries():
+    if not inspect(db.engine).has_table('measurement_summaries'):
+        MeasurementSummary.__table__.create(db.engine)
+    for statement in SUMMARY_VERSION_DDL:
+        db.session.execute(text(statement))
+    summaries.rebuild()
+
+
+def _add_import_jobs():
+    for model in (ImportJob, ImportJobFile):
+        if not inspect(db.engine).has_table(model.__tablename__):
+            model.__table__.create(db.engine)
+
+
+def _add_generation():
+    # Existing rows keep generation 0: any later row reusing one of their IDs is
+    # inserted after the delete bumped the catalogue version
+    columns = {c['name'] for c in inspect(db.engine).get_columns('measurements')}
+    if 'generation' not in columns:
+        db.session.execute(text(
+            "ALTER TABLE measurements ADD COLUMN generation INTEGER NOT NULL DEFAULT 0"))
+
+
+def _add_spindle_version():
+    for statement in SPINDLE_VERSION_DDL:
+        db.session.execute(text(statement))
+
+
+
+def _narrow_search_index_update():
+    # The update trigger used to fire on every write to a measurement row
+    db.session.execute(text("DROP TRIGGER IF EXISTS measurements_fts_update"))
+    _add_search_index()
+
+# Append only: a migration's position is its version number
+MIGRATIONS = [
+    ("Add measurements.data_version", _add_data_version),
+    ("Add the measurement_fts search index", _add_search_index),
+    ("Add the catalogue version counter", _add_catalogue_version),
+    ("Index draft lookups and points.measurement_id", _add_lookup_indexes),
+    ("Convert cloned drafts to point overlays", _convert_cloned_drafts),
+    ("Add the spindle registry", _add_spindle_registry),
+    ("Keep the editor lock in a single row", _pin_lock_row),
+    ("Add the change event log", _add_event_log),
+    ("Add measurement summaries", _add_measurement_summaries),
+    ("Add the import job queue", _add_import_jobs),
+    ("Add measurements.generation", _add_generation),
+    ("Add the spindle registry version", _add_spindle_version),
+    ("Re-index measurement_fts only when indexed columns change", _narrow_search_index_update),
+]
+
+# The statements behind get_best_measurement, start_edit_mode, get_measurements,
+# the point loaders and delete_point
+HOT_QUERIES = [
+    ("draft of a measurement",
+     "SELECT id FROM measurements WHERE original_id = 1 AND is_draft = 1 LIMIT 1"),
+    ("any draft",
+     "SELECT id FROM measurements WHERE is_draft = 1 LIMIT 1"),
+    ("production list",
+     "SELECT count(*) FROM measurements WHERE is_draft = 0"),
+    ("points of a measurement",
+     "SELECT id, N, eta FROM points WHERE measurement_id = 1 ORDER BY measurement_id, id"),
+    ("point of a measurement",
+     "SELECT id FROM points WHERE id = 1 AND measurement_id = 1"),
+]
+
+
+def schema_version():
+    return db.session.execute(text("PRAGMA user_version")).scalar()
+
+
+def migrate(verbose=False):
+    """Create missing tables, then apply every pending migration in order."""
+    db.create_all()
+    current = schema_version()
+    for version, (description, step) in enumerate(MIGRATIONS, start=1):
+        if version <= current:
+            continue
+        if verbose:
+            print(f"Applying {version}: {description}")
+        step()
+        db.session.execute(text(f"PRAGMA user_version = {version}"))
+        db.session.commit()
+    return schema_version()
+
+
+def query_plans():
+    """Return {label: [plan detail, ...]} for `HOT_QUERIES`."""
+    return {
+        label: [row[-1] for row in db.session.execute(text("EXPLAIN QUERY PLAN " + sql))]
+        for label, sql in HOT_QUERIES
+    }
+
+
+def _print_plans(title, plans):
+    print(title)
+    for label, details in plans.items():
+        print(f"  {label}: {'; '.join(details)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema migrations to project.db")
+    parser.add_argument("--status", action="store_true", help="Only show the schema versions")
+    parser.add_argument("--explain", action="store_true",
+                        help="Print the query plans of the hot queries before and after migrating")
+    args = parser.parse_args()
+
+    from app import create_app  # Deferred: app imports this module
+
+    app = create_app()
+    with app.app_context():
+        if args.status:
+            print(f"Schema version {schema_version()} of {len(MIGRATIONS)}")
+            return
+
+        if args.explain and inspect(db.engine).has_table('points'):
+            _print_plans("Before:", query_plans())
+        version = migrate(verbose=True)
+        print(f"Schema version {version} of {len(MIGRATIONS)}")
+        if args.explain:
+            # Fresh connections: cached prepared statements keep their old plans
+            db.session.remove()
+            db.engine.dispose()
+            _print_plans("After:", query_plans())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
 from datetime import datetime, UTC
 
 db = SQLAlchemy()
@@ -17,6 +18,8 @@ class GlobalLock(db.Model):
 
 class Measurement(db.Model):
     __tablename__ = 'measurements'
+    # Serves draft lookups: is_draft alone and (original_id, is_draft) pairs
+    __table_args__ = (db.Index('ix_measurements_is_draft_original_id', 'is_draft', 'original_id'),)
     id = db.Column(db.Integer, primary_key=True)
     liquid_name = db.Column(db.String(100), unique=False, nullable=False)
     date = db.Column(db.Date, nullable=True)
@@ -25,8 +28,18 @@ class Measurement(db.Model):
     experiment_note = db.Column(db.Text, nullable=True)
     is_draft = db.Column(db.Boolean, default=False)
     original_id = db.Column(db.Integer, nullable=True)
+    # Bumped on every change to the measurement's points; keys derived caches
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Catalogue version when the row was inserted. Row IDs are reused (a new
+    # draft gets the ID of the discarded one), (id, generation) never is.
+    generation = db.Column(db.Integer, nullable=False, server_default='0',
+                           default=text("(SELECT coalesce(max(version), 0) FROM catalogue_state WHERE id = 1)"))
     # Draft-related session columns removed
     points = db.relationship('Point', backref='measurement', cascade="all, delete-orphan", lazy=True)
+    packed_points = db.relationship('PointColumns', cascade="all, delete-orphan", lazy=True, uselist=False)
+    # Drafts only: pending edits of the original's points (see drafts.py)
+    overlay = db.relationship('PointOverlay', cascade="all, delete-orphan", lazy=True)
+    summary = db.relationship('MeasurementSummary', cascade="all, delete-orphan", lazy=True, uselist=False)
 
     def __repr__(self):
         return f'<Measurement {self.liquid_name} (Draft: {self.is_draft})>'
@@ -42,7 +55,278 @@ class Point(db.Model):
     shear_stress = db.Column(db.Float, nullable=True)
     is_draft = db.Column(db.Boolean, default=False)
     original_id = db.Column(db.Integer, nullable=True)
-    measurement_id = db.Column(db.Integer, db.ForeignKey('measurements.id'), nullable=False)
+    measurement_id = db.Column(db.Integer, db.ForeignKey('measurements.id'), nullable=False, index=True)
 
     def __repr__(self):
         return f'<Point(N={self.N}, eta={self.eta})>'
+
+
+class PointOverlay(db.Model):
+    """Pending change of one original point inside a draft: new values, or a deletion.
+
+    Drafts own only the points added to them; every other point is read from
+    the original measurement through this overlay.
+    """
+    __tablename__ = 'point_overlay'
+    draft_id = db.Column(db.Integer, db.ForeignKey('measurements.id'), primary_key=True)
+    point_id = db.Column(db.Integer, primary_key=True)  # ID of the original point
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    N = db.Column(db.Float, nullable=True)
+    eta = db.Column(db.Float, nullable=True)
+    torque = db.Column(db.Float, nullable=True)
+    shear_rate = db.Column(db.Float, nullable=True)
+    shear_stress = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<PointOverlay(draft_id={self.draft_id}, point_id={self.point_id}, deleted={self.deleted})>'
+
+
+class PointColumns(db.Model):
+    """Packed copy of a measurement's points: one little-endian blob per column.
+
+    Float columns are float64 with NaN for NULL, `ids` holds the int64 point IDs.
+    The pack is valid while `data_version` matches the measurement's.
+    """
+    __tablename__ = 'point_columns'
+    measurement_id = db.Column(db.Integer, db.ForeignKey('measurements.id'), primary_key=True)
+    data_version = db.Column(db.Integer, nullable=False)
+    n_points = db.Column(db.Integer, nullable=False)
+    ids = db.Column(db.LargeBinary, nullable=False)
+    N = db.Column(db.LargeBinary, nullable=False)
+    eta = db.Column(db.LargeBinary, nullable=False)
+    torque = db.Column(db.LargeBinary, nullable=False)
+    shear_rate = db.Column(db.LargeBinary, nullable=False)
+    shear_stress = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<PointColumns(measurement_id={self.measurement_id}, n={self.n_points})>'
+
+
+class MeasurementSummary(db.Model):
+    """Values derived from a measurement's points, refreshed on every point write (see summaries.py).
+
+    Each column is indexed so the list can filter on it without reading points.
+    """
+    __tablename__ = 'measurement_summaries'
+    measurement_id = db.Column(db.Integer, db.ForeignKey('measurements.id'), primary_key=True)
+    data_version = db.Column(db.Integer, nullable=False)
+    n_points = db.Column(db.Integer, nullable=False, index=True)
+    shear_rate_min = db.Column(db.Float, nullable=True, index=True)
+    shear_rate_max = db.Column(db.Float, nullable=True, index=True)
+    power_a = db.Column(db.Float, nullable=True, index=True)
+    power_b = db.Column(db.Float, nullable=True, index=True)
+    power_r_squared = db.Column(db.Float, nullable=True, index=True)
+
+    def to_dict(self):
+        return {"n_points": self.n_points,
+                "shear_rate_min": self.shear_rate_min, "shear_rate_max": self.shear_rate_max,
+                "power_a": self.power_a, "power_b": self.power_b, "power_r_squared": self.power_r_squared}
+
+    def __repr__(self):
+        return f'<MeasurementSummary(measurement_id={self.measurement_id}, n={self.n_points})>'
+
+
+class Spindle(db.Model):
+    """Registered spindle and its shear rate factor (see spindles.py)."""
+    __tablename__ = 'spindles'
+    spindle_id = db.Column(db.String(50), primary_key=True)
+    factor = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC).replace(tzinfo=None),
+                           onupdate=lambda: datetime.now(UTC).replace(tzinfo=None))
+
+    def __repr__(self):
+        return f'<Spindle {self.spindle_id} ({self.factor})>'
+
+
+class ImportManifest(db.Model):
+    """One row per imported CSV file, used to skip unchanged files on later runs."""
+    __tablename__ = 'import_manifest'
+    path = db.Column(db.String(1024), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    mtime = db.Column(db.Float, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    measurement_id = db.Column(db.Integer, nullable=False)
+    imported_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC).replace(tzinfo=None))
+
+    def __repr__(self):
+        return f'<ImportManifest {self.path} -> {self.measurement_id}>'
+
+
+class ImportJob(db.Model):
+    """A batch of uploaded CSV files imported in the background (see import_jobs.py)."""
+    __tablename__ = 'import_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    user_name = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC).replace(tzinfo=None))
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # Updated per batch; stale running jobs are resumed
+    total_files = db.Column(db.Integer, nullable=False, default=0)
+    processed_files = db.Column(db.Integer, nullable=False, default=0)
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    files = db.relationship('ImportJobFile', backref='job', cascade="all, delete-orphan", lazy=True,
+                            order_by='ImportJobFile.id')
+
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.status} {self.processed_files}/{self.total_files}>'
+
+
+class ImportJobFile(db.Model):
+    """The result of one file of an import job."""
+    __tablename__ = 'import_job_files'
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('import_jobs.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued, imported, skipped, failed
+    measurement_id = db.Column(db.Integer, nullable=True)
+    points = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.Text, nullable=True)
+
+    def to_dict(self):
+        return {"filename": self.filename, "status": self.status, "measurement_id": self.measurement_id,
+                "points": self.points, "message": self.message}
+
+
+class CatalogueState(db.Model):
+    """Counters bumped by triggers. Row 1 changes whenever a listed measurement field changes.
+
+    Drives the ETags of the measurement endpoints; point edits are covered by
+    `Measurement.data_version` instead. Row 2 counts summary writes and row 3
+    spindle registry writes.
+    """
+    __tablename__ = 'catalogue_state'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CatalogueState v{self.version}>'
+
+
+class Event(db.Model):
+    """Change notification published on `/api/events` (see events.py); the ID is its version."""
+    __tablename__ = 'events'
+    __table_args__ = {'sqlite_autoincrement': True}  # IDs are never reused after pruning
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    measurement_id = db.Column(db.Integer, nullable=True)
+    version = db.Column(db.Integer, nullable=True)  # data_version for measurement events
+    user_name = db.Column(db.String(100), nullable=True)  # Lock events
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(UTC).replace(tzinfo=None),
+                           server_default=text('CURRENT_TIMESTAMP'))
+
+    def to_dict(self):
+        return {"id": self.id, "kind": self.kind, "measurement_id": self.measurement_id,
+                "version": self.version, "user_name": self.user_name}
+
+    def __repr__(self):
+        return f'<Event {self.id} {self.kind}>'
+
+
+# Full-text index over the searchable measurement columns (used by rql.py).
+# External-content FTS5 table kept in sync by triggers; the trigram tokenizer
+# gives case-insensitive substring matches. Updates re-index a row only when an
+# indexed column is written, not on every data_version bump.
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS measurement_fts USING fts5(
+        liquid_name, serial_id, experiment_note,
+        content='measurements', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS measurements_fts_insert AFTER INSERT ON measurements BEGIN
+        INSERT INTO measurement_fts(rowid, liquid_name, serial_id, experiment_note)
+        VALUES (new.id, new.liquid_name, new.serial_id, new.experiment_note);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS measurements_fts_delete AFTER DELETE ON measurements BEGIN
+        INSERT INTO measurement_fts(measurement_fts, rowid, liquid_name, serial_id, experiment_note)
+        VALUES ('delete', old.id, old.liquid_name, old.serial_id, old.experiment_note);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS measurements_fts_update AFTER UPDATE OF
+        liquid_name, serial_id, experiment_note ON measurements BEGIN
+        INSERT INTO measurement_fts(measurement_fts, rowid, liquid_name, serial_id, experiment_note)
+        VALUES ('delete', old.id, old.liquid_name, old.serial_id, old.experiment_note);
+        INSERT INTO measurement_fts(rowid, liquid_name, serial_id, experiment_note)
+        VALUES (new.id, new.liquid_name, new.serial_id, new.experiment_note);
+    END""",
+]
+
+
+# Triggers keeping catalogue_state.version in step with every write to the
+# listed columns, including raw SQL and bulk imports that bypass the ORM.
+CATALOGUE_VERSION_DDL = [
+    "INSERT OR IGNORE INTO catalogue_state (id, version) VALUES (1, 0)",
+    """CREATE TRIGGER IF NOT EXISTS measurements_catalogue_insert AFTER INSERT ON measurements BEGIN
+        UPDATE catalogue_state SET version = version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS measurements_catalogue_delete AFTER DELETE ON measurements BEGIN
+        UPDATE catalogue_state SET version = version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS measurements_catalogue_update AFTER UPDATE OF
+        liquid_name, date, serial_id, spindle_id, experiment_note, is_draft, original_id
+        ON measurements BEGIN
+        UPDATE catalogue_state SET version = version + 1 WHERE id = 1;
+    END""",
+]
+
+
+# Triggers publishing changes of production measurements to `events`. Drafts
+# are private to the editor, so their writes are not published; committing one
+# shows up as an update (or, for a new measurement, is_draft -> 0) of the original.
+EVENT_DDL = [
+    """CREATE TRIGGER IF NOT EXISTS measurements_event_insert AFTER INSERT ON measurements
+        WHEN coalesce(new.is_draft, 0) = 0 BEGIN
+        INSERT INTO events (kind, measurement_id, version, created_at)
+        VALUES ('measurement.created', new.id, new.data_version, CURRENT_TIMESTAMP);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS measurements_event_delete AFTER DELETE ON measurements
+        WHEN coalesce(old.is_draft, 0) = 0 BEGIN
+        INSERT INTO events (kind, measurement_id, version, created_at)
+        VALUES ('measurement.deleted', old.id, old.data_version, CURRENT_TIMESTAMP);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS measurements_event_update AFTER UPDATE OF
+        liquid_name, date, serial_id, spindle_id, experiment_note, is_draft, data_version
+        ON measurements WHEN coalesce(new.is_draft, 0) = 0 BEGIN
+        INSERT INTO events (kind, measurement_id, version, created_at)
+        VALUES ('measurement.updated', new.id, new.data_version, CURRENT_TIMESTAMP);
+    END""",
+]
+
+
+# Row 2 of catalogue_state counts summary writes: the list shows summary
+# columns, which change with the points rather than with the catalogue.
+SUMMARY_VERSION_DDL = [
+    "INSERT OR IGNORE INTO catalogue_state (id, version) VALUES (2, 0)",
+    *(f"""CREATE TRIGGER IF NOT EXISTS measurement_summaries_version_{action.lower()}
+        AFTER {action} ON measurement_summaries BEGIN
+        UPDATE catalogue_state SET version = version + 1 WHERE id = 2;
+    END""" for action in ('INSERT', 'UPDATE', 'DELETE')),
+]
+
+
+# Row 3 of catalogue_state counts spindle registry writes, so every process
+# reloads its cached factors right after `python spindles.py` commits.
+SPINDLE_VERSION_DDL = [
+    "INSERT OR IGNORE INTO catalogue_state (id, version) VALUES (3, 0)",
+    *(f"""CREATE TRIGGER IF NOT EXISTS spindles_version_{action.lower()}
+        AFTER {action} ON spindles BEGIN
+        UPDATE catalogue_state SET version = version + 1 WHERE id = 3;
+    END""" for action in ('INSERT', 'UPDATE', 'DELETE')),
+]
+
+
+def catalogue_version():
+    """Return the current catalogue version, or None if the triggers are not installed."""
+    return db.session.execute(text("SELECT version FROM catalogue_state WHERE id = 1")).scalar()
+
+
+def list_versions():
+    """Return (catalogue version, summary version) with one query; None where the triggers are not installed."""
+    versions = dict(db.session.execute(text("SELECT id, version FROM catalogue_state WHERE id IN (1, 2)")).all())
+    return versions.get(1), versions.get(2)
+
+
+def spindle_version():
+    """Return the spindle registry write counter, or None if the triggers are not installed."""
+    return db.session.execute(text("SELECT version FROM catalogue_state WHERE id = 3")).scalar()
@@ -0,0 +1,240 @@
+"""
+Columnar access to measurement points.
+
+Read paths get one NumPy array per column instead of per-point ORM objects.
+With `POINT_STORAGE = 'packed'`, every commit that touches a measurement also
+updates its packed float64 blobs (`PointColumns`), and reads map them straight
+into NumPy with `np.frombuffer`. Point rows remain the write path, so the
+point-level API behaves the same in both modes. Packs that are missing or older
+than the measurement's `data_version` fall back to one query over `points`.
+
+A commit that only changes existing points patches those entries of the pack
+and reads just the changed rows. Adding or deleting points shifts every entry
+after them, so that rebuilds the pack from all point rows. Packed storage is a
+second copy of the point data, traded for reads that skip the per-row decoding;
+SQLite still rewrites the whole pack row on each update.
+
+Convert an existing database:
+    python point_store.py            # pack every measurement
+    python point_store.py --unpack   # drop all packs again
+"""
+
+import argparse
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, event, inspect, insert, select, update
+
+import drafts
+from models import db, Measurement, Point, PointColumns
+
+COLUMNS = ('N', 'eta', 'torque', 'shear_rate', 'shear_stress')
+FLOAT_DTYPE = np.dtype('<f8')
+ID_DTYPE = np.dtype('<i8')
+
+_DIRTY_KEY = 'point_store_dirty'  # measurement -> (data_version before the change, point IDs or None)
+_listening = False
+
+
+def packed_mode():
+    """True when reads should be served from the packed column blobs."""
+    return current_app.config.get('POINT_STORAGE') == 'packed'
+
+
+def _rows_to_columns(rows):
+    """Turn (id, N, eta, torque, shear_rate, shear_stress) tuples into arrays."""
+    table = np.array(rows, dtype=float).reshape(len(rows), len(COLUMNS) + 1)  # None -> NaN
+    columns = {"id": table[:, 0].astype(ID_DTYPE)}
+    for i, name in enumerate(COLUMNS, start=1):
+        columns[name] = np.ascontiguousarray(table[:, i])
+    return columns
+
+
+def _unpack(pack):
+    columns = {"id": np.frombuffer(pack.ids, dtype=ID_DTYPE)}
+    for name in COLUMNS:
+        columns[name] = np.frombuffer(getattr(pack, name), dtype=FLOAT_DTYPE)
+    return columns
+
+
+def _rows_by_measurement(measurement_ids, point_ids=None):
+    """Load the point rows (or just `point_ids`) of many measurements with one query, grouped by ID."""
+    grouped = {measurement_id: [] for measurement_id in measurement_ids}
+    query = (
+        select(Point.measurement_id, Point.id, *(getattr(Point, name) for name in COLUMNS))
+        .where(Point.measurement_id.in_(list(grouped)))
+        .order_by(Point.measurement_id, Point.id)
+    )
+    if point_ids is not None:
+        query = query.where(Point.id.in_(point_ids))
+    rows = db.session.execute(query)
+    for row in rows:
+        grouped[row[0]].append(row[1:])
+    return grouped
+
+
+def load_many(measurements):
+    """Return {measurement_id: {column: ndarray}} for many measurements.
+
+    Uses at most two queries: one for valid packs and one over `points` for
+    everything that is not (or not yet) packed, plus one per overlay draft
+    (there is at most one at a time).
+    """
+    result = {}
+    pending = {}
+    for m in measurements:
+        if drafts.is_overlay(m):
+            result[m.id] = _rows_to_columns(drafts.merged_rows(m))
+        else:
+            pending[m.id] = m.data_version
+    if packed_mode() and pending:
+        packs = db.session.execute(
+            select(PointColumns).where(PointColumns.measurement_id.in_(list(pending)))
+        ).scalars()
+        for pack in packs:
+            if pack.data_version == pending[pack.measurement_id]:
+                result[pack.measurement_id] = _unpack(pack)
+                del pending[pack.measurement_id]
+    if pending:
+        for measurement_id, rows in _rows_by_measurement(pending).items():
+            result[measurement_id] = _rows_to_columns(rows)
+    return result
+
+
+def load_columns(measurement):
+    """Return {column: ndarray} for one measurement (see `load_many`)."""
+    return load_many([measurement])[measurement.id]
+
+
+def pack(measurement_ids):
+    """Rewrite the packs of the given measurements from their point rows."""
+    if not measurement_ids:
+        return
+    # Drafts are short-lived and read through their overlay, so they are never packed
+    versions = dict(db.session.execute(
+        select(Measurement.id, Measurement.data_version)
+        .where(Measurement.id.in_(measurement_ids), Measurement.is_draft.is_(False))
+    ).all())
+    packs = []
+    for measurement_id, rows in _rows_by_measurement(list(versions)).items():
+        columns = _rows_to_columns(rows)
+        packs.append({
+            "measurement_id": measurement_id,
+            "data_version": versions[measurement_id],
+            "n_points": len(rows),
+            "ids": columns["id"].tobytes(),
+            **{name: columns[name].astype(FLOAT_DTYPE).tobytes() for name in COLUMNS}
+        })
+    db.session.execute(delete(PointColumns).where(PointColumns.measurement_id.in_(list(versions))))
+    if packs:
+        db.session.execute(insert(PointColumns), packs)
+
+
+def patch(changes):
+    """
+    Patch packs in place for points whose values changed. `changes` maps
+    measurement IDs to (pack version to patch, point IDs, new data version).
+    Returns the IDs that were patched; others need `pack`.
+    """
+    if not changes:
+        return set()
+    packs = {p.measurement_id: p for p in db.session.execute(
+        select(PointColumns).where(PointColumns.measurement_id.in_(list(changes)))).scalars()
+        if p.data_version == changes[p.measurement_id][0]}
+    point_ids = [i for measurement_id in packs for i in changes[measurement_id][1]]
+    rows = _rows_by_measurement(packs, point_ids) if point_ids else {}
+
+    patched = []
+    for measurement_id, current in packs.items():
+        _, ids, version = changes[measurement_id]
+        values = {"measurement_id": measurement_id, "data_version": version}
+        found = rows.get(measurement_id, [])
+        if found:
+            columns = _unpack(current)
+            updated = _rows_to_columns(found)
+            at = np.searchsorted(columns["id"], updated["id"])
+            if (len(found) != len(ids) or np.any(at >= len(columns["id"]))
+                    or np.any(columns["id"][at] != updated["id"])):
+                continue  # A point was added or moved after all
+            for name in COLUMNS:
+                column = columns[name].copy()
+                column[at] = updated[name]
+                values[name] = column.tobytes()
+        elif ids:
+            continue
+        patched.append(values)
+    if patched:
+        db.session.execute(update(PointColumns), patched)
+    return {values["measurement_id"] for values in patched}
+
+
+def mark_dirty(measurement, point_ids=None):
+    """
+    Schedule a pack update of `measurement` when the current transaction
+    commits. Call it before bumping `data_version`. `point_ids` lists the points
+    changed in place when none were added or deleted, so the pack is patched
+    instead of rebuilt; several calls in one transaction accumulate.
+    """
+    dirty = db.session.info.setdefault(_DIRTY_KEY, {})
+    version, changed = dirty.get(measurement, (measurement.data_version, set()))
+    if changed is not None and point_ids is not None:
+        changed = changed | set(point_ids)
+    else:
+        changed = None
+    dirty[measurement] = (version, changed)
+
+
+def _repack_dirty(session):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if not dirty or not packed_mode():
+        return
+    session.flush()
+    dirty = {m: change for m, change in dirty.items() if inspect(m).persistent}
+    patched = patch({m.id: (version, changed, m.data_version)
+                     for m, (version, changed) in dirty.items() if changed is not None})
+    pack([m.id for m in dirty if m.id not in patched])
+
+
+def _forget_dirty(session, *_):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+def init_app(app):
+    """Keep packs in sync with point writes in the same transaction."""
+    global _listening
+    app.config.setdefault('POINT_STORAGE', 'rows')
+    if not _listening:
+        event.listen(db.session, 'before_commit', _repack_dirty)
+        event.listen(db.session, 'after_rollback', _forget_dirty)
+        _listening = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert project.db points to packed column storage")
+    parser.add_argument("--unpack", action="store_true", help="Drop all packs instead of building them")
+    parser.add_argument("--batch-size", type=int, default=500, help="Measurements packed per transaction")
+    args = parser.parse_args()
+
+    from app import create_app  # Deferred: app imports this module through api
+    from migrations import migrate
+
+    app = create_app()
+    with app.app_context():
+        migrate()
+
+        if args.unpack:
+            deleted = db.session.execute(delete(PointColumns)).rowcount
+            db.session.commit()
+            print(f"Dropped {deleted} packs.")
+            return
+
+        ids = db.session.execute(select(Measurement.id).order_by(Measurement.id)).scalars().all()
+        for start in range(0, len(ids), args.batch_size):
+            pack(ids[start:start + args.batch_size])
+            db.session.commit()
+            print(f"Packed {min(start + args.batch_size, len(ids))}/{len(ids)} measurements")
+        print("Done. Set app.config['POINT_STORAGE'] = 'packed' to serve reads from the packs.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Bounded LRU cache for regression results.
+
+Entries are keyed by (measurement_id, generation, fit_type, data_version). Every
+write path bumps `Measurement.data_version`, and a row that reuses the ID of a
+deleted one (a new draft after a discarded one) gets a new
+`Measurement.generation`, so a stale fit can never be served in any worker
+process: it simply stops being looked up and ages out of the LRU.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class RegressionCache:
+    """Thread-safe LRU mapping of fit keys to (result, error) tuples."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for `key` or None, updating the counters."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store `value`, evicting the least recently used entries when full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize):
+        """Change the capacity, evicting immediately if it shrank."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return a JSON-serializable snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else None
+            }
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+regression_cache = RegressionCache()
@@ -0,0 +1,102 @@
+"""
+Data access for measurements with a fixed number of SQL statements per call.
+
+"Draft or original" is resolved in one query, points are eager-loaded with
+`selectinload` when a caller walks them, and read-only serializers use the
+column loaders in `point_store` instead of `Point` objects.
+
+Read endpoints declare how many statements they run with `query_budget(n)`
+and report the actual count in an `X-Query-Count` header; the budgets are
+asserted by tests/test_query_budgets.py at several data sizes.
+"""
+
+import functools
+
+from flask import make_response
+from sqlalchemy import and_, exists, or_, select
+from sqlalchemy.orm import selectinload
+
+import metrics
+from models import db, Measurement, GlobalLock
+
+
+def _best_first(condition):
+    # Drafts sort before their originals, so the first row per ID is the one to show
+    return select(Measurement).where(condition).order_by(Measurement.is_draft.desc())
+
+
+def get_best_measurement(measurement_id, with_points=False):
+    """Return the draft of a measurement if it exists, otherwise the measurement itself.
+
+    One query; `with_points` adds one more that eager-loads `points`.
+    """
+    query = _best_first(or_(
+        Measurement.id == measurement_id,
+        and_(Measurement.original_id == measurement_id, Measurement.is_draft.is_(True))
+    )).limit(1)
+    if with_points:
+        query = query.options(selectinload(Measurement.points))
+    return db.session.execute(query).scalars().first()
+
+
+def resolve_many(measurement_ids):
+    """Resolve "draft or original" for many IDs with one query.
+
+    Returns ({requested_id: measurement} in request order, [missing IDs]).
+    """
+    candidates = db.session.execute(_best_first(or_(
+        Measurement.id.in_(measurement_ids),
+        and_(Measurement.original_id.in_(measurement_ids), Measurement.is_draft.is_(True))
+    ))).scalars().all()
+    by_id = {m.id: m for m in candidates}
+    draft_by_original = {m.original_id: m for m in candidates if m.is_draft and m.original_id}
+
+    resolved = {}
+    missing = []
+    for requested_id in measurement_ids:
+        m = by_id.get(requested_id)
+        if m is None:
+            missing.append(requested_id)
+            continue
+        if not m.is_draft:
+            m = draft_by_original.get(m.id, m)
+        resolved[requested_id] = m
+    return resolved, missing
+
+
+def get_measurement(measurement_id, is_draft, with_points=False):
+    """Return the measurement with this ID and draft state, or None."""
+    query = select(Measurement).where(
+        Measurement.id == measurement_id, Measurement.is_draft.is_(is_draft))
+    if with_points:
+        query = query.options(selectinload(Measurement.points))
+    return db.session.execute(query).scalars().first()
+
+
+def get_active_draft(session_id):
+    """Return the draft visible to `session_id`, i.e. only to the lock holder, in one query."""
+    if not session_id:
+        return None
+    holds_lock = exists().where(GlobalLock.session_id == session_id)
+    return db.session.execute(
+        select(Measurement).where(Measurement.is_draft.is_(True), holds_lock).limit(1)
+    ).scalars().first()
+
+
+# --- Statement counting ---
+
+def query_budget(limit):
+    """Declare the SQL statements an endpoint may run and report its count in `X-Query-Count`."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            before = metrics.statement_count()
+            response = view(*args, **kwargs)
+            if before is None:
+                return response  # Statements are only counted while metrics are on
+            response = make_response(response)
+            response.headers['X-Query-Count'] = str(metrics.statement_count() - before)
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
@@ -0,0 +1,235 @@
+"""
+Server-side Rheology Query Language (RQL).
+
+    or      := and (("OR" | "||" | "|") and)*
+    and     := primary (["AND" | "&&"] primary)*
+    primary := "(" or ")" | ("NOT" | "!") primary | FIELD ":" VALUE | VALUE
+
+Fields are name:, date:, serial:, note:, id:, is: and the numeric summary
+fields points:, rate_min:, rate_max:, a:, b: and r2: (see
+context_collection/ADVANCED_SEARCH_SPEC.md). Input without any RQL syntax is a
+global search, as are bare values inside a query.
+
+Queries compile to a SQLAlchemy WHERE clause over `measurements`. Text matches
+use the `measurement_fts` trigram index when it exists; terms shorter than a
+trigram and databases without the index fall back to LIKE. Numeric fields
+compare against the indexed `measurement_summaries` columns, e.g. b:<0.6 or
+points:10..50.
+"""
+
+import re
+import weakref
+
+from sqlalchemy import String, and_, cast, column, false, func, not_, or_, select, table, text, true
+
+from models import db, Measurement, MeasurementSummary
+
+TEXT_COLUMNS = {'name': 'liquid_name', 'serial': 'serial_id', 'note': 'experiment_note'}
+NUMERIC_COLUMNS = {
+    'points': 'n_points', 'rate_min': 'shear_rate_min', 'rate_max': 'shear_rate_max',
+    'a': 'power_a', 'b': 'power_b', 'r2': 'power_r_squared',
+}
+FIELDS = ('name', 'id', 'date', 'serial', 'note', 'is', *NUMERIC_COLUMNS)
+
+measurement_fts = table(
+    'measurement_fts',
+    column('rowid'), column('measurement_fts'),
+    *(column(name) for name in TEXT_COLUMNS.values())
+)
+
+_TOKEN_RE = re.compile(
+    r'"([^"]*)"|(\()|(\))|(&&|\|\||\||!|\b(?:AND|OR|NOT)\b)|([^\s()!|&"]+)')
+_OPERATORS = {'&&': 'AND', '||': 'OR', '|': 'OR', '!': 'NOT'}
+_COMPARISONS = ('<=', '>=', '<', '>', '=')
+_TRIGRAM = 3
+
+_fts_engines = weakref.WeakKeyDictionary()
+
+
+class RQLError(ValueError):
+    """Raised for queries that cannot be parsed."""
+
+
+def is_simple(query):
+    """True when the input has no RQL syntax and is a plain global search."""
+    return not re.search(r'[:()!|&]', query) and not re.search(r'\b(AND|OR|NOT)\b', query)
+
+
+def tokenize(query):
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        quoted, lparen, rparen, operator, word = match.groups()
+        if quoted is not None:
+            tokens.append(('VALUE', quoted))
+        elif lparen:
+            tokens.append(('LPAREN', None))
+        elif rparen:
+            tokens.append(('RPAREN', None))
+        elif operator:
+            tokens.append(('OPERATOR', _OPERATORS.get(operator, operator)))
+        else:
+            field, sep, value = word.partition(':')
+            if sep and field in FIELDS:
+                tokens.append(('FIELD', (field, value)))
+            else:
+                tokens.append(('VALUE', word))
+    return tokens
+
+
+def parse(query):
+    """Parse an RQL query into a nested tuple AST."""
+    if is_simple(query):
+        return ('value', query)
+
+    tokens = tokenize(query)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else (None, None)
+
+    def parse_or():
+        nonlocal pos
+        node = parse_and()
+        while peek() == ('OPERATOR', 'OR'):
+            pos += 1
+            node = ('or', node, parse_and())
+        return node
+
+    def parse_and():
+        nonlocal pos
+        node = parse_primary()
+        while True:
+            kind, val = peek()
+            if (kind, val) == ('OPERATOR', 'AND'):
+                pos += 1
+            elif kind not in ('FIELD', 'VALUE', 'LPAREN') and (kind, val) != ('OPERATOR', 'NOT'):
+                return node
+            node = ('and', node, parse_primary())
+
+    def parse_primary():
+        nonlocal pos
+        kind, val = peek()
+        pos += 1
+        if kind is None:
+            raise RQLError("Unexpected end of query")
+        if kind == 'LPAREN':
+            node = parse_or()
+            if peek()[0] != 'RPAREN':
+                raise RQLError("Missing )")
+            pos += 1
+            return node
+        if (kind, val) == ('OPERATOR', 'NOT'):
+            return ('not', parse_primary())
+        if kind == 'FIELD':
+            return ('field',) + val
+        if kind == 'VALUE':
+            return ('value', val)
+        raise RQLError(f"Unexpected {val or ')'}")
+
+    node = parse_or()
+    if pos < len(tokens):
+        raise RQLError("Unexpected )" if tokens[pos][0] == 'RPAREN' else "Unexpected token")
+    return node
+
+
+def fts_available():
+    """True when the measurement_fts index exists in the bound database."""
+    engine = db.engine
+    if engine not in _fts_engines:
+        found = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'measurement_fts'")).first()
+        _fts_engines[engine] = found is not None
+    return _fts_engines[engine]
+
+
+def _fts_match(fts_column, term):
+    phrase = '"' + term.replace('"', '""') + '"'
+    return Measurement.id.in_(
+        select(measurement_fts.c.rowid).where(fts_column.op('MATCH')(phrase)))
+
+
+def _text_match(field, term, use_fts):
+    if not term:
+        return true()
+    if use_fts and len(term) >= _TRIGRAM:
+        return _fts_match(measurement_fts.c[TEXT_COLUMNS[field]], term)
+    # COALESCE keeps NOT semantics for empty fields (NULL LIKE x is NULL, not false)
+    return func.coalesce(getattr(Measurement, TEXT_COLUMNS[field]), '').contains(term, autoescape=True)
+
+
+def _id_match(term):
+    return cast(Measurement.id, String).contains(term, autoescape=True)
+
+
+def _date_match(term):
+    return func.coalesce(cast(Measurement.date, String), '').contains(term, autoescape=True)
+
+
+def _number(field, text):
+    try:
+        return float(text)
+    except ValueError:
+        raise RQLError(f"{field}: expects a number, got {text!r}") from None
+
+
+def _numeric_match(field, term):
+    """Compare a summary column: <x, <=x, >x, >=x, =x, x, or lo..hi (inclusive)."""
+    column = getattr(MeasurementSummary, NUMERIC_COLUMNS[field])
+    low, sep, high = term.partition('..')
+    if sep:
+        condition = column.between(_number(field, low), _number(field, high))
+    else:
+        op = next((op for op in _COMPARISONS if term.startswith(op)), '=')
+        value = _number(field, term[len(op):] if term.startswith(op) else term)
+        condition = {'<=': column <= value, '>=': column >= value, '<': column < value,
+                     '>': column > value, '=': column == value}[op]
+    return Measurement.id.in_(select(MeasurementSummary.measurement_id).where(condition))
+
+
+def _global_match(term, use_fts):
+    if not term:
+        return true()
+    if use_fts and len(term) >= _TRIGRAM:
+        text_clause = _fts_match(measurement_fts.c.measurement_fts, term)
+    else:
+        text_clause = or_(*(_text_match(field, term, False) for field in TEXT_COLUMNS))
+    return or_(text_clause, _id_match(term), _date_match(term))
+
+
+def _compile(node, selected_ids, use_fts):
+    kind = node[0]
+    if kind == 'or':
+        return or_(_compile(node[1], selected_ids, use_fts), _compile(node[2], selected_ids, use_fts))
+    if kind == 'and':
+        return and_(_compile(node[1], selected_ids, use_fts), _compile(node[2], selected_ids, use_fts))
+    if kind == 'not':
+        return not_(_compile(node[1], selected_ids, use_fts))
+    if kind == 'value':
+        return _global_match(node[1], use_fts)
+
+    field, value = node[1], node[2]
+    if field in TEXT_COLUMNS:
+        return _text_match(field, value, use_fts)
+    if field == 'id':
+        return _id_match(value)
+    if field == 'date':
+        return _date_match(value)
+    if field in NUMERIC_COLUMNS:
+        return _numeric_match(field, value)
+    flag = value.lower()
+    if flag in ('plot', 'selected'):
+        return Measurement.id.in_(list(selected_ids)) if selected_ids else false()
+    if flag == 'draft':
+        return Measurement.is_draft.is_(True)
+    return false()
+
+
+def compile_query(query, selected_ids=()):
+    """
+    Compile an RQL query into a WHERE clause over `measurements`, or None for
+    an empty query. `selected_ids` backs is:plot / is:selected.
+    Raises RQLError for malformed queries.
+    """
+    if not query or not query.strip():
+        return None
+    return _compile(parse(query.strip()), selected_ids, fts_available())
@@ -0,0 +1,114 @@
+"""
+Production entry point: a multi-worker WSGI server in front of `create_app`.
+
+    python serve.py --workers 4 --threads 8 --port 5001
+
+Uses gunicorn when installed (process workers with a thread pool each, Linux
+and macOS), otherwise waitress (one process with a thread pool, also on
+Windows). Install them with `uv sync --extra serve`. Pending migrations run
+once before the workers start.
+
+Every open `/api/events` stream occupies one thread. A worker keeps at most
+`--max-streams` of them (half its threads by default), so the other threads
+always serve API requests; further browsers are told to retry later and poll
+the lock meanwhile. All workers share project.db
+in WAL mode: reads run in parallel, writes are serialized by SQLite and wait
+up to `--busy-timeout` ms for each other.
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+
+from app import create_app
+from migrations import migrate
+from models import db
+
+
+def run_gunicorn(app, args):
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(server, worker):
+        # Connections opened by the master must not be shared with the workers
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{args.host}:{args.port}")
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', 120)
+            self.cfg.set('post_fork', post_fork)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def run_waitress(app, args):
+    from waitress import serve
+
+    if args.workers > 1:
+        print("waitress runs a single process; serving with threads only", file=sys.stderr)
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+SERVERS = {'gunicorn': run_gunicorn, 'waitress': run_waitress}
+
+
+def pick_server(name):
+    if name != 'auto':
+        return name
+    for candidate in SERVERS:
+        if importlib.util.find_spec(candidate) is not None:
+            return candidate
+    sys.exit("No WSGI server installed: run `uv sync --extra serve` (gunicorn or waitress)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the application with a production WSGI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (gunicorn only)")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per worker")
+    parser.add_argument("--max-streams", type=int,
+                        help="Event streams each worker keeps open (default: half the threads)")
+    parser.add_argument("--server", choices=['auto', *SERVERS], default='auto')
+    parser.add_argument("--journal-mode", default='WAL', help="SQLite journal_mode")
+    parser.add_argument("--synchronous", default='NORMAL', help="SQLite synchronous setting")
+    parser.add_argument("--busy-timeout", type=int, default=5000,
+                        help="Milliseconds a write waits for the database lock")
+    parser.add_argument("--backup-interval", type=float, default=0,
+                        help="Seconds between online snapshots of the database (0: off, see backup.py)")
+    args = parser.parse_args()
+    if args.max_streams is None:
+        args.max_streams = args.threads // 2
+    if not 0 <= args.max_streams < args.threads:
+        parser.error("--max-streams must leave at least one thread for API requests")
+
+    server = pick_server(args.server)
+    app = create_app({
+        'SQLITE_JOURNAL_MODE': args.journal_mode,
+        'SQLITE_SYNCHRONOUS': args.synchronous,
+        'SQLITE_BUSY_TIMEOUT': args.busy_timeout,
+        'BACKUP_INTERVAL': args.backup_interval,
+        'EVENTS_MAX_STREAMS': args.max_streams,
+        # Room for every thread plus the event poller
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': args.threads + 1, 'max_overflow': args.threads,
+                                      'pool_timeout': 30},
+    })
+    with app.app_context():
+        print(f"Schema version {migrate()}")
+        db.engine.dispose()
+
+    print(f"Serving on http://{args.host}:{args.port} with {server}")
+    SERVERS[server](app, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Spindle registry and set-based recompute of the derived shear columns.
+
+Factors live in the `spindles` table and are read through a small per-process
+cache keyed by a trigger-maintained registry version (`models.spindle_version`),
+so a change made by another process, such as the commands below, is used by
+the next request of every worker.
+
+    Shear Rate (1/s)   = N (RPM) * factor
+    Shear Stress (Pa)  = eta (mPa·s) * Shear Rate * 0.001
+
+Recalibrating a spindle rewrites the shear columns of every point measured
+with it, a batch of measurements per transaction:
+
+    python spindles.py list
+    python spindles.py set SC4-18 1.32          # register or change, no recompute
+    python spindles.py recalibrate SC4-18 1.35  # change and recompute all points
+"""
+
+import argparse
+import time
+import weakref
+
+from sqlalchemy import Float, literal, or_, select, update
+
+from models import db, Measurement, Point, PointOverlay, Spindle, spindle_version
+
+_cache = weakref.WeakKeyDictionary()  # engine -> (registry version, {spindle_id: factor})
+
+
+def factors():
+    """Return {spindle_id: factor} for every registered spindle."""
+    engine = db.engine
+    version = spindle_version()
+    cached = _cache.get(engine)
+    if cached is None or version is None or cached[0] != version:
+        rows = db.session.execute(select(Spindle.spindle_id, Spindle.factor)).all()
+        cached = (version, dict(rows))
+        _cache[engine] = cached
+    return cached[1]
+
+
+def factor_for(spindle_id):
+    """Return the factor of `spindle_id`, or None for unknown or missing spindles."""
+    return factors().get(spindle_id) if spindle_id else None
+
+
+def set_factor(spindle_id, factor):
+    """Register `spindle_id` or change its factor; stored points are left as they are."""
+    spindle = db.session.get(Spindle, spindle_id)
+    if spindle is None:
+        db.session.add(Spindle(spindle_id=spindle_id, factor=factor))
+    else:
+        spindle.factor = factor
+    db.session.commit()
+
+
+def shear_values(model, factor):
+    """Return the shear_rate / shear_stress SET clause for `model` (None clears them)."""
+    rate = literal(factor, Float) * model.N
+    return {"shear_rate": rate, "shear_stress": model.eta * rate * 0.001}
+
+
+def recalibrate(spindle_id, factor, batch_size=500, progress=None):
+    """
+    Set the factor of `spindle_id` and recompute the shear values of every point
+    measured with it, `batch_size` measurements per transaction. Drafts are
+    included, and `progress(done, total)` is called after each batch.
+
+    The factor is committed first and every batch recomputes from N and eta, so
+    an interrupted run is completed by running it again.
+    """
+    set_factor(spindle_id, factor)
+    ids = db.session.execute(
+        select(Measurement.id).where(Measurement.spindle_id == spindle_id).order_by(Measurement.id)
+    ).scalars().all()
+
+    import point_store  # Deferred: point_store imports drafts, which imports this module
+    import summaries
+
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        db.session.execute(
+            update(Point).where(Point.measurement_id.in_(batch))
+            .values(shear_values(Point, factor))
+            .execution_options(synchronize_session=False))
+        db.session.execute(
+            update(PointOverlay)
+            .where(PointOverlay.draft_id.in_(batch), PointOverlay.deleted.is_(False))
+            .values(shear_values(PointOverlay, factor))
+            .execution_options(synchronize_session=False))
+        # Drafts of these measurements show the recomputed originals as well
+        db.session.execute(
+            update(Measurement)
+            .where(or_(Measurement.id.in_(batch), Measurement.original_id.in_(batch)))
+            .values(data_version=Measurement.data_version + 1)
+            .execution_options(synchronize_session=False))
+        if point_store.packed_mode():
+            point_store.pack(batch)
+        summaries.refresh(db.session.execute(
+            select(Measurement.id).where(or_(Measurement.id.in_(batch), Measurement.original_id.in_(batch)))
+        ).scalars().all())
+        db.session.commit()
+        if progress:
+            progress(start + len(batch), len(ids))
+    return len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the spindle registry of project.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Show the registered spindles")
+    set_parser = commands.add_parser("set", help="Register a spindle or change its factor")
+    recalibrate_parser = commands.add_parser(
+        "recalibrate", help="Change a spindle's factor and recompute every point measured with it")
+    for sub in (set_parser, recalibrate_parser):
+        sub.add_argument("spindle_id")
+        sub.add_argument("factor", type=float)
+    recalibrate_parser.add_argument("--batch-size", type=int, default=500,
+                                    help="Measurements recomputed per transaction")
+    args = parser.parse_args()
+
+    from app import create_app  # Deferred: app imports this module through api
+    from migrations import migrate
+
+    app = create_app()
+    with app.app_context():
+        migrate()
+
+        if args.command == "list":
+            for spindle in Spindle.query.order_by(Spindle.spindle_id):
+                print(f"{spindle.spindle_id}\t{spindle.factor}")
+        elif args.command == "set":
+            set_factor(args.spindle_id, args.factor)
+            print(f"{args.spindle_id} = {args.factor} (stored points unchanged)")
+        else:
+            started = time.perf_counter()
+            total = recalibrate(
+                args.spindle_id, args.factor, args.batch_size,
+                progress=lambda done, total: print(f"Recomputed {done}/{total} measurements"))
+            print(f"Done: {total} measurements in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == '__main__':
+    main()
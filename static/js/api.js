@@ -1,11 +1,14 @@
 // static/js/api.js
 import state from './state.js';
 
+// Binary columnar responses (see wire.py): every numeric column arrives as a
+// little-endian float64 buffer that is mapped into a Float64Array without copying
+const COLUMNAR_BINARY = 'application/vnd.keyin.columnar';
+
 /**
- * Enhanced fetch wrapper that automatically includes the Session ID
- * and handles common error scenarios.
+ * Sends a request with the Session ID and turns error statuses into exceptions.
  */
-async function fetchWithLock(url, options = {}) {
+async function sendWithLock(url, options = {}) {
     const headers = {
         'Content-Type': 'application/json',
         'X-Session-ID': state.sessionID,
@@ -24,13 +27,67 @@ async function fetchWithLock(url, options = {}) {
         throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
     }
 
+    return response;
+}
+
+/**
+ * Enhanced fetch wrapper that automatically includes the Session ID
+ * and handles common error scenarios.
+ */
+async function fetchWithLock(url, options = {}) {
+    const response = await sendWithLock(url, options);
     return response.json();
 }
 
+/**
+ * Like fetchWithLock, but asks for the binary columnar format: numeric arrays
+ * in the result are Float64Arrays (NaN for missing values).
+ */
+async function fetchColumnar(url, options = {}) {
+    const response = await sendWithLock(url, {
+        ...options,
+        headers: { ...(options.headers || {}), 'Accept': COLUMNAR_BINARY }
+    });
+    return decodeColumnar(await response.arrayBuffer());
+}
+
+export function decodeColumnar(buffer) {
+    const headerLength = new DataView(buffer).getUint32(0, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+    const columns = header.columns.map(([offset, length]) => new Float64Array(buffer, offset, length));
+    const resolve = (value) => {
+        if (Array.isArray(value)) return value.map(resolve);
+        if (value && typeof value === 'object') {
+            if ('$column' in value) return columns[value.$column];
+            return Object.fromEntries(Object.entries(value).map(([key, item]) => [key, resolve(item)]));
+        }
+        return value;
+    };
+    return resolve(header.payload);
+}
+
+/**
+ * Turns { name: Float64Array } columns into row objects (NaN becomes null).
+ */
+export function columnsToRows(columns) {
+    const names = Object.keys(columns);
+    const length = names.length ? columns[names[0]].length : 0;
+    return Array.from({ length }, (_, i) => Object.fromEntries(
+        names.map(name => [name, Number.isNaN(columns[name][i]) ? null : columns[name][i]])));
+}
+
 export async function getLockStatus() {
     return fetchWithLock('/api/lock');
 }
 
+/**
+ * Opens the server-sent event stream of lock and measurement changes.
+ * EventSource reconnects by itself and resumes after the last event ID.
+ */
+export function openEventStream() {
+    return new EventSource('/api/events');
+}
+
 export async function acquireLock(userName) {
     return fetchWithLock('/api/lock/acquire', {
         method: 'POST',
@@ -50,8 +107,33 @@ export async function sendHeartbeat() {
     return fetchWithLock('/api/lock/heartbeat', { method: 'POST' });
 }
 
-export async function fetchMeasurements() {
-    return fetchWithLock('/api/measurements');
+// Table columns -> server sort keys
+const LIST_SORT_KEYS = { id: 'id', liquid_name: 'name', date: 'date', serial_id: 'serial' };
+
+/**
+ * Fetch one page of the measurement list: { measurements, total, next_cursor }.
+ * The server sends ETags with Cache-Control: no-cache, so the browser revalidates
+ * and unchanged pages come back as 304 without being re-serialized.
+ */
+export async function fetchMeasurements(query = '', selectedIds = [], { sort, cursor, limit } = {}) {
+    // RQL filtering runs on the server; selected IDs back is:plot / is:selected
+    const params = new URLSearchParams();
+    if (query.trim()) {
+        params.set('q', query.trim());
+        if (selectedIds.length > 0) params.set('selected', selectedIds.join(','));
+    }
+    if (sort) {
+        params.set('sort', LIST_SORT_KEYS[sort.column] || 'name');
+        params.set('order', sort.direction);
+    }
+    if (cursor) params.set('cursor', cursor);
+    if (limit) params.set('limit', limit);
+    const qs = params.toString();
+    return fetchWithLock(qs ? `/api/measurements?${qs}` : '/api/measurements');
+}
+
+export async function fetchSpindles() {
+    return fetchWithLock('/api/spindles');
 }
 
 export async function createMeasurement(liquidName) {
@@ -62,8 +144,7 @@ export async function createMeasurement(liquidName) {
 }
 
 export async function fetchMeasurementData(id) {
-    const response = await fetchWithLock(`/api/measurements/${id}`);
-    return response;
+    return fetchColumnar(`/api/measurements/${id}`);
 }
 
 export async function startEditMode(id) {
@@ -122,7 +203,27 @@ export async function updateDataPoint(measurementId, pointId, pointData) {
     return response;
 }
 
+/**
+ * Apply add / update / delete operations to one measurement atomically.
+ * Returns { points: [{ op, id, shear_rate, shear_stress }] } in operation order.
+ */
+export async function batchUpdatePoints(measurementId, operations) {
+    return fetchWithLock(`/api/measurements/${measurementId}/points/batch`, {
+        method: 'POST',
+        body: JSON.stringify({ operations })
+    });
+}
+
 export async function fetchRegression(id, type = 'linear') {
-    const url = type === 'linear' ? `/api/measurements/${id}/regression` : `/api/measurements/${id}/power-regression`;
-    return fetchWithLock(url);
+    // Coefficients only: chart_service samples the curve for the current axes
+    const path = type === 'linear' ? 'regression' : 'power-regression';
+    const url = `/api/measurements/${id}/${path}?coefficients_only=1`;
+    return fetchColumnar(url);
+}
+
+export async function fetchComparison(ids, fits = ['power']) {
+    return fetchColumnar('/api/comparison?coefficients_only=1', {
+        method: 'POST',
+        body: JSON.stringify({ ids, fits })
+    });
 }
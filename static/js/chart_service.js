@@ -1,5 +1,5 @@
 // static/js/chart_service.js
-import { fetchMeasurementData, fetchRegression } from './api.js';
+import { fetchComparison } from './api.js';
 
 // --- Constants & Configuration ---
 const GOLDEN_RATIO_CONJUGATE = 0.618033988749895;
@@ -44,7 +44,7 @@ function getDynamicColor(index, alpha = 1) {
     return hsvToRgba(h, 0.75, 0.9, alpha); // Balanced: S=0.5, V=0.9
 }
 
-// Simple cache for measurement points to avoid redundant API calls
+// Simple cache of comparison entries (points + fits) to avoid redundant API calls
 const dataCache = new Map();
 
 export function clearChartCache(id = null) {
@@ -277,22 +277,31 @@ export function destroyChart(chartInstance) {
 }
 
 export async function getSelectedMeasurementsForChart(measurementIds, options = {}) {
-    const { includeLinear = false, includePower = true, customCurves = [] } = options;
+    const { includeLinear = false, includePower = true, customCurves = [], xLog = false, yLog = false } = options;
+    const axes = { xLog, yLog };
     const chartData = { datasets: [] };
 
+    const fits = [];
+    if (includePower) fits.push('power');
+    if (includeLinear) fits.push('linear');
+
+    // Fetch every uncached measurement (or missing fit) in a single batch request
+    const uncachedIds = measurementIds.filter(id => {
+        const cached = dataCache.get(id);
+        return !cached || !fits.every(fit => fit in cached.regressions);
+    });
+    if (uncachedIds.length > 0) {
+        const comparison = await fetchComparison(uncachedIds, fits);
+        comparison.measurements.forEach(entry => dataCache.set(entry.requested_id, entry));
+        comparison.missing.forEach(id => console.warn(`Measurement ${id} not found`));
+    }
+
     for (let i = 0; i < measurementIds.length; i++) {
         const id = measurementIds[i];
-        let measurementData;
-
-        // Caching logic
-        if (dataCache.has(id)) {
-            measurementData = dataCache.get(id);
-        } else {
-            measurementData = await fetchMeasurementData(id);
-            dataCache.set(id, measurementData);
-        }
+        const measurementData = dataCache.get(id);
+        if (!measurementData) continue;
 
-        const pointsArray = measurementData.points;
+        const { shear_rate: shearRates, shear_stress: shearStresses } = measurementData;
         const logicalId = measurementData.original_id || measurementData.id;
         const displayName = `${measurementData.liquid_name} - ${logicalId}`;
         const color = getDynamicColor(i);
@@ -301,7 +310,7 @@ export async function getSelectedMeasurementsForChart(measurementIds, options =
         // Add raw data points
         chartData.datasets.push({
             label: displayName,
-            data: pointsArray.map(p => ({ x: p.shear_rate, y: p.shear_stress })),
+            data: Array.from(shearRates, (x, k) => ({ x, y: shearStresses[k] })),
             backgroundColor: getDynamicColor(i, 0.5),
             borderColor: color,
             pointRadius: 5,
@@ -310,19 +319,25 @@ export async function getSelectedMeasurementsForChart(measurementIds, options =
             type: 'scatter'
         });
 
-        // Fetch Regression Data
+        // Regression Data (already fitted server-side)
         if (includePower) {
-            try {
-                const reg = await fetchRegression(id, 'power');
-                chartData.datasets.push(createRegressionDataset(displayName, reg, 'power', color));
-            } catch (e) { console.warn(`Power reg failed for ${displayName}`, e); }
+            const reg = measurementData.regressions.power;
+            if (reg.error) {
+                console.warn(`Power reg failed for ${displayName}: ${reg.error}`);
+            } else {
+                chartData.datasets.push(createRegressionDataset(
+                    `Power (${displayName}): ${regressionFormula(reg, 'power')}`, reg, 'power', color, axes));
+            }
         }
 
         if (includeLinear) {
-            try {
-                const reg = await fetchRegression(id, 'linear');
-                chartData.datasets.push(createRegressionDataset(displayName, reg, 'linear', color));
-            } catch (e) { console.warn(`Linear reg failed for ${displayName}`, e); }
+            const reg = measurementData.regressions.linear;
+            if (reg.error) {
+                console.warn(`Linear reg failed for ${displayName}: ${reg.error}`);
+            } else {
+                chartData.datasets.push(createRegressionDataset(
+                    `Linear (${displayName}): ${regressionFormula(reg, 'linear')}`, reg, 'linear', color, axes));
+            }
         }
     }
 
@@ -345,21 +360,10 @@ export async function getSelectedMeasurementsForChart(measurementIds, options =
         if (minX <= 0) minX = 0.001;
 
         customCurves.forEach(curve => {
-            const points = [];
-            const steps = 100;
-            const logMin = Math.log(minX);
-            const logMax = Math.log(maxX);
-
-            for (let i = 0; i <= steps; i++) {
-                const x = Math.exp(logMin + (logMax - logMin) * (i / steps));
-                let y;
-                if (curve.type === 'linear') {
-                    y = curve.param1 * x + curve.param2;
-                } else {
-                    y = curve.param1 * Math.pow(x, curve.param2);
-                }
-                points.push({ x, y });
-            }
+            const params = curve.type === 'linear'
+                ? { slope: curve.param1, intercept: curve.param2 }
+                : { a: curve.param1, b: curve.param2 };
+            const points = sampleCurve(curveFunction(curve.type, params), minX, maxX, axes);
 
             let label;
             if (curve.type === 'linear') {
@@ -389,22 +393,87 @@ export async function getSelectedMeasurementsForChart(measurementIds, options =
     return chartData;
 }
 
-function createRegressionDataset(name, regData, type, color) {
-    const points = regData.regression_points.map(p => ({ x: p.shear_rate, y: p.shear_stress }));
-    let label;
-    const r2 = regData.r_squared.toFixed(3);
+/**
+ * Samples y = fn(x) on [xMin, xMax] for drawing a curve. The initial samples
+ * are evenly spaced in log x on logarithmic x axes (linear x otherwise), and
+ * segments whose midpoint is off the straight line between their ends by more
+ * than `tolerance` of the visible y range (measured in log y on logarithmic y
+ * axes) are split again, so bends get dense sampling and straight runs get few.
+ * Points that cannot be drawn (non-finite, or y <= 0 on a log axis) are skipped.
+ */
+export function sampleCurve(fn, xMin, xMax, { xLog = false, yLog = false, initial = 24, maxDepth = 10, tolerance = 0.002 } = {}) {
+    if (xLog) {
+        if (xMax <= 0) return [];
+        if (xMin <= 0) xMin = xMax * 1e-6;
+    }
+    const toX = xLog ? t => Math.exp(t) : t => t;
+    const toScreenY = yLog ? y => (y > 0 ? Math.log(y) : NaN) : y => y;
+    const sample = (t) => {
+        const x = toX(t);
+        const y = fn(x);
+        return { t, x, y, sy: toScreenY(y) };
+    };
+
+    const t0 = xLog ? Math.log(xMin) : xMin;
+    const t1 = xLog ? Math.log(xMax) : xMax;
+    const grid = Array.from({ length: initial + 1 }, (_, i) => sample(t0 + (t1 - t0) * (i / initial)));
+
+    const finite = grid.map(p => p.sy).filter(Number.isFinite);
+    const range = finite.length ? (Math.max(...finite) - Math.min(...finite)) || 1 : 1;
+    const limit = tolerance * range;
+
+    const out = [];
+    const refine = (left, right, depth) => {
+        const mid = sample((left.t + right.t) / 2);
+        const straight = (left.sy + right.sy) / 2;
+        const bent = !(Math.abs(mid.sy - straight) <= limit); // Also true across NaN gaps
+        if (bent && depth < maxDepth) {
+            refine(left, mid, depth + 1);
+            out.push(mid);
+            refine(mid, right, depth + 1);
+        }
+    };
+    out.push(grid[0]);
+    for (let i = 1; i < grid.length; i++) {
+        refine(grid[i - 1], grid[i], 0);
+        out.push(grid[i]);
+    }
+    return out.filter(p => Number.isFinite(p.sy)).map(({ x, y }) => ({ x, y }));
+}
 
+/**
+ * Returns y = f(x) for a fit result or custom curve of the given type.
+ */
+export function curveFunction(type, params) {
+    if (type === 'linear') {
+        const { slope, intercept } = params;
+        return x => slope * x + intercept;
+    }
+    const { a, b } = params;
+    return x => a * Math.pow(x, b);
+}
+
+/**
+ * KaTeX formula of a fit result, e.g. "$\sigma = ..., R^2=...$".
+ */
+export function regressionFormula(regData, type) {
+    const r2 = regData.r_squared.toFixed(3);
     if (type === 'linear') {
         const { slope, intercept } = regData;
-        label = `Linear (${name}): $\\sigma = ${slope.toFixed(3)}\\dot{\\gamma} ${intercept >= 0 ? '+' : ''} ${intercept.toFixed(3)}, R^2=${r2}$`;
-    } else {
-        const { a, b } = regData;
-        label = `Power (${name}): $\\sigma = ${a.toFixed(3)}\\dot{\\gamma}^{${b.toFixed(3)}}, R^2=${r2}$`;
+        return `$\\sigma = ${slope.toFixed(3)}\\dot{\\gamma} ${intercept >= 0 ? '+' : ''} ${intercept.toFixed(3)}, R^2=${r2}$`;
     }
+    const { a, b } = regData;
+    return `$\\sigma = ${a.toFixed(3)}\\dot{\\gamma}^{${b.toFixed(3)}}, R^2=${r2}$`;
+}
 
+/**
+ * Line dataset for a fit result (coefficients plus its x_min / x_max), sampled
+ * for the current axes: `axes` is { xLog, yLog }.
+ */
+export function createRegressionDataset(label, regData, type, color, axes = {}) {
     return {
         label: label,
-        data: points,
+        data: sampleCurve(curveFunction(type, regData), regData.x_min, regData.x_max, axes),
         borderColor: color,
         borderWidth: 2,
         borderDash: type === 'linear' ? [10, 5] : [5, 5],
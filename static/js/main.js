@@ -101,6 +101,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
     let activeChart = null;
     let comparisonChart = null;
+    let searchDebounceTimer = null;
+    let listRequestId = 0; // Ignore list pages that arrive after a newer reload
+    const LIST_PAGE_SIZE = 200;
     const activeRequests = new Map(); // Track latest request ID per row
     const pendingAdds = new Set();    // Track rows currently being created in DB
 
@@ -142,6 +145,19 @@ document.addEventListener('DOMContentLoaded', () => {
     makeDraggable(elements.customLegend);
 
     // 0. Lock & User Management
+    async function loadSpindles() {
+        try {
+            const spindles = await api.fetchSpindles();
+            const select = elements.measurementSpindleSelect;
+            const current = select.value;
+            select.querySelectorAll('option:not([value=""])').forEach(option => option.remove());
+            spindles.forEach(({ spindle_id }) => select.add(new Option(spindle_id, spindle_id)));
+            select.value = current;
+        } catch (error) {
+            console.error('Error loading spindles:', error);
+        }
+    }
+
     function initUserConfig() {
         if (!state.userName) {
             stateManager.setUserName('User-' + Math.random().toString(36).substring(2, 6));
@@ -171,6 +187,60 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // --- Change Events ---
+    // Lock and measurement changes are pushed over /api/events; polling is only
+    // the fallback while the stream is down.
+    let eventsConnected = false;
+    let pendingRefresh = null;
+
+    function connectEvents() {
+        const source = api.openEventStream();
+        source.onopen = () => { eventsConnected = true; };
+        source.onerror = () => { eventsConnected = false; };
+        source.onmessage = (e) => handleServerEvent(JSON.parse(e.data));
+    }
+
+    function handleServerEvent(event) {
+        if (event.kind === 'busy') {
+            // The worker is at its stream limit: poll until the browser reconnects
+            eventsConnected = false;
+            pollLockStatus();
+        } else if (event.kind === 'lock.acquired' || event.kind === 'lock.released') {
+            pollLockStatus(); // Tells whether the new holder is this session
+        } else if (event.kind === 'reset') {
+            chartService.clearChartCache();
+            scheduleRefresh(null);
+        } else if (event.kind.startsWith('measurement.')) {
+            chartService.clearChartCache(event.measurement_id);
+            scheduleRefresh(event.measurement_id);
+        }
+    }
+
+    // Coalesces bursts of events (imports, bulk recalibration) into one reload
+    function scheduleRefresh(measurementId) {
+        if (!pendingRefresh) {
+            pendingRefresh = { ids: new Set(), all: false };
+            setTimeout(applyRefresh, 300);
+        }
+        if (measurementId === null) {
+            pendingRefresh.all = true;
+        } else {
+            pendingRefresh.ids.add(measurementId);
+        }
+    }
+
+    function applyRefresh() {
+        const { ids, all } = pendingRefresh;
+        pendingRefresh = null;
+        loadAndRenderMeasurements();
+        if (!state.isEditing && (all || ids.has(state.activeMeasurement))) {
+            loadActiveMeasurementData();
+        }
+        if (Array.from(state.comparisonSelected).some(id => all || ids.has(id))) {
+            handleDrawSelected();
+        }
+    }
+
     // --- Page Lifecycle Logic ---
     window.addEventListener('beforeunload', (e) => {
         if (state.isEditing) {
@@ -271,17 +341,42 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // 1. Data Loading & List Management
     async function loadAndRenderMeasurements() {
+        const requestId = ++listRequestId;
         try {
-            const measurements = await api.fetchMeasurements();
-            stateManager.setAllMeasurements(measurements);
+            // Reload every page that was already shown so the list does not shrink
+            const limit = Math.max(LIST_PAGE_SIZE, state.allMeasurements.length);
+            const page = await api.fetchMeasurements(
+                state.measurementFilter, Array.from(state.comparisonSelected),
+                { sort: state.sortState, limit });
+            if (requestId !== listRequestId) return;
+            stateManager.setAllMeasurements(page.measurements, page.total, page.next_cursor);
             refreshMeasurementList();
         } catch (error) {
             console.error('Error loading measurements:', error);
+            if (state.measurementFilter.trim()) {
+                // Malformed RQL matches nothing
+                stateManager.setAllMeasurements([]);
+                refreshMeasurementList();
+            }
+        }
+    }
+
+    async function loadMoreMeasurements() {
+        const requestId = listRequestId;
+        try {
+            const page = await api.fetchMeasurements(
+                state.measurementFilter, Array.from(state.comparisonSelected),
+                { sort: state.sortState, cursor: state.measurementNextCursor, limit: LIST_PAGE_SIZE });
+            if (requestId !== listRequestId) return;
+            stateManager.appendMeasurements(page.measurements, page.next_cursor);
+            refreshMeasurementList();
+        } catch (error) {
+            console.error('Error loading more measurements:', error);
         }
     }
 
     function refreshMeasurementList() {
-        measurementUI.renderMeasurementList(elements, setActiveMeasurement, handleDrawSelected);
+        measurementUI.renderMeasurementList(elements, setActiveMeasurement, handleDrawSelected, loadMoreMeasurements);
         measurementUI.updateSortIcons(elements);
     }
 
@@ -360,7 +455,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         try {
             const data = await api.fetchMeasurementData(state.activeMeasurement);
-            const points = data.points;
+            const points = api.columnsToRows(data.points);
             const logicalId = data.original_id || data.id;
 
             elements.activeMeasurementId.value = logicalId;
@@ -382,12 +477,12 @@ document.addEventListener('DOMContentLoaded', () => {
     async function renderActiveChart(measurementData) {
         if (!state.activeMeasurement) return;
 
-        const points = measurementData.points;
+        const { shear_rate: shearRates, shear_stress: shearStresses } = measurementData.points;
         const displayName = `${measurementData.liquid_name} - ${measurementData.id}`;
 
         const datasets = [{
             label: displayName,
-            data: points.map(p => ({ x: p.shear_rate, y: p.shear_stress })),
+            data: Array.from(shearRates, (x, k) => ({ x, y: shearStresses[k] })),
             backgroundColor: 'rgba(75, 192, 192, 0.5)',
             borderColor: 'rgba(75, 192, 192, 1)',
             pointRadius: 5,
@@ -395,18 +490,23 @@ document.addEventListener('DOMContentLoaded', () => {
             type: 'scatter'
         }];
 
-        // Add Regressions if enabled
+        // Add Regressions if enabled (curves are sampled here for the current axes)
+        const axes = { xLog: state.chartConfig.active.xLog, yLog: state.chartConfig.active.yLog };
         if (state.chartConfig.active.includeLinear) {
             try {
                 const reg = await api.fetchRegression(state.activeMeasurement, 'linear');
-                datasets.push(createRegressionDataset(displayName, reg, 'linear', 'rgba(255, 99, 132, 1)'));
+                datasets.push(chartService.createRegressionDataset(
+                    `${displayName} (Linear): ${chartService.regressionFormula(reg, 'linear')}`,
+                    reg, 'linear', 'rgba(255, 99, 132, 1)', axes));
             } catch (e) { console.warn('Active linear reg failed', e); }
         }
 
         if (state.chartConfig.active.includePower) {
             try {
                 const reg = await api.fetchRegression(state.activeMeasurement, 'power');
-                datasets.push(createRegressionDataset(displayName, reg, 'power', 'rgba(54, 162, 235, 1)'));
+                datasets.push(chartService.createRegressionDataset(
+                    `${displayName} (Power): ${chartService.regressionFormula(reg, 'power')}`,
+                    reg, 'power', 'rgba(54, 162, 235, 1)', axes));
             } catch (e) { console.warn('Active power reg failed', e); }
         }
 
@@ -420,36 +520,6 @@ document.addEventListener('DOMContentLoaded', () => {
         elements.resetActiveZoomBtn.style.display = 'flex';
     }
 
-    // Helper for creating regression datasets
-    function createRegressionDataset(name, regData, type, color) {
-        const points = regData.regression_points.map(p => ({ x: p.shear_rate, y: p.shear_stress }));
-        let label;
-        const r2 = regData.r_squared.toFixed(3);
-
-        if (type === 'linear') {
-            const { slope, intercept } = regData;
-            label = `${name} (Linear): $\\sigma = ${slope.toFixed(3)}\\dot{\\gamma} ${intercept >= 0 ? '+' : ''} ${intercept.toFixed(3)}, R^2=${r2}$`;
-        } else {
-            const { a, b } = regData;
-            label = `${name} (Power): $\\sigma = ${a.toFixed(3)}\\dot{\\gamma}^{${b.toFixed(3)}}, R^2=${r2}$`;
-        }
-
-        return {
-            label: label,
-            data: points,
-            borderColor: color,
-            borderWidth: 2,
-            borderDash: type === 'linear' ? [10, 5] : [5, 5],
-            backgroundColor: 'rgba(0,0,0,0)',
-            type: 'line',
-            showLine: true,
-            fill: false,
-            pointRadius: 0,
-            hitRadius: 15,
-            pointHitRadius: 15,
-            tension: 0.1
-        };
-    }
     // 3. User Actions
     function handleSort(e) {
         const column = e.currentTarget.dataset.sort;
@@ -461,12 +531,14 @@ document.addEventListener('DOMContentLoaded', () => {
             direction = 'asc';
         }
         stateManager.setSortState(column, direction);
-        refreshMeasurementList();
+        stateManager.setAllMeasurements([]); // Pages of another order cannot be kept
+        loadAndRenderMeasurements();
     }
 
     function handleMeasurementSearch() {
         stateManager.setMeasurementFilter(elements.measurementSearchInput.value);
-        refreshMeasurementList();
+        clearTimeout(searchDebounceTimer);
+        searchDebounceTimer = setTimeout(loadAndRenderMeasurements, 250);
     }
 
     function updateSaveButtonState() {
@@ -625,7 +697,7 @@ document.addEventListener('DOMContentLoaded', () => {
             elements.cancelEditBtn.style.display = 'inline-block';
             workspaceUI.updateEditModeUI(elements);
 
-            // Reload to get the new DRAFT IDs for points
+            // Reload through the draft (original point IDs stay valid; added points get new IDs)
             await loadActiveMeasurementData();
             updateSaveButtonState();
 
@@ -639,8 +711,7 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             // Ensure all rows are synced before committing
             const rows = Array.from(elements.pointsTableBody.querySelectorAll('tr'));
-            const syncPromises = rows.map(row => syncTableRow(row));
-            await Promise.all(syncPromises);
+            await syncRows(rows);
 
             const response = await api.commitEditMode(state.activeMeasurement);
             const finalId = response.id || state.activeMeasurement;
@@ -763,6 +834,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         let id = tr.dataset.id;
+        if (id && !workspaceUI.isRowChanged(tr)) return; // Nothing new to save
         const requestId = Date.now();
         activeRequests.set(tr, requestId);
 
@@ -815,6 +887,7 @@ document.addEventListener('DOMContentLoaded', () => {
             // --- Success Check ---
             // Only update UI if this is the most recent request for this row
             if (activeRequests.get(tr) === requestId) {
+                workspaceUI.markRowSynced(tr);
                 if (result && result.shear_rate !== undefined && result.shear_stress !== undefined) {
                      shearRateDisplay.textContent = parseFloat(result.shear_rate).toFixed(3);
                      shearStressDisplay.textContent = parseFloat(result.shear_stress).toFixed(3);
@@ -844,6 +917,97 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    /**
+     * Save many rows with one batch request: updates for changed rows that have
+     * a point ID, adds for complete new rows. All rows succeed or fail together.
+     */
+    async function syncRows(rows) {
+        if (!state.isEditing) return;
+
+        const pending = rows.filter(tr => {
+            const { N, eta, torque } = workspaceUI.getRowValues(tr);
+            if (N === '' || eta === '' || torque === '') return false;
+            return tr.dataset.id ? workspaceUI.isRowChanged(tr) : !pendingAdds.has(tr);
+        });
+        if (pending.length === 0) return;
+
+        if (!elements.measurementSpindleSelect.value) {
+            alert('Please select a Spindle ID before adding data points.');
+            return;
+        }
+
+        const operations = pending.map(tr => tr.dataset.id
+            ? { op: 'update', id: Number(tr.dataset.id), ...workspaceUI.getRowValues(tr) }
+            : { op: 'add', ...workspaceUI.getRowValues(tr) });
+        pending.forEach(tr => {
+            activeRequests.delete(tr); // Supersede single-row saves still in flight
+            if (!tr.dataset.id) pendingAdds.add(tr);
+            tr.classList.add('syncing');
+        });
+
+        try {
+            const result = await api.batchUpdatePoints(state.activeMeasurement, operations);
+            result.points.forEach((point, i) => {
+                const tr = pending[i];
+                tr.dataset.id = point.id;
+                workspaceUI.markRowSynced(tr);
+                tr.querySelector('[data-field="shear_rate"]').textContent = parseFloat(point.shear_rate).toFixed(3);
+                tr.querySelector('[data-field="shear_stress"]').textContent = parseFloat(point.shear_stress).toFixed(3);
+                tr.classList.remove('error');
+            });
+            chartService.clearChartCache(state.activeMeasurement);
+            workspaceUI.ensureEmptyRow(elements, handleDeletePoint);
+            const data = await api.fetchMeasurementData(state.activeMeasurement);
+            renderActiveChart(data);
+        } catch (error) {
+            console.error('Batch save failed:', error);
+            pending.forEach(tr => tr.classList.add('error'));
+        } finally {
+            pending.forEach(tr => {
+                pendingAdds.delete(tr);
+                tr.classList.remove('syncing');
+            });
+        }
+    }
+
+    // Spreadsheet paste: one row per line, cells split on tabs, commas or semicolons
+    function handlePointsPaste(e) {
+        if (!state.isEditing || e.target.tagName !== 'INPUT') return;
+
+        const text = (e.clipboardData || window.clipboardData).getData('text');
+        const rows = text.split(/\r?\n/)
+            .map(line => line.trim())
+            .filter(line => line !== '')
+            .map(line => line.split(/[\t;,]/).map(cell => cell.trim()))
+            .filter(cells => cells.every(cell => /^-?\d*\.?\d*$/.test(cell))); // Skips header lines
+        if (rows.length === 0 || (rows.length === 1 && rows[0].length === 1)) return; // Plain single-value paste
+
+        e.preventDefault();
+        const fields = ['N', 'eta', 'torque'];
+        const startColumn = Math.max(fields.indexOf(e.target.dataset.field), 0);
+        let tr = e.target.closest('tr');
+        const touched = [];
+
+        rows.forEach(cells => {
+            if (!tr) {
+                tr = workspaceUI.createTableRow(null, undefined, undefined, handleDeletePoint, undefined, undefined, undefined,
+                    () => workspaceUI.ensureEmptyRow(elements, handleDeletePoint));
+                elements.pointsTableBody.appendChild(tr);
+            }
+            cells.slice(0, fields.length - startColumn).forEach((cell, i) => {
+                const input = tr.querySelector(`input[data-field="${fields[startColumn + i]}"]`);
+                input.value = cell;
+                state.lastValidValues.set(input, cell);
+            });
+            touched.push(tr);
+            tr = tr.nextElementSibling;
+        });
+
+        workspaceUI.ensureEmptyRow(elements, handleDeletePoint);
+        markDirty();
+        syncRows(touched);
+    }
+
     function handleTableNumericValidation(e) {
         if (e.target.tagName !== 'INPUT') return;
         const input = e.target;
@@ -893,7 +1057,9 @@ document.addEventListener('DOMContentLoaded', () => {
             const chartData = await chartService.getSelectedMeasurementsForChart(selectedIds, {
                 includeLinear: state.chartConfig.comparison.includeLinear,
                 includePower: state.chartConfig.comparison.includePower,
-                customCurves: state.chartConfig.comparison.customCurves
+                customCurves: state.chartConfig.comparison.customCurves,
+                xLog: state.chartConfig.comparison.xLog,
+                yLog: state.chartConfig.comparison.yLog
             });
 
             const chartOptions = {
@@ -1027,6 +1193,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Event Listeners ---
     elements.pointsTableBody.addEventListener('keydown', handleTableKeydown);
+    elements.pointsTableBody.addEventListener('paste', handlePointsPaste);
     elements.measurementSearchInput.addEventListener('input', handleMeasurementSearch);
     elements.masterPlotCheckbox.addEventListener('change', handleMasterPlotToggle);
     elements.measurementListHeaders.forEach(th => th.addEventListener('click', handleSort));
@@ -1211,7 +1378,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Initial Load & Polling ---
     initUserConfig();
+    loadSpindles();
     loadAndRenderMeasurements();
     pollLockStatus();
-    setInterval(pollLockStatus, 10000); // Poll lock status every 10s
+    connectEvents();
+    setInterval(() => {
+        if (!eventsConnected) pollLockStatus(); // Fallback while the event stream is down
+    }, 10000);
 });
@@ -9,6 +9,8 @@ const generateSessionId = () => {
 
 const state = {
     allMeasurements: [],
+    measurementTotal: 0,
+    measurementNextCursor: null, // Cursor of the next list page, null when all are loaded
     activeMeasurement: null, // Now stores ID
     isEditing: false,
     sortState: { column: 'liquid_name', direction: 'asc' },
@@ -49,8 +51,15 @@ sessionStorage.setItem('sessionID', state.sessionID);
 
 export default state;
 
-export function setAllMeasurements(measurements) {
+export function setAllMeasurements(measurements, total = measurements.length, nextCursor = null) {
     state.allMeasurements = measurements;
+    state.measurementTotal = total;
+    state.measurementNextCursor = nextCursor;
+}
+
+export function appendMeasurements(measurements, nextCursor) {
+    state.allMeasurements = [...state.allMeasurements, ...measurements];
+    state.measurementNextCursor = nextCursor;
 }
 
 export function setEditingOriginalId(id) {
@@ -1,30 +1,12 @@
 // static/js/ui/measurement_ui.js
 import state, { toggleComparisonSelection } from '../state.js';
-import { parseQuery } from '../query_parser.js';
 
 export function getProcessedMeasurements() {
-    const { column, direction } = state.sortState;
-
-    const predicate = parseQuery(state.measurementFilter, state.comparisonSelected);
-    let filtered = state.allMeasurements.filter(predicate);
-
-    // Sort
-    filtered.sort((a, b) => {
-        let valA = a[column] || '';
-        let valB = b[column] || '';
-
-        if (typeof valA === 'string') valA = valA.toLowerCase();
-        if (typeof valB === 'string') valB = valB.toLowerCase();
-
-        if (valA < valB) return direction === 'asc' ? -1 : 1;
-        if (valA > valB) return direction === 'asc' ? 1 : -1;
-        return 0;
-    });
-
-    return filtered;
+    // Filtering and sorting happen on the server (see loadAndRenderMeasurements)
+    return state.allMeasurements;
 }
 
-export function renderMeasurementList(elements, onSelect, onComparisonToggle) {
+export function renderMeasurementList(elements, onSelect, onComparisonToggle, onLoadMore) {
     const measurements = getProcessedMeasurements();
     const table = elements.measurementListTable;
     const thead = table.querySelector('thead');
@@ -92,6 +74,20 @@ export function renderMeasurementList(elements, onSelect, onComparisonToggle) {
         tbody.appendChild(tr);
     });
 
+    if (state.measurementNextCursor && onLoadMore) {
+        const tr = document.createElement('tr');
+        tr.classList.add('load-more-row');
+        const td = document.createElement('td');
+        td.colSpan = currentOrder.length;
+        td.textContent = `Load more (${measurements.length} of ${state.measurementTotal})`;
+        tr.appendChild(td);
+        tr.addEventListener('click', () => {
+            td.textContent = 'Loading...';
+            onLoadMore();
+        });
+        tbody.appendChild(tr);
+    }
+
     updateMasterCheckbox(measurements);
 }
 
@@ -41,6 +41,24 @@ export function renderPointsTable(elements, points, onDelete) {
     }
 }
 
+// Values of a row's inputs, in the shape the point API expects
+export function getRowValues(tr) {
+    return {
+        N: tr.querySelector('input[data-field="N"]').value,
+        eta: tr.querySelector('input[data-field="eta"]').value,
+        torque: tr.querySelector('input[data-field="torque"]').value
+    };
+}
+
+// Remember what the server holds for this row, so unchanged rows are not re-sent
+export function markRowSynced(tr) {
+    tr.dataset.synced = JSON.stringify(getRowValues(tr));
+}
+
+export function isRowChanged(tr) {
+    return tr.dataset.synced !== JSON.stringify(getRowValues(tr));
+}
+
 export function updateTableRow(tr, N, eta, torque, shearRate, shearStress) {
     // Only update if not currently syncing (user is typing)
     if (tr.classList.contains('syncing')) return;
@@ -66,6 +84,7 @@ export function updateTableRow(tr, N, eta, torque, shearRate, shearStress) {
         if (inputs.torque.value != torqueVal) inputs.torque.value = torqueVal;
         state.lastValidValues.set(inputs.torque, inputs.torque.value);
     }
+    markRowSynced(tr);
 }
 
 export function createTableRow(id, N, eta, onDelete, torque, shearRate, shearStress, onRemove) {
@@ -107,6 +126,7 @@ export function createTableRow(id, N, eta, onDelete, torque, shearRate, shearStr
     tr.querySelectorAll('input').forEach(input => {
         state.lastValidValues.set(input, input.value);
     });
+    if (id) markRowSynced(tr);
 
     deleteBtn.addEventListener('click', () => {
         if (id) {
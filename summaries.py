@@ -0,0 +1,125 @@
+"""
+Per-measurement summaries kept in step with the points.
+
+`MeasurementSummary` holds the point count, the shear rate range and the
+power-law fit (sigma = a * gamma^b) of every measurement, so the list can show,
+filter and sort on them with indexed SQL instead of reading `points`. Every
+commit that touches a measurement (see `api.touch_measurement`) recomputes its
+row in the same transaction; bulk writers call `refresh` directly.
+
+Build or rebuild the table of an existing database:
+    python summaries.py
+"""
+
+import argparse
+
+import numpy as np
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+
+import fitting
+import point_store
+from models import db, Measurement, MeasurementSummary
+
+COLUMNS = ('n_points', 'shear_rate_min', 'shear_rate_max', 'power_a', 'power_b', 'power_r_squared')
+
+_DIRTY_KEY = 'summaries_dirty'
+_listening = False
+
+
+def _finite(values):
+    """Float array to a list of floats, with None for NaN and infinities."""
+    return [v if np.isfinite(v) else None for v in np.asarray(values, dtype=float).tolist()]
+
+
+def compute(measurements):
+    """Return one summary row (a dict of `COLUMNS` plus keys) per measurement."""
+    if not measurements:
+        return []
+    columns = point_store.load_many(measurements)
+    rates = fitting.stack_columns([columns[m.id]["shear_rate"] for m in measurements])
+    stresses = fitting.stack_columns([columns[m.id]["shear_stress"] for m in measurements])
+    present = ~np.isnan(rates)
+    fit = fitting.power_fit(rates, stresses)
+    return [
+        {"measurement_id": m.id, "data_version": m.data_version, "n_points": len(columns[m.id]["id"]),
+         "shear_rate_min": rate_min, "shear_rate_max": rate_max,
+         "power_a": a, "power_b": b, "power_r_squared": r_squared}
+        for m, rate_min, rate_max, a, b, r_squared in zip(
+            measurements,
+            _finite(np.where(present, rates, np.inf).min(axis=1, initial=np.inf)),
+            _finite(np.where(present, rates, -np.inf).max(axis=1, initial=-np.inf)),
+            _finite(fit.a), _finite(fit.b), _finite(fit.r_squared))
+    ]
+
+
+def refresh(measurement_ids):
+    """Recompute the summaries of the given measurements in the current transaction."""
+    if not measurement_ids:
+        return
+    measurements = db.session.execute(
+        select(Measurement).where(Measurement.id.in_(list(measurement_ids)))
+        .execution_options(populate_existing=True)  # Bulk writers bump data_version in core
+    ).scalars().all()
+    rows = compute(measurements)
+    if not rows:
+        return
+    statement = insert(MeasurementSummary)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[MeasurementSummary.measurement_id],
+            set_={name: statement.excluded[name] for name in ('data_version',) + COLUMNS}),
+        rows)
+
+
+def mark_dirty(measurement):
+    """Schedule a summary refresh of `measurement` when the current transaction commits."""
+    db.session.info.setdefault(_DIRTY_KEY, set()).add(measurement)
+
+
+def _refresh_dirty(session):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if not dirty:
+        return
+    session.flush()
+    refresh([m.id for m in dirty if inspect(m).persistent])
+
+
+def _forget_dirty(session, *_):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+def rebuild(batch_size=500):
+    """Recompute every summary, committing after each batch; return the number of measurements."""
+    ids = db.session.execute(select(Measurement.id).order_by(Measurement.id)).scalars().all()
+    for start in range(0, len(ids), batch_size):
+        refresh(ids[start:start + batch_size])
+        db.session.commit()
+    return len(ids)
+
+
+def init_app(app):
+    """Keep summaries in sync with point writes in the same transaction."""
+    global _listening
+    if not _listening:
+        event.listen(db.session, 'before_commit', _refresh_dirty)
+        event.listen(db.session, 'after_rollback', _forget_dirty)
+        _listening = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the measurement summaries of project.db")
+    parser.add_argument("--batch-size", type=int, default=500, help="Measurements refreshed per transaction")
+    args = parser.parse_args()
+
+    from app import create_app  # Deferred: app imports this module
+    from migrations import migrate
+
+    app = create_app()
+    with app.app_context():
+        migrate()
+        print(f"Rebuilt the summaries of {rebuild(args.batch_size)} measurements.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+from regression_cache import regression_cache  # noqa: E402
+
+# name -> (measurements, points per measurement)
+SIZES = {
+    'small': (3, 5),
+    'large': (40, 150),
+}
+
+
+@pytest.fixture(scope='session')
+def fixture_dbs(tmp_path_factory):
+    """One synthetic project.db per entry of `SIZES`, built once per session."""
+    root = tmp_path_factory.mktemp('fixtures')
+    return {name: benchmark.generate(str(root / name), count, points)
+            for name, (count, points) in SIZES.items()}
+
+
+@pytest.fixture
+def make_app(fixture_dbs, tmp_path):
+    """Return a factory for a testing app on a scratch copy of a fixture database.
+
+    Every app has its own engine, so per-process caches keyed by the engine
+    (like the FTS probe in rql.py) start cold.
+    """
+    apps = []
+
+    def factory(size='small', **config):
+        path = tmp_path / f'{size}-{len(apps)}.db'
+        with open(fixture_dbs[size], 'rb') as src, open(path, 'wb') as out:
+            out.write(src.read())
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(path),
+            'FIT_WORKERS': 0,
+            'IMPORT_UPLOAD_DIR': str(tmp_path / 'uploads'),
+            **config,
+        })
+        apps.append(app)
+        regression_cache.clear()
+        return app
+
+    yield factory
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
@@ -0,0 +1,31 @@
+import json
+
+from events import event_broker
+
+
+def messages(body):
+    return [chunk for chunk in body.split('\n\n') if chunk]
+
+
+def test_streams_above_the_limit_get_a_retry_hint(make_app):
+    app = make_app('small', EVENTS_MAX_STREAMS=1, EVENTS_BUSY_RETRY=20)
+    with app.app_context():
+        held = event_broker.stream(app)
+        assert next(held).startswith('retry:')
+    try:
+        # The second stream ends at once, releasing its thread
+        busy = messages(app.test_client().get('/api/events').get_data(as_text=True))
+        assert busy[0] == 'retry: 20000'
+        event = json.loads(busy[1].removeprefix('data: '))
+        assert event['kind'] == 'busy' and event['retry_after'] == 20
+        assert len(busy) == 2
+    finally:
+        held.close()
+
+    with app.app_context():
+        reopened = event_broker.stream(app)
+    try:
+        next(reopened)
+        assert json.loads(next(reopened).split('data: ')[1])['kind'] == 'ready'
+    finally:
+        reopened.close()
@@ -0,0 +1,17 @@
+import fitting
+
+SHEAR_RATE = [1, 2, 5, 10, 20]
+
+
+def test_parameters_on_a_bound_are_flagged():
+    fit = fitting.model_fit('carreau', SHEAR_RATE, [3, 5, 9, 14, 30])
+    assert fit.params['n'] == -1.0
+    assert fit.at_bound == {'eta0': False, 'eta_inf': False, 'lambda': False, 'n': True}
+
+
+def test_rejected_steps_do_not_count_as_convergence():
+    # Stuck on the bounds of k and n: every further step is rejected until the damping gives up
+    x = [1, 2, 5, 10, 20, 50, 100, 200]
+    fit = fitting.model_fit('herschel_bulkley', x, [2.86, 1.94, 0.94, 1.75, 1.73, 0.74, 1.02, 1.42])
+    assert fit.at_bound['k'] and fit.at_bound['n']
+    assert not fit.converged
@@ -0,0 +1,38 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from models import db, ImportJob
+
+SESSION_ID = 'test-session'
+
+
+def zip_upload(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer, 'upload.zip'
+
+
+@pytest.mark.parametrize('members', [
+    {'1_bomb.csv': b'0' * (4 * 1024 * 1024)},  # A few KB compressed
+    {f'{i}_small.csv': b'x' for i in range(1, 6)},
+], ids=['size', 'members'])
+def test_oversized_zip_is_rejected_before_extraction(make_app, tmp_path, members):
+    upload_dir = tmp_path / 'uploads'
+    app = make_app('small', IMPORT_UPLOAD_DIR=str(upload_dir), IMPORT_MAX_EXTRACTED=1024 * 1024,
+                   IMPORT_MAX_FILES=3)
+    client = app.test_client()
+    assert client.post('/api/lock/acquire', json={"user_name": "test", "session_id": SESSION_ID}).status_code == 201
+
+    response = client.post('/api/import/jobs', data={'files': zip_upload(members)},
+                           headers={'X-Session-ID': SESSION_ID}, content_type='multipart/form-data')
+
+    assert response.status_code == 413
+    assert not any(os.scandir(upload_dir))
+    with app.app_context():
+        assert db.session.query(ImportJob).count() == 0
@@ -0,0 +1,60 @@
+from sqlalchemy import func, select
+
+import benchmark
+import spindles
+from import_measurements import incremental_import
+from models import db, ImportManifest, Measurement, Point, PointOverlay
+
+SESSION_ID = 'test-session'
+
+
+def synthetic_files(app, count):
+    """The fixture's synthetic measurements 1..count as (meas_data, points)."""
+    with app.app_context():
+        factors = spindles.factors()
+    return list(benchmark.synthetic_measurements(count, 5, factors))
+
+
+def test_incremental_import_only_replaces_what_it_imported(make_app, tmp_path):
+    app = make_app('small')  # Measurements 1-3, holding what the CSVs below contain
+    client = app.test_client()
+    assert client.post('/api/lock/acquire', json={"user_name": "test", "session_id": SESSION_ID}).status_code == 201
+    headers = {'X-Session-ID': SESSION_ID}
+    # Measurement 2 is renamed in the UI, and an edit draft of 1 with one changed point takes ID 4
+    assert client.put('/api/measurements/2', json={"liquid_name": "Edited"}, headers=headers).status_code == 200
+    assert client.post('/api/measurements/1/edit/start', headers=headers).get_json()['id'] == 4
+    point_id = client.get('/api/measurements/1').get_json()['points'][0]['id']
+    assert client.put(f'/api/measurements/1/points/{point_id}', json={"N": 1, "eta": 2},
+                      headers=headers).status_code == 200
+
+    files = synthetic_files(app, 5)
+    paths = []
+    for meas_data, points in files:
+        paths.append(str(tmp_path / f"{meas_data['id']}_synthetic.csv"))
+        benchmark.write_csv(paths[-1], meas_data, points)
+
+    with app.app_context():
+        versions = dict(db.session.execute(select(Measurement.id, Measurement.data_version)).all())
+        incremental_import(paths)
+
+        assert db.session.get(Measurement, 2).liquid_name == "Edited"
+        draft = db.session.get(Measurement, 4)
+        assert draft.is_draft and draft.original_id == 1
+        assert db.session.execute(select(func.count()).select_from(PointOverlay)).scalar() == 1
+        # 1 and 3 still hold their files' data: tracked from now on, rows untouched
+        for meas_id in (1, 3):
+            assert db.session.get(Measurement, meas_id).data_version == versions[meas_id]
+        assert db.session.get(Measurement, 5).liquid_name == files[4][0]["liquid_name"]
+        assert set(db.session.execute(select(ImportManifest.measurement_id)).scalars()) == {1, 3, 5}
+
+    # Later changes replace tracked measurements only, and never one with an open draft
+    for meas_id in (1, 2, 3):
+        meas_data, points = files[meas_id - 1]
+        benchmark.write_csv(paths[meas_id - 1], {**meas_data, "liquid_name": "Changed"}, points[:3])
+    with app.app_context():
+        incremental_import(paths)
+        assert db.session.get(Measurement, 1).liquid_name == files[0][0]["liquid_name"]
+        assert db.session.get(Measurement, 2).liquid_name == "Edited"
+        replaced = db.session.get(Measurement, 3)
+        assert replaced.liquid_name == "Changed"
+        assert db.session.execute(select(func.count()).where(Point.measurement_id == 3)).scalar() == 3
@@ -0,0 +1,22 @@
+from sqlalchemy import update
+
+from lease import LEASE_ID, _now
+from models import db, GlobalLock
+
+
+def test_write_rechecks_a_lock_taken_over_by_another_worker(make_app):
+    app = make_app('small')
+    client = app.test_client()
+    response = client.post('/api/lock/acquire', json={"user_name": "first", "session_id": 'first'})
+    assert response.status_code == 201
+
+    # Another worker takes over the expired lease; this worker's cache is still fresh
+    with app.app_context():
+        db.session.execute(update(GlobalLock).where(GlobalLock.id == LEASE_ID).values(
+            session_id='second', user_name='second', last_heartbeat=_now()))
+        db.session.commit()
+
+    response = client.put('/api/measurements/1', json={"liquid_name": "renamed"},
+                          headers={'X-Session-ID': 'first'})
+    assert response.status_code == 403
+    assert response.get_json()["error"].endswith("Lock held by second")
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+import point_store
+from models import db, Measurement
+
+SESSION_ID = 'test-session'
+HEADERS = {'X-Session-ID': SESSION_ID}
+
+
+@pytest.fixture
+def packed(make_app, monkeypatch):
+    """A packed app, its client and the IDs passed to every full `pack`."""
+    app = make_app('small', POINT_STORAGE='packed')
+    with app.app_context():
+        point_store.pack(db.session.execute(select(Measurement.id)).scalars().all())
+        db.session.commit()
+    rebuilt = []
+    pack = point_store.pack
+    monkeypatch.setattr(point_store, 'pack', lambda ids: rebuilt.extend(ids) or pack(ids))
+    client = app.test_client()
+    assert client.post('/api/lock/acquire', json={"user_name": "test", "session_id": SESSION_ID}).status_code == 201
+    return app, client, rebuilt
+
+
+def assert_pack_matches_rows(app, measurement_id):
+    with app.app_context():
+        measurement = db.session.get(Measurement, measurement_id)
+        packed = point_store.load_columns(measurement)
+        assert db.session.get(point_store.PointColumns, measurement_id).data_version == measurement.data_version
+        rows = point_store._rows_to_columns(point_store._rows_by_measurement([measurement_id])[measurement_id])
+    for name in ('id', *point_store.COLUMNS):
+        np.testing.assert_array_equal(packed[name], rows[name])
+
+
+def point_ids(client, measurement_id):
+    return [p['id'] for p in client.get(f'/api/measurements/{measurement_id}').get_json()['points']]
+
+
+def test_point_update_patches_the_pack(packed):
+    app, client, rebuilt = packed
+    point_id = point_ids(client, 1)[2]
+    assert client.put(f'/api/measurements/1/points/{point_id}', json={"N": 7, "eta": 3},
+                      headers=HEADERS).status_code == 200
+    assert 1 not in rebuilt
+    assert_pack_matches_rows(app, 1)
+
+
+def test_draft_commit_with_only_updates_patches_the_pack(packed):
+    app, client, rebuilt = packed
+    first, second = point_ids(client, 1)[:2]
+    draft_id = client.post('/api/measurements/1/edit/start', headers=HEADERS).get_json()['id']
+    operations = [{"op": "update", "id": first, "N": 4}, {"op": "update", "id": second, "eta": 9}]
+    assert client.post('/api/measurements/1/points/batch', json={"operations": operations},
+                       headers=HEADERS).status_code == 200
+    assert client.post(f'/api/measurements/{draft_id}/edit/commit', headers=HEADERS).status_code == 200
+    assert 1 not in rebuilt
+    assert_pack_matches_rows(app, 1)
+
+    # Discarding a draft only re-versions the original's pack
+    draft_id = client.post('/api/measurements/1/edit/start', headers=HEADERS).get_json()['id']
+    assert client.post(f'/api/measurements/{draft_id}/edit/rollback', headers=HEADERS).status_code == 200
+    assert 1 not in rebuilt
+    assert_pack_matches_rows(app, 1)
+
+
+def test_added_and_deleted_points_rebuild_the_pack(packed):
+    app, client, rebuilt = packed
+    assert client.post('/api/measurements/1/points', json={"N": 50, "eta": 2}, headers=HEADERS).status_code == 201
+    assert_pack_matches_rows(app, 1)
+    assert client.delete(f'/api/measurements/1/points/{point_ids(client, 1)[0]}', headers=HEADERS).status_code == 200
+    assert_pack_matches_rows(app, 1)
+    assert rebuilt == [1, 1]
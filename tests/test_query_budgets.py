@@ -0,0 +1,51 @@
+"""
+SQL statements per read endpoint must not grow with the data: every case runs
+at each fixture size and must run exactly its expected number of statements,
+within the budget the endpoint declares with `repository.query_budget`.
+"""
+
+import pytest
+
+from conftest import SIZES
+
+SESSION_ID = 'test-session'
+
+# (name, method, url, json body, holds the editor lock, expected statements)
+CASES = [
+    ('list', 'GET', '/api/measurements', None, False, 3),
+    ('list as editor', 'GET', '/api/measurements', None, True, 4),
+    ('list sorted by summary', 'GET', '/api/measurements?sort=b&order=desc&limit=2', None, False, 3),
+    # A fresh app per case, so this is the first search of the process: it
+    # includes the one-off probe for the FTS index
+    ('search', 'GET', '/api/measurements?q=name:oil', None, False, 4),
+    ('search as editor', 'GET', '/api/measurements?q=name:oil', None, True, 5),
+    ('measurement', 'GET', '/api/measurements/2', None, False, 3),
+    ('regression', 'GET', '/api/measurements/2/regression', None, False, 2),
+    ('power regression', 'GET', '/api/measurements/2/power-regression', None, False, 2),
+    ('model fit', 'GET', '/api/measurements/2/fit?model=carreau', None, False, 2),
+    ('comparison', 'POST', '/api/comparison', {"ids": [1, 2, 3], "fits": ["power", "cross"]}, False, 2),
+]
+
+
+def statement_count(client, method, url, body, headers):
+    response = client.open(url, method=method, json=body, headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return int(response.headers['X-Query-Count'])
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('name, method, url, body, editor, expected', CASES, ids=[c[0] for c in CASES])
+def test_statement_count_is_fixed(make_app, size, name, method, url, body, editor, expected):
+    app = make_app(size)
+    client = app.test_client()
+    headers = {}
+    if editor:
+        response = client.post('/api/lock/acquire', json={"user_name": "test", "session_id": SESSION_ID})
+        assert response.status_code == 201
+        headers['X-Session-ID'] = SESSION_ID
+
+    count = statement_count(client, method, url, body, headers)
+
+    endpoint, _ = app.url_map.bind('').match(url.split('?')[0], method=method)
+    assert count <= app.view_functions[endpoint].query_budget
+    assert count == expected
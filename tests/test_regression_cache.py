@@ -0,0 +1,33 @@
+from regression_cache import regression_cache
+
+SESSION_ID = 'test-session'
+
+
+def edit_and_fit(client, headers, eta):
+    """Open a draft of measurement 1, add one point and return (draft ID, power fit)."""
+    response = client.post('/api/measurements/1/edit/start', headers=headers)
+    assert response.status_code == 201
+    draft_id = response.get_json()['id']
+    response = client.post('/api/measurements/1/points', json={"N": 50, "eta": eta}, headers=headers)
+    assert response.status_code == 201
+    response = client.get('/api/measurements/1/power-regression?coefficients_only=1')
+    assert response.status_code == 200
+    return draft_id, response.get_json()
+
+
+def test_reused_draft_id_gets_its_own_fit(make_app):
+    # Nothing is invalidated on discard: the cache of any other worker process
+    # must not serve the first draft's fit to the second one either
+    client = make_app('small').test_client()
+    response = client.post('/api/lock/acquire', json={"user_name": "test", "session_id": SESSION_ID})
+    assert response.status_code == 201
+    headers = {'X-Session-ID': SESSION_ID}
+
+    first_id, first_fit = edit_and_fit(client, headers, eta=100.0)
+    assert client.post(f'/api/measurements/{first_id}/edit/rollback', headers=headers).status_code == 200
+    second_id, second_fit = edit_and_fit(client, headers, eta=100000.0)
+
+    assert second_id == first_id  # SQLite hands out the discarded draft's row ID again
+    assert second_fit != first_fit
+    regression_cache.clear()
+    assert client.get('/api/measurements/1/power-regression?coefficients_only=1').get_json() == second_fit
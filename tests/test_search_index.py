@@ -0,0 +1,46 @@
+from sqlalchemy import text
+
+from migrations import migrate
+from models import db
+
+SESSION_ID = 'test-session'
+
+OLD_UPDATE_TRIGGER = """CREATE TRIGGER measurements_fts_update AFTER UPDATE ON measurements BEGIN
+    INSERT INTO measurement_fts(measurement_fts, rowid, liquid_name, serial_id, experiment_note)
+    VALUES ('delete', old.id, old.liquid_name, old.serial_id, old.experiment_note);
+    INSERT INTO measurement_fts(rowid, liquid_name, serial_id, experiment_note)
+    VALUES (new.id, new.liquid_name, new.serial_id, new.experiment_note);
+END"""
+
+
+def changes_of_data_version_bump():
+    """Rows written by bumping one data_version, triggers included; rolled back afterwards."""
+    before = db.session.execute(text("SELECT total_changes()")).scalar()
+    db.session.execute(text("UPDATE measurements SET data_version = data_version + 1 WHERE id = 1"))
+    changes = db.session.execute(text("SELECT total_changes()")).scalar() - before
+    db.session.rollback()
+    return changes
+
+
+def test_update_trigger_only_reindexes_indexed_columns(make_app):
+    app = make_app('small')
+    with app.app_context():
+        db.session.execute(text("DROP TRIGGER measurements_fts_update"))
+        without_index = changes_of_data_version_bump()
+        # A database from before the trigger was narrowed
+        db.session.execute(text("DROP TRIGGER IF EXISTS measurements_fts_update"))
+        db.session.execute(text(OLD_UPDATE_TRIGGER))
+        db.session.execute(text("PRAGMA user_version = 12"))
+        db.session.commit()
+        assert changes_of_data_version_bump() > without_index
+
+        migrate()
+        assert changes_of_data_version_bump() == without_index
+
+    client = app.test_client()
+    assert client.post('/api/lock/acquire', json={"user_name": "test", "session_id": SESSION_ID}).status_code == 201
+    response = client.put('/api/measurements/1', json={"liquid_name": "Renamed Sample"},
+                          headers={'X-Session-ID': SESSION_ID})
+    assert response.status_code == 200
+    found = client.get('/api/measurements?q=name:renamed').get_json()['measurements']
+    assert [m['id'] for m in found] == [1]
@@ -0,0 +1,26 @@
+import pytest
+
+import spindles
+from app import create_app
+from models import db
+
+SESSION_ID = 'test-session'
+
+
+def test_recalibration_by_another_process_is_used_at_once(make_app):
+    app = make_app('small')
+    client = app.test_client()
+    assert client.post('/api/lock/acquire', json={"user_name": "test", "session_id": SESSION_ID}).status_code == 201
+    headers = {'X-Session-ID': SESSION_ID}
+    spindle_id = client.get('/api/measurements/1').get_json()['spindle_id']
+    old_factor = client.post('/api/measurements/1/points', json={"N": 10, "eta": 100},
+                             headers=headers).get_json()['shear_rate'] / 10  # Caches the factors
+
+    # The CLI runs with its own engine, like a separate process would
+    cli = create_app({'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'], 'FIT_WORKERS': 0})
+    with cli.app_context():
+        spindles.recalibrate(spindle_id, old_factor * 2)
+        db.engine.dispose()
+
+    response = client.post('/api/measurements/1/points', json={"N": 10, "eta": 100}, headers=headers)
+    assert response.get_json()['shear_rate'] == pytest.approx(old_factor * 2 * 10)
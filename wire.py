@@ -0,0 +1,115 @@
+"""
+Response formats for point payloads.
+
+Endpoints build their payload once, with NumPy arrays for numeric columns and
+`Columns` for tables of parallel columns. The client picks the encoding with
+`?format=` or the Accept header:
+
+    json      (default)  Columns as a list of row objects, as before
+    columnar  COLUMNAR   Columns as {name: [values]}, null for missing values
+    binary    BINARY     Every array as raw little-endian float64 (NaN for missing)
+
+The binary body is a uint32 header length, a JSON header, padding to 8 bytes,
+then the buffers, each 8-byte aligned:
+
+    header = {"payload": <payload with arrays replaced by {"$column": i}>,
+              "columns": [[byte offset, length], ...]}
+
+so the browser maps each column straight into a `Float64Array` without copying.
+"""
+
+import json
+import struct
+
+import numpy as np
+from flask import current_app, jsonify, request
+
+COLUMNAR = 'application/vnd.keyin.columnar+json'
+BINARY = 'application/vnd.keyin.columnar'
+FORMATS = {'json': 'application/json', 'columnar': COLUMNAR, 'binary': BINARY}
+
+FLOAT_DTYPE = np.dtype('<f8')
+_ALIGN = 8
+
+
+class Columns(dict):
+    """{name: ndarray} of equal length; one row object per index in the default format."""
+
+
+def requested_format():
+    """Return 'json', 'columnar' or 'binary' from ?format= or Accept, or None if unknown."""
+    name = request.args.get('format')
+    if name is not None:
+        return name if name in FORMATS else None
+    best = request.accept_mimetypes.best_match([FORMATS['json'], COLUMNAR, BINARY], FORMATS['json'])
+    return next(name for name, mimetype in FORMATS.items() if mimetype == best)
+
+
+def column_to_json(values):
+    """Convert a float column to a JSON-safe list (NaN becomes None)."""
+    return [None if v != v else v for v in np.asarray(values).tolist()]
+
+
+def _to_json(value, columnar):
+    if isinstance(value, Columns):
+        lists = {name: _to_json(column, columnar) for name, column in value.items()}
+        if columnar:
+            return lists
+        return [dict(zip(lists, row)) for row in zip(*lists.values())]
+    if isinstance(value, np.ndarray):
+        return column_to_json(value)
+    if isinstance(value, dict):
+        return {key: _to_json(item, columnar) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item, columnar) for item in value]
+    return value
+
+
+def _extract_buffers(value, buffers):
+    if isinstance(value, np.ndarray):
+        buffers.append(np.ascontiguousarray(value, dtype=FLOAT_DTYPE))
+        return {"$column": len(buffers) - 1}
+    if isinstance(value, dict):
+        return {key: _extract_buffers(item, buffers) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_extract_buffers(item, buffers) for item in value]
+    return value
+
+
+def _pad(size):
+    return -size % _ALIGN
+
+
+def encode_binary(payload):
+    """Encode `payload` in the binary layout described above."""
+    buffers = []
+    skeleton = _extract_buffers(payload, buffers)
+
+    # Offsets depend on the header length, which depends on the offsets: size
+    # the header with placeholder offsets of the final width first
+    def header_bytes(offsets):
+        return json.dumps({"payload": skeleton, "columns": offsets}, separators=(',', ':')).encode()
+
+    lengths = [len(buffer) for buffer in buffers]
+    width = 4 + len(header_bytes([[10 ** 12, n] for n in lengths]))
+    start = width + _pad(width)
+    offsets, position = [], start
+    for n in lengths:
+        offsets.append([position, n])
+        position += n * FLOAT_DTYPE.itemsize
+    header = header_bytes(offsets)
+    header += b' ' * (start - 4 - len(header))  # JSON ignores trailing spaces
+    return b''.join([struct.pack('<I', len(header)), header, *(buffer.tobytes() for buffer in buffers)])
+
+
+def respond(payload, fmt='json'):
+    """Return `payload` as a response in `fmt`."""
+    if fmt == 'binary':
+        response = current_app.response_class(encode_binary(payload), mimetype=BINARY)
+    elif fmt == 'columnar':
+        response = jsonify(_to_json(payload, columnar=True))
+        response.mimetype = COLUMNAR
+    else:
+        response = jsonify(_to_json(payload, columnar=False))
+    response.vary.add('Accept')
+    return response